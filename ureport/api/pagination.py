@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class SortedCursorPagination(CursorPagination):
+    """
+    Cursor pagination over the ```sort``` order of the list endpoints, the most recently created or modified first
+    """
+
+    ordering = ("-created_on", "-id")
+    page_size_query_param = "limit"
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get("sort", None) == "modified_on":
+            return ("-modified_on", "-id")
+        return self.ordering
+
+
+class ListPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination by default, clients paging through all the objects can ask for cursor pagination with
+    ```pagination=cursor``` which needs neither the count nor the offset scans
+    """
+
+    pagination_query_param = "pagination"
+
+    def __init__(self):
+        self.cursor_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.pagination_query_param, None) == "cursor":
+            self.cursor_pagination = SortedCursorPagination()
+            return self.cursor_pagination.paginate_queryset(queryset, request, view=view)
+
+        return super(ListPagination, self).paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination:
+            return self.cursor_pagination.get_paginated_response(data)
+
+        return super(ListPagination, self).get_paginated_response(data)
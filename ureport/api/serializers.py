@@ -4,21 +4,50 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import json
 
 import six
-from dash.categories.models import Category
+from dash.categories.models import Category, CategoryImage
 from dash.orgs.models import Org
 from dash.stories.models import Story
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
+from django.db import models
+from django.db.models import Prefetch
+
 from ureport.assets.models import Image
 from ureport.news.models import NewsItem, Video
-from ureport.polls.models import Poll
+from ureport.polls.models import Poll, PollQuestion
+
+POLL_RESULTS_SEGMENTS = (dict(age="Age"), dict(gender="Gender"), dict(location="State"))
 
 
 def generate_absolute_url_from_file(request, file):
     return request.build_absolute_uri(file.url)
 
 
+class FieldsSelectionMixin(object):
+    """
+    Lets the clients select the serialized fields with the ```fields``` and ```exclude``` query parameters
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(FieldsSelectionMixin, self).__init__(*args, **kwargs)
+
+        request = self.context.get("request", None)
+        if request is None:
+            return
+
+        fields = request.query_params.get("fields", None)
+        if fields:
+            selected = {field.strip() for field in fields.split(",")}
+            for field in set(self.fields) - selected:
+                self.fields.pop(field)
+
+        exclude = request.query_params.get("exclude", None)
+        if exclude:
+            for field in exclude.split(","):
+                self.fields.pop(field.strip(), None)
+
+
 class CategoryReadSerializer(serializers.ModelSerializer):
     image_url = SerializerMethodField()
 
@@ -30,7 +59,9 @@ class CategoryReadSerializer(serializers.ModelSerializer):
         image = None
         if obj.image:
             image = obj.image
-        elif obj.get_first_image():
+        elif hasattr(obj, "prefetched_images"):
+            image = obj.prefetched_images[0].image if obj.prefetched_images else None
+        else:
             image = obj.get_first_image()
         if image:
             return generate_absolute_url_from_file(self.context["request"], image)
@@ -87,7 +118,7 @@ class OrgReadSerializer(serializers.ModelSerializer):
         return six.text_type(obj.timezone)
 
 
-class StoryReadSerializer(serializers.ModelSerializer):
+class StoryReadSerializer(FieldsSelectionMixin, serializers.ModelSerializer):
     category = CategoryReadSerializer()
     images = SerializerMethodField()
 
@@ -115,25 +146,62 @@ class StoryReadSerializer(serializers.ModelSerializer):
         ]
 
 
-class PollReadSerializer(serializers.ModelSerializer):
+class PollListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        polls = list(data.all() if isinstance(data, models.Manager) else data)
+
+        # load the cached results of the questions of all the polls on the page at once
+        if "questions" in self.child.fields:
+            questions = [question for poll in polls for question in getattr(poll, "prefetched_questions", [])]
+            PollQuestion.load_results(questions, segments=POLL_RESULTS_SEGMENTS)
+
+        return super(PollListSerializer, self).to_representation(polls)
+
+
+class PollReadSerializer(FieldsSelectionMixin, serializers.ModelSerializer):
     category = CategoryReadSerializer()
     questions = SerializerMethodField()
 
     class Meta:
         model = Poll
         fields = ("id", "flow_uuid", "title", "org", "category", "poll_date", "modified_on", "created_on", "questions")
+        list_serializer_class = PollListSerializer
+
+    @classmethod
+    def prefetch_queryset(cls, queryset):
+        """
+        Prefetches the categories, the category images and the active questions of the polls so serializing a page
+        of polls runs the same number of queries whatever its size
+        """
+        return queryset.select_related("category").prefetch_related(
+            Prefetch(
+                "category__images",
+                queryset=CategoryImage.objects.filter(is_active=True).exclude(image="").order_by("pk"),
+                to_attr="prefetched_images",
+            ),
+            Prefetch(
+                "questions",
+                queryset=PollQuestion.objects.filter(is_active=True)
+                .select_related("flow_result")
+                .order_by("-priority", "pk"),
+                to_attr="prefetched_questions",
+            ),
+        )
 
     def get_questions(self, obj):
-        questions = []
-        for question in obj.get_questions():
+        age_segment, gender_segment, state_segment = POLL_RESULTS_SEGMENTS
+
+        questions = getattr(obj, "prefetched_questions", None)
+        if questions is None:
+            questions = PollQuestion.load_results(obj.get_questions(), segments=POLL_RESULTS_SEGMENTS)
+
+        questions_data = []
+        for question in questions:
             open_ended = question.is_open_ended()
             results_dict = dict(open_ended=open_ended)
             results = question.get_results()
             if results:
                 results_dict = results[0]
-            results_by_age = question.get_results(segment=dict(age="Age"))
-            results_by_gender = question.get_results(segment=dict(gender="Gender"))
-            results_by_state = question.get_results(segment=dict(location="State"))
 
             question_data = {
                 "id": question.pk,
@@ -143,16 +211,16 @@ class PollReadSerializer(serializers.ModelSerializer):
             }
 
             if not open_ended:
-                question_data["results_by_age"] = results_by_age
-                question_data["results_by_gender"] = results_by_gender
-                question_data["results_by_location"] = results_by_state
+                question_data["results_by_age"] = question.get_results(segment=age_segment)
+                question_data["results_by_gender"] = question.get_results(segment=gender_segment)
+                question_data["results_by_location"] = question.get_results(segment=state_segment)
 
-            questions.append(question_data)
+            questions_data.append(question_data)
 
-        return questions
+        return questions_data
 
 
-class NewsItemReadSerializer(serializers.ModelSerializer):
+class NewsItemReadSerializer(FieldsSelectionMixin, serializers.ModelSerializer):
     short_description = SerializerMethodField()
     category = CategoryReadSerializer()
 
@@ -164,7 +232,7 @@ class NewsItemReadSerializer(serializers.ModelSerializer):
         return obj.short_description()
 
 
-class VideoReadSerializer(serializers.ModelSerializer):
+class VideoReadSerializer(FieldsSelectionMixin, serializers.ModelSerializer):
     category = CategoryReadSerializer()
 
     class Meta:
@@ -172,7 +240,7 @@ class VideoReadSerializer(serializers.ModelSerializer):
         fields = ("id", "category", "title", "description", "video_id", "org", "created_on")
 
 
-class ImageReadSerializer(serializers.ModelSerializer):
+class ImageReadSerializer(FieldsSelectionMixin, serializers.ModelSerializer):
     image_url = SerializerMethodField()
 
     class Meta:
@@ -15,6 +15,8 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from ureport.api.serializers import CategoryReadSerializer, StoryReadSerializer, generate_absolute_url_from_file
@@ -335,6 +337,75 @@ class UreportAPITests(APITestCase):
         )
         self.assertTrue(response.data["results"][0]["modified_on"] > response.data["results"][1]["modified_on"])
 
+    @patch("ureport.polls.models.PollQuestion.calculate_results")
+    def test_polls_by_org_list_queries(self, mock_calculate_results):
+        mock_calculate_results.return_value = [dict(set=20, unset=10, open_ended=False, categories=[])]
+
+        url = "/api/v1/polls/org/%d/" % self.uganda.pk
+
+        with CaptureQueriesContext(connection) as captured_queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        num_queries = len(captured_queries)
+
+        for index in range(3):
+            poll = self.create_poll("poll %d" % index)
+            self.create_poll_question(self.superuser, poll, "question %d" % index, "uuid-poll-%d" % index)
+
+        # the questions, categories and category images are loaded for the whole page
+        with CaptureQueriesContext(connection) as captured_queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 7)
+        self.assertEqual(len(captured_queries), num_queries)
+
+        result = [result for result in response.data["results"] if result["title"] == "poll 0"][0]
+        self.assertEqual(len(result["questions"]), 1)
+        self.assertEqual(result["questions"][0]["title"], "question 0")
+        self.assertEqual(result["questions"][0]["results"], dict(set=20, unset=10, open_ended=False, categories=[]))
+
+    def test_polls_by_org_list_cursor_pagination(self):
+        url = "/api/v1/polls/org/%d/" % self.uganda.pk
+
+        response = self.client.get(url, dict(pagination="cursor", limit=3))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse("count" in response.data)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(
+            [poll["title"] for poll in response.data["results"]], ["second featured", "first featured", "another"]
+        )
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["next"])
+        self.assertEqual([poll["title"] for poll in response.data["results"]], ["registration"])
+
+        Poll.objects.filter(pk=self.another_poll.pk).update(modified_on=timezone.now())
+
+        response = self.client.get(url, dict(pagination="cursor", limit=3, sort="modified_on"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["title"], "another")
+
+        response = self.client.get(url, dict(pagination="cursor", cursor="invalid"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_polls_by_org_list_fields_selection(self):
+        url = "/api/v1/polls/org/%d/" % self.uganda.pk
+
+        response = self.client.get(url, dict(exclude="questions"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 4)
+        self.assertFalse("questions" in response.data["results"][0])
+        self.assertEqual(response.data["results"][0]["title"], "second featured")
+
+        response = self.client.get(url, dict(fields="id, title"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0], dict(id=self.second_featured_poll.pk, title="second featured"))
+
+        response = self.client.get("/api/v1/polls/%d/" % self.reg_poll.pk, dict(fields="id,category"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data.keys()), {"id", "category"})
+
     def test_polls_by_org_list_with_flow_uuid_parameter(self):
         url = "/api/v1/polls/org/%d/?flow_uuid=%s" % (self.uganda.pk, self.reg_poll.flow_uuid)
         response = self.client.get(url)
@@ -5,6 +5,7 @@ from dash.orgs.models import Org
 from dash.stories.models import Story
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 
+from ureport.api.pagination import ListPagination
 from ureport.api.serializers import (
     ImageReadSerializer,
     NewsItemReadSerializer,
@@ -108,6 +109,8 @@ class OrgDetails(RetrieveAPIView):
 
 
 class BaseListAPIView(ListAPIView):
+    pagination_class = ListPagination
+
     def get_queryset(self):
         q = self.model.objects.filter(is_active=True).order_by("-created_on")
         if self.kwargs.get("org", None):
@@ -132,6 +135,10 @@ class PollList(BaseListAPIView):
 
     * **sort** - Order the results by modified on desceding if specified and equal to ```modified_on```
 
+    * **fields** - Only include these comma separated attributes in the results if specified
+    * **exclude** - Leave these comma separated attributes out of the results if specified, e.g. ```questions```
+    * **pagination** - Page through the results with cursors instead of offsets if equal to ```cursor```
+
     Example:
 
         GET /api/v1/polls/org/1/
@@ -272,7 +279,7 @@ class PollList(BaseListAPIView):
         if self.request.query_params.get("sort", None) == "modified_on":
             q = q.order_by("-modified_on")
 
-        return q
+        return PollReadSerializer.prefetch_queryset(q)
 
 
 class PollDetails(RetrieveAPIView):
@@ -405,6 +412,10 @@ class FeaturedPollList(BaseListAPIView):
 
     * **sort** - Order the results by modified on desceding if specified and equal to ```modified_on```
 
+    * **fields** - Only include these comma separated attributes in the results if specified
+    * **exclude** - Leave these comma separated attributes out of the results if specified, e.g. ```questions```
+    * **pagination** - Page through the results with cursors instead of offsets if equal to ```cursor```
+
     Example:
 
         GET /api/v1/polls/org/1/featured/
@@ -550,7 +561,7 @@ class FeaturedPollList(BaseListAPIView):
                 .filter(is_featured=True)
                 .order_by("-created_on")
             )
-        return q
+        return PollReadSerializer.prefetch_queryset(q)
 
 
 class NewsItemList(BaseListAPIView):
@@ -569,6 +580,10 @@ class NewsItemList(BaseListAPIView):
     * **link** - the link to the source of this news item (string)
     * **category** - the CATEGORY of of this news item (dictionary)
 
+    * **fields** - Only include these comma separated attributes in the results if specified
+    * **exclude** - Leave these comma separated attributes out of the results if specified
+    * **pagination** - Page through the results with cursors instead of offsets if equal to ```cursor```
+
     Example:
 
         GET /api/v1/news/org/1/
@@ -645,6 +660,10 @@ class VideoList(BaseListAPIView):
     * **link** - the link to the source of this news item (string)
     * **category** - the CATEGORY of of this news item (dictionary)
 
+    * **fields** - Only include these comma separated attributes in the results if specified
+    * **exclude** - Leave these comma separated attributes out of the results if specified
+    * **pagination** - Page through the results with cursors instead of offsets if equal to ```cursor```
+
     Example:
 
         GET /api/v1/videos/org/1/
@@ -719,6 +738,10 @@ class ImageList(BaseListAPIView):
     * **org** - the ID of the org that owns this asset (int)
     * **name** - the name of the asset (string)
 
+    * **fields** - Only include these comma separated attributes in the results if specified
+    * **exclude** - Leave these comma separated attributes out of the results if specified
+    * **pagination** - Page through the results with cursors instead of offsets if equal to ```cursor```
+
     Example:
 
         GET /api/v1/assets/org/1/
@@ -789,6 +812,10 @@ class StoryList(BaseListAPIView):
     * **images** - the IMAGES in this story (list of strings)
     * **category** - the CATEGORY of the asset (dictionary)
 
+    * **fields** - Only include these comma separated attributes in the results if specified
+    * **exclude** - Leave these comma separated attributes out of the results if specified
+    * **pagination** - Page through the results with cursors instead of offsets if equal to ```cursor```
+
     Example:
 
         GET /api/v1/stories/org/1/
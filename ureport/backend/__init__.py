@@ -4,6 +4,12 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from abc import ABCMeta, abstractmethod
 
+from django.conf import settings
+
+from ureport.contacts.models import Contact
+from ureport.locations.models import Boundary
+from ureport.utils import json_date_to_datetime
+
 
 class BaseBackend(object):
     __metaclass__ = ABCMeta
@@ -11,6 +17,12 @@ class BaseBackend(object):
     def __init__(self, backend):
         self.backend = backend
 
+    def get_host(self):
+        """
+        Gets the API host of this backend, concurrent requests are limited by host
+        """
+        return self.backend.host or settings.SITE_API_HOST
+
     @abstractmethod
     def pull_fields(self, org):
         """
@@ -40,3 +52,172 @@ class BaseBackend(object):
         :return: tuple of the number of contacts created, updated, deleted and ignored
         """
         pass
+
+
+class ContactFieldMapper(object):
+    """
+    Converts remote contacts to local contact kwargs for one sync. The org config labels are read once and the
+    contact field keys and the boundaries tree are loaded once, on the first contact converted
+    """
+
+    BOUNDARY_PATH_SEPARATOR = " > "
+
+    def __init__(self, org, backend):
+        self.org = org
+        self.backend = backend
+
+        slug = backend.slug
+        self.reporter_group = org.get_config("%s.reporter_group" % slug, default="").lower()
+        self.is_global = org.get_config("common.is_global")
+        self.state_label = org.get_config("%s.state_label" % slug, default="").lower()
+        self.district_label = org.get_config("%s.district_label" % slug, default="").lower()
+        self.ward_label = org.get_config("%s.ward_label" % slug, default="").lower()
+        self.registration_label = org.get_config("%s.registration_label" % slug, default="").lower()
+        self.occupation_label = org.get_config("%s.occupation_label" % slug, default="").lower()
+        self.born_label = org.get_config("%s.born_label" % slug, default="").lower()
+        self.gender_label = org.get_config("%s.gender_label" % slug, default="").lower()
+        self.female_label = org.get_config("%s.female_label" % slug, default="").lower()
+        self.male_label = org.get_config("%s.male_label" % slug, default="").lower()
+        self.extra_gender = org.get_config("common.has_extra_gender", default=False)
+
+        self.loaded = False
+        self.field_keys = dict()
+        self.state_boundaries = dict()
+        self.district_boundaries = dict()
+        self.ward_boundaries = dict()
+
+    def get_field_keys(self):
+        """
+        The remote contact fields keys by lowercase label
+        """
+        labels = [
+            self.state_label,
+            self.district_label,
+            self.ward_label,
+            self.registration_label,
+            self.occupation_label,
+            self.born_label,
+            self.gender_label,
+        ]
+        return {label: label for label in labels if label}
+
+    def get_boundaries(self):
+        return Boundary.objects.filter(
+            org=self.org, level__in=[Boundary.STATE_LEVEL, Boundary.DISTRICT_LEVEL, Boundary.WARD_LEVEL]
+        )
+
+    def load(self):
+        self.field_keys = self.get_field_keys()
+
+        boundaries = list(self.get_boundaries().values_list("id", "parent_id", "level", "name", "osm_id"))
+
+        states = dict()
+        for boundary_id, parent_id, level, name, osm_id in boundaries:
+            if level == Boundary.STATE_LEVEL:
+                states[boundary_id] = osm_id
+                self.state_boundaries[name.lower()] = osm_id
+
+        districts = dict()
+        for boundary_id, parent_id, level, name, osm_id in boundaries:
+            if level == Boundary.DISTRICT_LEVEL and parent_id in states:
+                districts[boundary_id] = osm_id
+                self.district_boundaries.setdefault(states[parent_id], dict())[name.lower()] = osm_id
+
+        for boundary_id, parent_id, level, name, osm_id in boundaries:
+            if level == Boundary.WARD_LEVEL and parent_id in districts:
+                self.ward_boundaries.setdefault(districts[parent_id], dict())[name.lower()] = osm_id
+
+        self.loaded = True
+
+    def is_reporter(self, remote):
+        return self.reporter_group in [group.name.lower() for group in remote.groups]
+
+    def get_field_value(self, remote, label, default=None):
+        return remote.fields.get(self.field_keys.get(label), default)
+
+    def get_boundary_name(self, remote, label):
+        path = self.get_field_value(remote, label)
+        if not path:
+            return None
+        return path.split(self.BOUNDARY_PATH_SEPARATOR)[-1].lower()
+
+    def local_kwargs(self, remote):
+        if not self.loaded:
+            self.load()
+
+        state = ""
+        district = ""
+        ward = ""
+
+        if self.state_label:
+            if self.is_global:
+                state_name = self.get_field_value(remote, self.state_label)
+                if state_name:
+                    state = state_name
+
+            else:
+                state_name = self.get_boundary_name(remote, self.state_label)
+                if state_name:
+                    state = self.state_boundaries.get(state_name, "")
+
+                if self.district_label:
+                    district_name = self.get_boundary_name(remote, self.district_label)
+                    if district_name:
+                        district = self.district_boundaries.get(state, dict()).get(district_name, "")
+
+                if self.ward_label:
+                    ward_name = self.get_boundary_name(remote, self.ward_label)
+                    if ward_name:
+                        ward = self.ward_boundaries.get(district, dict()).get(ward_name, "")
+
+        registered_on = None
+        if self.registration_label:
+            registered_on = self.get_field_value(remote, self.registration_label)
+            if registered_on:
+                registered_on = json_date_to_datetime(registered_on)
+
+        occupation = ""
+        if self.occupation_label:
+            occupation = self.get_field_value(remote, self.occupation_label, "")
+            if not occupation:
+                occupation = ""
+
+        born = 0
+        if self.born_label:
+            try:
+                born = int(self.get_field_value(remote, self.born_label, 0))
+
+                # support only positive django integer field valid values
+                if born < 0 or born > 2147483647:
+                    born = 0
+
+            except ValueError:
+                pass
+            except TypeError:
+                pass
+
+        gender = ""
+        if self.gender_label:
+            gender = self.get_field_value(remote, self.gender_label, "")
+
+            if gender and gender.lower() == self.female_label:
+                gender = Contact.FEMALE
+            elif gender and gender.lower() == self.male_label:
+                gender = Contact.MALE
+            elif gender and self.extra_gender:
+                gender = Contact.OTHER
+            else:
+                gender = ""
+
+        return {
+            "backend": self.backend,
+            "org": self.org,
+            "uuid": remote.uuid,
+            "gender": gender,
+            "born": born,
+            "occupation": occupation,
+            "registered_on": registered_on,
+            "state": state,
+            "district": district,
+            "ward": ward,
+        }
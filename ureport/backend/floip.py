@@ -15,150 +15,39 @@ from django.core.cache import cache
 from django.utils import timezone
 
 from ureport.contacts.models import Contact
-from ureport.locations.models import Boundary
 from ureport.polls.models import Poll, PollQuestion, PollResponseCategory, PollResult
-from ureport.utils import datetime_to_json_date, json_date_to_datetime
+from ureport.utils import datetime_to_json_date, get_http_session, json_date_to_datetime
 
-from . import BaseBackend
+from . import BaseBackend, ContactFieldMapper
 
 logger = logging.getLogger(__name__)
 
 
+class FLOIPContactFieldMapper(ContactFieldMapper):
+    """
+    Maps the contact fields keyed by their labels, FLOIP contacts have no extra gender
+    """
+
+    def __init__(self, org, backend):
+        super(FLOIPContactFieldMapper, self).__init__(org, backend)
+        self.extra_gender = False
+
+
 class ContactSyncer(BaseSyncer):
     model = Contact
     prefetch_related = ("backend",)
 
-    def get_boundaries_data(self, org):
-
-        cache_attr = "__boundaries__%d:%s" % (org.pk, self.backend.slug)
+    def get_contact_field_mapper(self, org):
+        cache_attr = "__contact_field_mapper__%d:%s" % (org.pk, self.backend.slug)
         if hasattr(self, cache_attr):
             return getattr(self, cache_attr)
 
-        org_state_boundaries_data = dict()
-        org_district_boundaries_data = dict()
-        org_ward_boundaries_data = dict()
-        state_boundaries = Boundary.objects.filter(org=org, level=Boundary.STATE_LEVEL)
-        for state in state_boundaries:
-            org_state_boundaries_data[state.name.lower()] = state.osm_id
-            state_district_data = dict()
-            district_boundaries = Boundary.objects.filter(org=org, level=Boundary.DISTRICT_LEVEL, parent=state)
-            for district in district_boundaries:
-                state_district_data[district.name.lower()] = district.osm_id
-                district_ward_data = dict()
-                ward_boundaries = Boundary.objects.filter(org=org, level=Boundary.WARD_LEVEL, parent=district)
-                for ward in ward_boundaries:
-                    district_ward_data[ward.name.lower()] = ward.osm_id
-                org_ward_boundaries_data[district.osm_id] = district_ward_data
-
-            org_district_boundaries_data[state.osm_id] = state_district_data
-
-        setattr(self, cache_attr, (org_state_boundaries_data, org_district_boundaries_data, org_ward_boundaries_data))
-        return org_state_boundaries_data, org_district_boundaries_data, org_ward_boundaries_data
+        mapper = FLOIPContactFieldMapper(org, self.backend)
+        setattr(self, cache_attr, mapper)
+        return mapper
 
     def local_kwargs(self, org, remote):
-        from ureport.utils import json_date_to_datetime
-
-        org_state_boundaries_data, org_district_boundaries_data, org_ward_boundaries_data = self.get_boundaries_data(
-            org
-        )
-
-        state = ""
-        district = ""
-        ward = ""
-
-        state_field = org.get_config("%s.state_label" % self.backend.slug, default="")
-        if state_field:
-            state_field = state_field.lower()
-            if org.get_config("common.is_global"):
-                state_name = remote.fields.get(state_field, None)
-                if state_name:
-                    state = state_name
-
-            else:
-                state_path = remote.fields.get(state_field, None)
-                if state_path:
-                    state_name = state_path.split(" > ")[-1]
-                    state_name = state_name.lower()
-                    state = org_state_boundaries_data.get(state_name, "")
-
-                district_field = org.get_config("%s.district_label" % self.backend.slug, default="")
-                if district_field:
-                    district_field = district_field.lower()
-                    district_path = remote.fields.get(district_field, None)
-                    if district_path:
-                        district_name = district_path.split(" > ")[-1]
-                        district_name = district_name.lower()
-                        district = org_district_boundaries_data.get(state, dict()).get(district_name, "")
-
-                ward_field = org.get_config("%s.ward_label" % self.backend.slug, default="")
-                if ward_field:
-                    ward_field = ward_field.lower()
-                    ward_path = remote.fields.get(ward_field, None)
-                    if ward_path:
-                        ward_name = ward_path.split(" > ")[-1]
-                        ward_name = ward_name.lower()
-                        ward = org_ward_boundaries_data.get(district, dict()).get(ward_name, "")
-
-        registered_on = None
-        registration_field = org.get_config("%s.registration_label" % self.backend.slug, default="")
-        if registration_field:
-            registration_field = registration_field.lower()
-            registered_on = remote.fields.get(registration_field, None)
-            if registered_on:
-                registered_on = json_date_to_datetime(registered_on)
-
-        occupation = ""
-        occupation_field = org.get_config("%s.occupation_label" % self.backend.slug, default="")
-        if occupation_field:
-            occupation_field = occupation_field.lower()
-            occupation = remote.fields.get(occupation_field, "")
-            if not occupation:
-                occupation = ""
-
-        born = 0
-        born_field = org.get_config("%s.born_label" % self.backend.slug, default="")
-        if born_field:
-            born_field = born_field.lower()
-            try:
-                born = int(remote.fields.get(born_field, 0))
-
-                # support only positive django integer field valid values
-                if born < 0 or born > 2147483647:
-                    born = 0
-
-            except ValueError:
-                pass
-            except TypeError:
-                pass
-
-        gender = ""
-        gender_field = org.get_config("%s.gender_label" % self.backend.slug, default="")
-        female_label = org.get_config("%s.female_label" % self.backend.slug, default="")
-        male_label = org.get_config("%s.male_label" % self.backend.slug, default="")
-
-        if gender_field:
-            gender_field = gender_field.lower()
-            gender = remote.fields.get(gender_field, "")
-
-            if gender and gender.lower() == female_label.lower():
-                gender = self.model.FEMALE
-            elif gender and gender.lower() == male_label.lower():
-                gender = self.model.MALE
-            else:
-                gender = ""
-
-        return {
-            "backend": self.backend,
-            "org": org,
-            "uuid": remote.uuid,
-            "gender": gender,
-            "born": born,
-            "occupation": occupation,
-            "registered_on": registered_on,
-            "state": state,
-            "district": district,
-            "ward": ward,
-        }
+        return self.get_contact_field_mapper(org).local_kwargs(remote)
 
     def update_required(self, local, remote, local_kwargs):
         if local_kwargs and local_kwargs["backend"] != local.backend:
@@ -185,10 +74,16 @@ class FLOIPBackend(BaseBackend):
     FLOIP instance as a backend
     """
 
+    FLOWS_PAGES_CACHE_KEY = "floip:backend:%d:flows-pages"
+
     def _get_client(self, org):
         agent = getattr(settings, "SITE_API_USER_AGENT", None)
         return TembaClient(self.backend.host, self.backend.api_token, user_agent=agent)
 
+    def get_host(self):
+        # flows and results are fetched from the flow results packages API
+        return "https://go.votomobile.org"
+
     def pull_fields(self, org):
         # Not needed
         return {SyncOutcome.created: 0, SyncOutcome.updated: 0, SyncOutcome.deleted: 0, SyncOutcome.ignored: 0}
@@ -224,13 +119,40 @@ class FLOIPBackend(BaseBackend):
 
         flows = []
 
+        # the pages validators from the previous fetch, the unchanged pages are not downloaded again
+        pages_cache_key = FLOIPBackend.FLOWS_PAGES_CACHE_KEY % self.backend.pk
+        cached_pages = cache.get(pages_cache_key, None) or dict()
+        pages = dict()
+
+        session = get_http_session()
+
         while flow_url:
-            response = requests.request("GET", flow_url, headers=headers)
-            response_json = response.json()
+            page_headers = dict(headers)
+            cached_page = cached_pages.get(flow_url)
+            if cached_page:
+                if cached_page["etag"]:
+                    page_headers["If-None-Match"] = cached_page["etag"]
+                if cached_page["last_modified"]:
+                    page_headers["If-Modified-Since"] = cached_page["last_modified"]
+
+            response = session.request("GET", flow_url, headers=page_headers)
+
+            if response.status_code == 304 and cached_page:
+                response_json = cached_page["json"]
+                pages[flow_url] = cached_page
+            else:
+                response_json = response.json()
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if etag or last_modified:
+                    pages[flow_url] = dict(etag=etag, last_modified=last_modified, json=response_json)
 
             flows += response_json["data"]
             flow_url = response_json["links"]["next"]
 
+        cache.set(pages_cache_key, pages, None)
+
         all_flows = dict()
         for flow in flows:
             flow_attributes = flow["attributes"]
@@ -301,6 +223,7 @@ class FLOIPBackend(BaseBackend):
         org = poll.org
         r = get_redis_connection()
         key = Poll.POLL_PULL_RESULTS_TASK_LOCK % (org.pk, poll.flow_uuid)
+        counts_key = Poll.POLL_REBUILD_COUNTS_LOCK % (org.pk, poll.flow_uuid)
 
         stats_dict = dict(
             num_val_created=0,
@@ -336,6 +259,9 @@ class FLOIPBackend(BaseBackend):
                     pull_after_delete,
                 ) = poll.get_pull_cached_params()
 
+                # the results are cleared for this sync, Poll.pull_results rebuilds all the counts after it
+                full_rebuild = pull_after_delete is not None
+
                 if pull_after_delete is not None:
                     latest_synced_obj_time = None
                     poll.delete_poll_results()
@@ -354,33 +280,47 @@ class FLOIPBackend(BaseBackend):
                     results = response_json["data"]["attributes"]["responses"]
                     poll_results_url = response_json["data"]["relationships"]["links"]["next"]
 
-                    contacts_map, poll_results_map, poll_results_to_save_map = self._initiate_lookup_maps(
-                        results, org, poll
-                    )
+                    # the results and their stats deltas are written together under the counts lock so a
+                    # concurrent rebuild of the poll counts can never count them twice
+                    with r.lock(counts_key, timeout=Poll.POLL_SYNC_LOCK_TIMEOUT):
+                        poll_stats_deltas = defaultdict(int)
 
-                    for result in results:
-                        if latest_synced_obj_time is None or json_date_to_datetime(result[0]) > json_date_to_datetime(
-                            latest_synced_obj_time
-                        ):
-                            latest_synced_obj_time = result[0]
-
-                        contact_obj = contacts_map.get(result[2], None)
-                        self._process_run_poll_results(
-                            org,
-                            poll.flow_uuid,
-                            questions_uuids,
-                            result,
-                            contact_obj,
+                        (
+                            contacts_map,
                             poll_results_map,
                             poll_results_to_save_map,
-                            stats_dict,
-                        )
+                            poll_results_to_update_map,
+                        ) = self._initiate_lookup_maps(results, org, poll)
+
+                        for result in results:
+                            if latest_synced_obj_time is None or json_date_to_datetime(
+                                result[0]
+                            ) > json_date_to_datetime(latest_synced_obj_time):
+                                latest_synced_obj_time = result[0]
+
+                            contact_obj = contacts_map.get(result[2], None)
+                            self._process_run_poll_results(
+                                org,
+                                poll.flow_uuid,
+                                questions_uuids,
+                                result,
+                                contact_obj,
+                                poll_results_map,
+                                poll_results_to_save_map,
+                                poll_results_to_update_map,
+                                stats_dict,
+                                poll_stats_deltas,
+                            )
+
+                            stats_dict["num_synced"] += len(results)
+                            if progress_callback:
+                                progress_callback(stats_dict["num_synced"])
 
-                        stats_dict["num_synced"] += len(results)
-                        if progress_callback:
-                            progress_callback(stats_dict["num_synced"])
+                        self._save_updated_poll_results_to_database(poll_results_to_update_map)
+                        self._save_new_poll_results_to_database(poll_results_to_save_map, poll_stats_deltas)
 
-                    self._save_new_poll_results_to_database(poll_results_to_save_map)
+                        if not full_rebuild:
+                            poll.apply_poll_stats_deltas(poll_stats_deltas)
 
                     logger.info(
                         "Processed fetch of %d - %d "
@@ -391,8 +331,6 @@ class FLOIPBackend(BaseBackend):
                     logger.info("=" * 40)
 
                     if stats_dict["num_synced"] >= Poll.POLL_RESULTS_MAX_SYNC_RUNS or time.time() > lock_expiration:
-                        poll.rebuild_poll_results_counts()
-
                         self._mark_poll_results_sync_paused(org, poll, latest_synced_obj_time)
 
                         logger.info(
@@ -464,7 +402,8 @@ class FLOIPBackend(BaseBackend):
             poll_results_map[res.contact][res.ruleset] = res
 
         poll_results_to_save_map = defaultdict(dict)
-        return contacts_map, poll_results_map, poll_results_to_save_map
+        poll_results_to_update_map = dict()
+        return contacts_map, poll_results_map, poll_results_to_save_map, poll_results_to_update_map
 
     def _process_run_poll_results(
         self,
@@ -475,7 +414,9 @@ class FLOIPBackend(BaseBackend):
         contact_obj,
         existing_db_poll_results_map,
         poll_results_to_save_map,
+        poll_results_to_update_map,
         stats_dict,
+        poll_stats_deltas=None,
     ):
         contact_uuid = result[2]
         completed = True
@@ -508,20 +449,9 @@ class FLOIPBackend(BaseBackend):
             )
 
             if update_required:
-                # update the db object
-                PollResult.objects.filter(pk=existing_poll_result.pk).update(
-                    category=category,
-                    text=text,
-                    state=state,
-                    district=district,
-                    ward=ward,
-                    date=value_date,
-                    born=born,
-                    gender=gender,
-                    completed=completed,
-                )
+                self._add_poll_stats_deltas(poll_stats_deltas, existing_poll_result, -1)
 
-                # update the map object as well
+                # update the map object, the db object is updated with the fetch batch
                 existing_poll_result.category = category
                 existing_poll_result.text = text
                 existing_poll_result.state = state
@@ -532,7 +462,10 @@ class FLOIPBackend(BaseBackend):
                 existing_poll_result.gender = gender
                 existing_poll_result.completed = completed
 
+                self._add_poll_stats_deltas(poll_stats_deltas, existing_poll_result, 1)
+
                 existing_db_poll_results_map[contact_uuid][ruleset_uuid] = existing_poll_result
+                poll_results_to_update_map[existing_poll_result.pk] = existing_poll_result
 
                 stats_dict["num_val_updated"] += 1
             else:
@@ -609,7 +542,16 @@ class FLOIPBackend(BaseBackend):
         return update_required
 
     @staticmethod
-    def _save_new_poll_results_to_database(poll_results_to_save_map):
+    def _add_poll_stats_deltas(poll_stats_deltas, poll_result, delta):
+        if poll_stats_deltas is None:
+            return
+
+        gen_stats = poll_result.generate_poll_stats()
+        for dict_key in gen_stats.keys():
+            poll_stats_deltas[dict_key] += delta * gen_stats[dict_key]
+
+    @classmethod
+    def _save_new_poll_results_to_database(cls, poll_results_to_save_map, poll_stats_deltas=None):
         new_poll_results = []
         for c_key in poll_results_to_save_map.keys():
             for r_key in poll_results_to_save_map.get(c_key, dict()):
@@ -618,6 +560,17 @@ class FLOIPBackend(BaseBackend):
                     new_poll_results.append(obj_to_create)
         PollResult.objects.bulk_create(new_poll_results)
 
+        for obj in new_poll_results:
+            cls._add_poll_stats_deltas(poll_stats_deltas, obj, 1)
+
+    @staticmethod
+    def _save_updated_poll_results_to_database(poll_results_to_update_map):
+        PollResult.objects.bulk_update(
+            list(poll_results_to_update_map.values()),
+            ["category", "text", "state", "district", "ward", "date", "born", "gender", "completed"],
+            batch_size=1000,
+        )
+
     @staticmethod
     def _mark_poll_results_sync_paused(org, poll, latest_synced_obj_time):
         # update the time for this poll from which we fetch next time
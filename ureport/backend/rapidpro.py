@@ -2,12 +2,18 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import gzip
-import io
+import hashlib
 import json
 import logging
+import os
+import re
+import tempfile
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from datetime import timedelta
+from urllib.parse import urlparse
 
 import pytz
 import requests
@@ -17,6 +23,7 @@ from django_redis import get_redis_connection
 from temba_client.exceptions import TembaRateExceededError
 from temba_client.v2.types import Run
 
+from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
 
@@ -27,10 +34,12 @@ from ureport.polls.models import Poll, PollQuestion, PollResponseCategory, PollR
 from ureport.polls.tasks import pull_refresh_from_archives
 from ureport.utils import chunk_list, datetime_to_json_date, json_date_to_datetime
 
-from . import BaseBackend
+from . import BaseBackend, ContactFieldMapper
 
 logger = logging.getLogger(__name__)
 
+ARCHIVE_RECORD_FLOW_UUID_REGEX = re.compile(rb'"flow":\s*\{"uuid":\s*"([^"]+)"')
+
 
 class FieldSyncer(BaseSyncer):
     """
@@ -121,170 +130,46 @@ class BoundarySyncer(BaseSyncer):
         local.release()
 
 
-class ContactSyncer(BaseSyncer):
-    model = Contact
-    prefetch_related = ("backend",)
-    local_backend_attr = "backend"
-
-    def get_boundaries_data(self, org):
+class RapidProContactFieldMapper(ContactFieldMapper):
+    """
+    Maps the contact fields by the labels of the synced contact fields and the boundaries synced from RapidPro
+    """
 
-        cache_attr = "__boundaries__%d:%s" % (org.pk, self.backend.slug)
-        if hasattr(self, cache_attr):
-            return getattr(self, cache_attr)
+    def get_field_keys(self):
+        contact_fields = ContactField.objects.filter(org=self.org, backend=self.backend)
+        return {elt.label.lower(): elt.key for elt in contact_fields}
 
-        org_state_boundaries_data = dict()
-        org_district_boundaries_data = dict()
-        org_ward_boundaries_data = dict()
-        state_boundaries = Boundary.objects.filter(org=org, level=Boundary.STATE_LEVEL, backend=self.backend)
-        for state in state_boundaries:
-            org_state_boundaries_data[state.name.lower()] = state.osm_id
-            state_district_data = dict()
-            district_boundaries = Boundary.objects.filter(
-                org=org, level=Boundary.DISTRICT_LEVEL, parent=state, backend=self.backend
-            )
-            for district in district_boundaries:
-                state_district_data[district.name.lower()] = district.osm_id
-                district_ward_data = dict()
-                ward_boundaries = Boundary.objects.filter(
-                    org=org, level=Boundary.WARD_LEVEL, parent=district, backend=self.backend
-                )
-                for ward in ward_boundaries:
-                    district_ward_data[ward.name.lower()] = ward.osm_id
-                org_ward_boundaries_data[district.osm_id] = district_ward_data
+    def get_boundaries(self):
+        return super(RapidProContactFieldMapper, self).get_boundaries().filter(backend=self.backend)
 
-            org_district_boundaries_data[state.osm_id] = state_district_data
 
-        setattr(self, cache_attr, (org_state_boundaries_data, org_district_boundaries_data, org_ward_boundaries_data))
-        return org_state_boundaries_data, org_district_boundaries_data, org_ward_boundaries_data
+class ContactSyncer(BaseSyncer):
+    model = Contact
+    prefetch_related = ("backend",)
+    local_backend_attr = "backend"
 
-    def get_contact_fields(self, org):
-        cache_attr = "__contact_fields__%d:%s" % (org.pk, self.backend.slug)
+    def get_contact_field_mapper(self, org):
+        cache_attr = "__contact_field_mapper__%d:%s" % (org.pk, self.backend.slug)
         if hasattr(self, cache_attr):
             return getattr(self, cache_attr)
-        contact_fields = ContactField.objects.filter(org=org, backend=self.backend)
-        contact_fields_data = {elt.label.lower(): elt.key for elt in contact_fields}
 
-        setattr(self, cache_attr, contact_fields_data)
-        return contact_fields_data
+        mapper = RapidProContactFieldMapper(org, self.backend)
+        setattr(self, cache_attr, mapper)
+        return mapper
 
     def local_kwargs(self, org, remote):
-        from ureport.utils import json_date_to_datetime
+        mapper = self.get_contact_field_mapper(org)
 
-        reporter_group = org.get_config("%s.reporter_group" % self.backend.slug, default="")
-        contact_groups_names = [group.name.lower() for group in remote.groups]
-
-        if not reporter_group.lower() in contact_groups_names:
+        if not mapper.is_reporter(remote):
             return None
 
-        org_state_boundaries_data, org_district_boundaries_data, org_ward_boundaries_data = self.get_boundaries_data(
-            org
-        )
-        contact_fields = self.get_contact_fields(org)
-
-        state = ""
-        district = ""
-        ward = ""
-
-        state_field = org.get_config("%s.state_label" % self.backend.slug, default="")
-        if state_field:
-            state_field = state_field.lower()
-            if org.get_config("common.is_global"):
-                state_name = remote.fields.get(contact_fields.get(state_field), None)
-                if state_name:
-                    state = state_name
+        local_kwargs = mapper.local_kwargs(remote)
 
-            else:
-                state_path = remote.fields.get(contact_fields.get(state_field), None)
-                if state_path:
-                    state_name = state_path.split(" > ")[-1]
-                    state_name = state_name.lower()
-                    state = org_state_boundaries_data.get(state_name, "")
-
-                district_field = org.get_config("%s.district_label" % self.backend.slug, default="")
-                if district_field:
-                    district_field = district_field.lower()
-                    district_path = remote.fields.get(contact_fields.get(district_field), None)
-                    if district_path:
-                        district_name = district_path.split(" > ")[-1]
-                        district_name = district_name.lower()
-                        district = org_district_boundaries_data.get(state, dict()).get(district_name, "")
-
-                ward_field = org.get_config("%s.ward_label" % self.backend.slug, default="")
-                if ward_field:
-                    ward_field = ward_field.lower()
-                    ward_path = remote.fields.get(contact_fields.get(ward_field), None)
-                    if ward_path:
-                        ward_name = ward_path.split(" > ")[-1]
-                        ward_name = ward_name.lower()
-                        ward = org_ward_boundaries_data.get(district, dict()).get(ward_name, "")
-
-        registered_on = None
-        registration_field = org.get_config("%s.registration_label" % self.backend.slug, default="")
-        if registration_field:
-            registration_field = registration_field.lower()
-            registered_on = remote.fields.get(contact_fields.get(registration_field), None)
-            if registered_on:
-                registered_on = json_date_to_datetime(registered_on)
-
-        if not registered_on:
+        if not local_kwargs["registered_on"]:
             # default to created_on to avoid null in the PG triggers
-            registered_on = remote.created_on
-
-        occupation = ""
-        occupation_field = org.get_config("%s.occupation_label" % self.backend.slug, default="")
-        if occupation_field:
-            occupation_field = occupation_field.lower()
-            occupation = remote.fields.get(contact_fields.get(occupation_field), "")
-            if not occupation:
-                occupation = ""
-
-        born = 0
-        born_field = org.get_config("%s.born_label" % self.backend.slug, default="")
-        if born_field:
-            born_field = born_field.lower()
-            try:
-                born = int(remote.fields.get(contact_fields.get(born_field), 0))
-
-                # support only positive django integer field valid values
-                if born < 0 or born > 2147483647:
-                    born = 0
-
-            except ValueError:
-                pass
-            except TypeError:
-                pass
+            local_kwargs["registered_on"] = remote.created_on
 
-        gender = ""
-        gender_field = org.get_config("%s.gender_label" % self.backend.slug, default="")
-        female_label = org.get_config("%s.female_label" % self.backend.slug, default="")
-        male_label = org.get_config("%s.male_label" % self.backend.slug, default="")
-        extra_gender = org.get_config("common.has_extra_gender", default=False)
-
-        if gender_field:
-            gender_field = gender_field.lower()
-            gender = remote.fields.get(contact_fields.get(gender_field), "")
-
-            if gender and gender.lower() == female_label.lower():
-                gender = self.model.FEMALE
-            elif gender and gender.lower() == male_label.lower():
-                gender = self.model.MALE
-            elif gender and extra_gender:
-                gender = self.model.OTHER
-            else:
-                gender = ""
-
-        return {
-            "backend": self.backend,
-            "org": org,
-            "uuid": remote.uuid,
-            "gender": gender,
-            "born": born,
-            "occupation": occupation,
-            "registered_on": registered_on,
-            "state": state,
-            "district": district,
-            "ward": ward,
-        }
+        return local_kwargs
 
     def update_required(self, local, remote, local_kwargs):
         if local_kwargs and local_kwargs["backend"] != local.backend:
@@ -311,6 +196,8 @@ class RapidProBackend(BaseBackend):
     RapidPro instance as a backend
     """
 
+    ARCHIVE_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
     @staticmethod
     def _get_client(org, api_version):
         return org.get_temba_client(api_version=api_version)
@@ -374,6 +261,8 @@ class RapidProBackend(BaseBackend):
                 category__in=result["categories"]
             ).update(is_active=False)
 
+            question.update_categories_data()
+
     def pull_fields(self, org):
         client = self._get_client(org, 2)
         incoming_objects = client.get_fields().all(retry_on_rate_exceed=True)
@@ -405,17 +294,135 @@ class RapidProBackend(BaseBackend):
             org, ContactSyncer(backend=self.backend), fetches, deleted_fetches, progress_callback
         )
 
+    def _get_archive_cache_paths(self, archive):
+        archive_key = archive.hash or hashlib.md5(urlparse(archive.download_url).path.encode("utf-8")).hexdigest()
+        cache_dir = settings.ARCHIVES_CACHE_DIR
+        data_path = os.path.join(cache_dir, "%s.jsonl" % archive_key)
+        index_path = os.path.join(cache_dir, "%s.index.json" % archive_key)
+        return data_path, index_path
+
+    def _cache_archive(self, archive):
+        """
+        Downloads the archive to the local archives cache, decompressed, with an index of the byte ranges of the
+        records of each flow so all the polls of the org can read their records from the same download
+        """
+        data_path, index_path = self._get_archive_cache_paths(archive)
+
+        # the files are touched so the prune keeps the archives still in use
+        try:
+            os.utime(data_path)
+            os.utime(index_path)
+            with open(index_path, "r") as index_file:
+                return json.load(index_file)
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(settings.ARCHIVES_CACHE_DIR, exist_ok=True)
+
+        index = defaultdict(list)
+
+        # spool the download to disk and decompress it line by line, archives can be too large to hold in memory
+        with tempfile.TemporaryFile() as archive_file:
+            with closing(requests.get(archive.download_url, stream=True)) as r:
+                for chunk in r.iter_content(chunk_size=self.ARCHIVE_DOWNLOAD_CHUNK_SIZE):
+                    archive_file.write(chunk)
+
+            archive_file.seek(0)
+            data_file = tempfile.NamedTemporaryFile(dir=settings.ARCHIVES_CACHE_DIR, delete=False)
+            try:
+                with data_file, gzip.GzipFile(fileobj=archive_file, mode="rb") as stream:
+                    offset = 0
+                    for line in stream:
+                        match = ARCHIVE_RECORD_FLOW_UUID_REGEX.search(line)
+                        if match:
+                            flow_uuid = match.group(1).decode("utf-8")
+                        else:
+                            flow_uuid = json.loads(line.decode("utf-8"))["flow"]["uuid"]
+
+                        # extend the last range of the flow if the record follows it
+                        flow_ranges = index[flow_uuid]
+                        if flow_ranges and sum(flow_ranges[-1]) == offset:
+                            flow_ranges[-1][1] += len(line)
+                        else:
+                            flow_ranges.append([offset, len(line)])
+
+                        data_file.write(line)
+                        offset += len(line)
+
+                os.replace(data_file.name, data_path)
+            finally:
+                # a failed download or decompression leaves no partial data file behind
+                if os.path.exists(data_file.name):
+                    os.remove(data_file.name)
+
+        # the index is written last, it marks the cached archive as complete
+        with tempfile.NamedTemporaryFile(mode="w", dir=settings.ARCHIVES_CACHE_DIR, delete=False) as index_file:
+            json.dump(index, index_file)
+        os.replace(index_file.name, index_path)
+
+        return index
+
+    def _prune_archives_cache(self):
+        if not os.path.isdir(settings.ARCHIVES_CACHE_DIR):
+            return
+
+        expired_before = time.time() - settings.ARCHIVES_CACHE_MAX_AGE
+        for name in os.listdir(settings.ARCHIVES_CACHE_DIR):
+            path = os.path.join(settings.ARCHIVES_CACHE_DIR, name)
+            try:
+                if os.path.getmtime(path) < expired_before:
+                    os.remove(path)
+            except OSError:  # pragma: no cover
+                pass
+
     def _iter_archive_records(self, archive, flow_uuid):
-        r = requests.get(archive.download_url, stream=True)
-        stream = gzip.GzipFile(fileobj=io.BytesIO(r.content))
+        index = self._cache_archive(archive)
+        data_path, index_path = self._get_archive_cache_paths(archive)
+
+        try:
+            data_file = open(data_path, "rb")
+        except FileNotFoundError:
+            # the cached archive was pruned since it was indexed, download it again
+            index = self._cache_archive(archive)
+            data_file = open(data_path, "rb")
+
+        with data_file:
+            for offset, length in index.get(flow_uuid, []):
+                data_file.seek(offset)
+                while data_file.tell() < offset + length:
+                    yield json.loads(data_file.readline().decode("utf-8"))
+
+    def _iter_prefetched_archives(self, archives_fetches):
+        """
+        Downloads and indexes the archives ahead in a pool of threads, bounded by the number of workers and the
+        compressed download size of the archives in flight. The archives are yielded in order with their download
+        future, so the results are still processed and written by the calling thread only
+        """
+        with ThreadPoolExecutor(max_workers=settings.ARCHIVES_SYNC_WORKERS) as executor:
+            in_flight = deque()
+            in_flight_size = 0
 
-        while True:
-            line = stream.readline()
-            if not line:
-                break
-            line_decoded = line.decode("utf-8")
-            if line_decoded.find(flow_uuid) > 0:
-                yield json.loads(line_decoded)
+            for archives in archives_fetches:
+                for archive in archives:
+                    if archive.record_count <= 0:
+                        in_flight.append((archive, None))
+                        continue
+
+                    # archive.size is the compressed size, this bounds the bytes downloaded ahead, not memory
+                    while in_flight and (
+                        len(in_flight) >= settings.ARCHIVES_SYNC_WORKERS
+                        or in_flight_size + archive.size > settings.ARCHIVES_SYNC_MAX_IN_FLIGHT_DOWNLOAD_SIZE
+                    ):
+                        done_archive, done_future = in_flight.popleft()
+                        if done_future is not None:
+                            in_flight_size -= done_archive.size
+                        yield done_archive, done_future
+
+                    in_flight.append((archive, executor.submit(self._cache_archive, archive)))
+                    in_flight_size += archive.size
+
+            while in_flight:
+                yield in_flight.popleft()
 
     def _iter_poll_record_runs(self, archive, poll_flow_uuid):
 
@@ -463,61 +470,69 @@ class RapidProBackend(BaseBackend):
             client = self._get_client(org, 2)
 
             questions_uuids = poll.get_question_uuids()
+            self._prune_archives_cache()
+
             archives_query = client.get_archives(archive_type="run", after=first)
             archives_fetches = archives_query.iterfetches(retry_on_rate_exceed=True)
 
             i = 0
-            for archives in archives_fetches:
+            for archive, archive_future in self._iter_prefetched_archives(archives_fetches):
+                i += 1
+                logger.info("Archive %d with %d records, size %d" % (i, archive.record_count, archive.size))
 
-                for archive in archives:
-                    i += 1
-                    logger.info("Archive %d with %d records, size %d" % (i, archive.record_count, archive.size))
+                try:
+                    start_archive = time.time()
+                    logger.info("Archive %d has %d records" % (i, archive.record_count))
 
-                    try:
-                        start_archive = time.time()
-                        logger.info("Archive %d has %d records" % (i, archive.record_count))
+                    if archive.record_count <= 0:
+                        continue
 
-                        if archive.record_count <= 0:
-                            continue
+                    # wait for the archive to be downloaded and indexed
+                    archive_future.result()
 
-                        flow_uuid = poll.flow_uuid
+                    flow_uuid = poll.flow_uuid
 
-                        for fetch in self._iter_poll_record_runs(archive, flow_uuid):
+                    for fetch in self._iter_poll_record_runs(archive, flow_uuid):
 
-                            fetch_start = time.time()
+                        fetch_start = time.time()
 
-                            contacts_map, poll_results_map, poll_results_to_save_map = self._initiate_lookup_maps(
-                                fetch, org, poll
-                            )
+                        (
+                            contacts_map,
+                            poll_results_map,
+                            poll_results_to_save_map,
+                            poll_results_to_update_map,
+                        ) = self._initiate_lookup_maps(fetch, org, poll)
 
-                            for temba_run in fetch:
+                        for temba_run in fetch:
 
-                                contact_obj = contacts_map.get(temba_run.contact.uuid, None)
-                                self._process_run_poll_results(
-                                    org,
-                                    questions_uuids,
-                                    temba_run,
-                                    contact_obj,
-                                    poll_results_map,
-                                    poll_results_to_save_map,
-                                    stats_dict,
-                                )
+                            contact_obj = contacts_map.get(temba_run.contact.uuid, None)
+                            self._process_run_poll_results(
+                                org,
+                                questions_uuids,
+                                temba_run,
+                                contact_obj,
+                                poll_results_map,
+                                poll_results_to_save_map,
+                                poll_results_to_update_map,
+                                stats_dict,
+                            )
 
-                            stats_dict["num_synced"] += len(fetch)
+                        stats_dict["num_synced"] += len(fetch)
 
-                            self._save_new_poll_results_to_database(poll_results_to_save_map)
+                        self._save_updated_poll_results_to_database(poll_results_to_update_map)
+                        self._save_new_poll_results_to_database(poll_results_to_save_map)
 
-                            logger.info(
-                                "Processing archive %d took %ds for fetch of %d"
-                                % (i, time.time() - fetch_start, len(fetch))
-                            )
+                        logger.info(
+                            "Processing archive %d took %ds for fetch of %d"
+                            % (i, time.time() - fetch_start, len(fetch))
+                        )
 
-                        logger.info("Full poll process archive in %ds" % (time.time() - start_archive))
-                    except Exception as e:
-                        logger.info(e)
-                        import traceback
+                    logger.info("Full poll process archive in %ds" % (time.time() - start_archive))
+                except Exception as e:
+                    logger.info(e)
+                    import traceback
 
-                        traceback.print_exc()
+                    traceback.print_exc()
 
         return (
             stats_dict["num_val_created"],
@@ -532,6 +547,7 @@ class RapidProBackend(BaseBackend):
         org = poll.org
         r = get_redis_connection()
         key = Poll.POLL_PULL_RESULTS_TASK_LOCK % (org.pk, poll.flow_uuid)
+        counts_key = Poll.POLL_REBUILD_COUNTS_LOCK % (org.pk, poll.flow_uuid)
 
         stats_dict = dict(
             num_val_created=0,
@@ -568,6 +584,9 @@ class RapidProBackend(BaseBackend):
                     pull_after_delete,
                 ) = poll.get_pull_cached_params()
 
+                # the results are cleared for this sync, Poll.pull_results rebuilds all the counts after it
+                full_rebuild = pull_after_delete is not None
+
                 if pull_after_delete is not None:
                     latest_synced_obj_time = None
                     poll.delete_poll_results()
@@ -595,36 +614,50 @@ class RapidProBackend(BaseBackend):
                             )
                         )
 
-                        contacts_map, poll_results_map, poll_results_to_save_map = self._initiate_lookup_maps(
-                            fetch, org, poll
-                        )
+                        # the results and their stats deltas are written together under the counts lock so a
+                        # concurrent rebuild of the poll counts can never count them twice
+                        with r.lock(counts_key, timeout=Poll.POLL_SYNC_LOCK_TIMEOUT):
+                            poll_stats_deltas = defaultdict(int)
 
-                        for temba_run in fetch:
+                            (
+                                contacts_map,
+                                poll_results_map,
+                                poll_results_to_save_map,
+                                poll_results_to_update_map,
+                            ) = self._initiate_lookup_maps(fetch, org, poll)
+
+                            for temba_run in fetch:
+
+                                if latest_synced_obj_time is None or temba_run.modified_on > json_date_to_datetime(
+                                    latest_synced_obj_time
+                                ):
+                                    latest_synced_obj_time = datetime_to_json_date(
+                                        temba_run.modified_on.replace(tzinfo=pytz.utc)
+                                    )
 
-                            if latest_synced_obj_time is None or temba_run.modified_on > json_date_to_datetime(
-                                latest_synced_obj_time
-                            ):
-                                latest_synced_obj_time = datetime_to_json_date(
-                                    temba_run.modified_on.replace(tzinfo=pytz.utc)
+                                contact_obj = contacts_map.get(temba_run.contact.uuid, None)
+                                self._process_run_poll_results(
+                                    org,
+                                    questions_uuids,
+                                    temba_run,
+                                    contact_obj,
+                                    poll_results_map,
+                                    poll_results_to_save_map,
+                                    poll_results_to_update_map,
+                                    stats_dict,
+                                    poll_stats_deltas,
                                 )
 
-                            contact_obj = contacts_map.get(temba_run.contact.uuid, None)
-                            self._process_run_poll_results(
-                                org,
-                                questions_uuids,
-                                temba_run,
-                                contact_obj,
-                                poll_results_map,
-                                poll_results_to_save_map,
-                                stats_dict,
-                            )
+                            self._save_updated_poll_results_to_database(poll_results_to_update_map)
+                            self._save_new_poll_results_to_database(poll_results_to_save_map, poll_stats_deltas)
+
+                            if not full_rebuild:
+                                poll.apply_poll_stats_deltas(poll_stats_deltas)
 
                         stats_dict["num_synced"] += len(fetch)
                         if progress_callback:
                             progress_callback(stats_dict["num_synced"])
 
-                        self._save_new_poll_results_to_database(poll_results_to_save_map)
-
                         logger.info(
                             "Processed fetch of %d - %d "
                             "runs for poll #%d on org #%d"
@@ -637,8 +670,6 @@ class RapidProBackend(BaseBackend):
                             stats_dict["num_synced"] >= Poll.POLL_RESULTS_MAX_SYNC_RUNS
                             or time.time() > lock_expiration
                         ):
-                            poll.rebuild_poll_results_counts()
-
                             self._mark_poll_results_sync_paused(org, poll, latest_synced_obj_time)
 
                             logger.info(
@@ -665,8 +696,6 @@ class RapidProBackend(BaseBackend):
                                 stats_dict["num_path_ignored"],
                             )
                 except TembaRateExceededError:
-                    poll.rebuild_poll_results_counts()
-
                     self._mark_poll_results_sync_paused(org, poll, latest_synced_obj_time)
 
                     logger.info(
@@ -738,7 +767,8 @@ class RapidProBackend(BaseBackend):
             poll_results_map[res.contact][res.ruleset] = res
 
         poll_results_to_save_map = defaultdict(dict)
-        return contacts_map, poll_results_map, poll_results_to_save_map
+        poll_results_to_update_map = dict()
+        return contacts_map, poll_results_map, poll_results_to_save_map, poll_results_to_update_map
 
     def _process_run_poll_results(
         self,
@@ -748,7 +778,9 @@ class RapidProBackend(BaseBackend):
         contact_obj,
         existing_db_poll_results_map,
         poll_results_to_save_map,
+        poll_results_to_update_map,
         stats_dict,
+        poll_stats_deltas=None,
     ):
         flow_uuid = temba_run.flow.uuid
         contact_uuid = temba_run.contact.uuid
@@ -783,20 +815,9 @@ class RapidProBackend(BaseBackend):
                 )
 
                 if update_required:
-                    # update the db object
-                    PollResult.objects.filter(pk=existing_poll_result.pk).update(
-                        category=category,
-                        text=text,
-                        state=state,
-                        district=district,
-                        ward=ward,
-                        date=value_date,
-                        born=born,
-                        gender=gender,
-                        completed=completed,
-                    )
+                    self._add_poll_stats_deltas(poll_stats_deltas, existing_poll_result, -1)
 
-                    # update the map object as well
+                    # update the map object, the db object is updated with the fetch batch
                     existing_poll_result.category = category
                     existing_poll_result.text = text
                     existing_poll_result.state = state
@@ -807,7 +828,10 @@ class RapidProBackend(BaseBackend):
                     existing_poll_result.gender = gender
                     existing_poll_result.completed = completed
 
+                    self._add_poll_stats_deltas(poll_stats_deltas, existing_poll_result, 1)
+
                     existing_db_poll_results_map[contact_uuid][ruleset_uuid] = existing_poll_result
+                    poll_results_to_update_map[existing_poll_result.pk] = existing_poll_result
 
                     stats_dict["num_val_updated"] += 1
                 else:
@@ -875,20 +899,9 @@ class RapidProBackend(BaseBackend):
                     if existing_poll_result.date is None or value_date > (
                         existing_poll_result.date + timedelta(seconds=5)
                     ):
-                        # update the db object
-                        PollResult.objects.filter(pk=existing_poll_result.pk).update(
-                            category=category,
-                            text=text,
-                            state=state,
-                            district=district,
-                            ward=ward,
-                            date=value_date,
-                            born=born,
-                            gender=gender,
-                            completed=completed,
-                        )
+                        self._add_poll_stats_deltas(poll_stats_deltas, existing_poll_result, -1)
 
-                        # update the map object as well
+                        # update the map object, the db object is updated with the fetch batch
                         existing_poll_result.category = category
                         existing_poll_result.text = text
                         existing_poll_result.state = state
@@ -899,7 +912,10 @@ class RapidProBackend(BaseBackend):
                         existing_poll_result.gender = gender
                         existing_poll_result.completed = completed
 
+                        self._add_poll_stats_deltas(poll_stats_deltas, existing_poll_result, 1)
+
                         existing_db_poll_results_map[contact_uuid][ruleset_uuid] = existing_poll_result
+                        poll_results_to_update_map[existing_poll_result.pk] = existing_poll_result
 
                         stats_dict["num_path_updated"] += 1
                     else:
@@ -969,7 +985,16 @@ class RapidProBackend(BaseBackend):
         return update_required
 
     @staticmethod
-    def _save_new_poll_results_to_database(poll_results_to_save_map):
+    def _add_poll_stats_deltas(poll_stats_deltas, poll_result, delta):
+        if poll_stats_deltas is None:
+            return
+
+        gen_stats = poll_result.generate_poll_stats()
+        for dict_key in gen_stats.keys():
+            poll_stats_deltas[dict_key] += delta * gen_stats[dict_key]
+
+    @classmethod
+    def _save_new_poll_results_to_database(cls, poll_results_to_save_map, poll_stats_deltas=None):
         new_poll_results = []
         for c_key in poll_results_to_save_map.keys():
             for r_key in poll_results_to_save_map.get(c_key, dict()):
@@ -978,6 +1003,17 @@ class RapidProBackend(BaseBackend):
                     new_poll_results.append(obj_to_create)
         PollResult.objects.bulk_create(new_poll_results)
 
+        for obj in new_poll_results:
+            cls._add_poll_stats_deltas(poll_stats_deltas, obj, 1)
+
+    @staticmethod
+    def _save_updated_poll_results_to_database(poll_results_to_update_map):
+        PollResult.objects.bulk_update(
+            list(poll_results_to_update_map.values()),
+            ["category", "text", "state", "district", "ward", "date", "born", "gender", "completed"],
+            batch_size=1000,
+        )
+
     @staticmethod
     def _mark_poll_results_sync_paused(org, poll, latest_synced_obj_time):
         # update the time for this poll from which we fetch next time
@@ -4,7 +4,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from dash.categories.models import Category
 from dash.test import MockClientQuery
 from dash.utils.sync import SyncOutcome
-from mock import patch
+from mock import call, patch
 from temba_client.v2.types import Contact as TembaContact, ObjectRef
 
 from ureport.backend.floip import ContactSyncer, FLOIPBackend
@@ -288,7 +288,7 @@ class FLOIPBackendTest(UreportTest):
             geometry='{"foo":"bar-state"}',
         )
 
-    @patch("requests.request")
+    @patch("requests.Session.request")
     def test_fetch_flows(self, mock_get):
         response_contents = """{
             "links": {
@@ -328,6 +328,15 @@ class FLOIPBackendTest(UreportTest):
 
         self.assertEqual(self.backend.fetch_flows(self.nigeria), fetched_flows)
 
+        mock_get.return_value = MockResponse(200, response_contents, headers={"ETag": '"flows-v1"'})
+        self.assertEqual(self.backend.fetch_flows(self.nigeria), fetched_flows)
+
+        # unchanged pages are taken from the previous fetch
+        mock_get.reset_mock()
+        mock_get.return_value = MockResponse(304)
+        self.assertEqual(self.backend.fetch_flows(self.nigeria), fetched_flows)
+        self.assertEqual(mock_get.call_args[1]["headers"]["If-None-Match"], '"flows-v1"')
+
     @patch("requests.request")
     def test_get_definition(self, mock_get):
         response_contents = """
@@ -597,7 +606,7 @@ class FLOIPBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(10):
+        with self.assertNumQueries(8):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -660,7 +669,7 @@ class FLOIPBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(10):
+        with self.assertNumQueries(8):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -725,7 +734,7 @@ class FLOIPBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(10):
+        with self.assertNumQueries(8):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -791,7 +800,7 @@ class FLOIPBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(10):
+        with self.assertNumQueries(8):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -854,7 +863,7 @@ class FLOIPBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(10):
+        with self.assertNumQueries(8):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -1171,7 +1180,7 @@ class FLOIPBackendTest(UreportTest):
         self.create_poll_question(self.admin, poll, "question 2", "q_1522956746998_26")
         self.create_poll_question(self.admin, poll, "question 3", "q_1522957067432_34")
 
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(11):
             (
                 num_val_created,
                 num_val_updated,
@@ -1185,8 +1194,13 @@ class FLOIPBackendTest(UreportTest):
             (num_val_created, num_val_updated, num_val_ignored, num_path_created, num_path_updated, num_path_ignored),
             (15, 0, 8, 0, 0, 0),
         )
-        mock_redis_lock.assert_called_once_with(
-            Poll.POLL_PULL_RESULTS_TASK_LOCK % (poll.org.pk, poll.flow_uuid), timeout=7200
+        # the fetched results are written under the counts lock, within the pull lock
+        self.assertEqual(
+            mock_redis_lock.call_args_list,
+            [
+                call(Poll.POLL_PULL_RESULTS_TASK_LOCK % (poll.org.pk, poll.flow_uuid), timeout=7200),
+                call(Poll.POLL_REBUILD_COUNTS_LOCK % (poll.org.pk, poll.flow_uuid), timeout=7200),
+            ],
         )
 
         poll_result = PollResult.objects.filter(
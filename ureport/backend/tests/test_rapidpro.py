@@ -5,12 +5,15 @@ import gzip
 import io
 import json
 import logging
+import os
+import shutil
+import tempfile
 from datetime import timedelta
 
 from dash.categories.models import Category
 from dash.test import MockClientQuery
 from dash.utils.sync import SyncOutcome
-from mock import PropertyMock, patch
+from mock import PropertyMock, call, patch
 from temba_client.exceptions import TembaRateExceededError
 from temba_client.v2.types import (
     Archive as TembaArchive,
@@ -21,7 +24,9 @@ from temba_client.v2.types import (
     Run as TembaRun,
 )
 
+from django.conf import settings
 from django.db import connection, reset_queries
+from django.db.models import Sum
 from django.test import override_settings
 from django.utils import timezone
 
@@ -30,6 +35,7 @@ from ureport.contacts.models import Contact, ContactField
 from ureport.flows.models import FlowResult, FlowResultCategory
 from ureport.locations.models import Boundary
 from ureport.polls.models import Poll, PollQuestion, PollResponseCategory, PollResult
+from ureport.stats.models import PollStats
 from ureport.tests import MockResponse, UreportTest
 from ureport.utils import datetime_to_json_date, json_date_to_datetime
 
@@ -508,11 +514,34 @@ class ContactSyncerTest(UreportTest):
             },
         )
 
+    def test_contact_field_mapper(self):
+        mapper = self.syncer.get_contact_field_mapper(self.nigeria)
+        self.assertEqual(mapper, self.syncer.get_contact_field_mapper(self.nigeria))
+
+        self.assertEqual(mapper.reporter_group, "ureporters")
+        self.assertEqual(mapper.state_label, "state")
+
+        # contact fields and the whole boundaries tree are loaded with one query each
+        with self.assertNumQueries(2):
+            mapper.load()
+
+        self.assertEqual(mapper.field_keys["lga"], "lga")
+        self.assertEqual(mapper.field_keys["activité"], "occupation")
+        self.assertEqual(mapper.state_boundaries, {"lagos": "R-LAGOS"})
+        self.assertEqual(mapper.district_boundaries, {"R-LAGOS": {"oyo": "R-OYO"}})
+        self.assertEqual(mapper.ward_boundaries, {"R-OYO": {"ikeja": "R-IKEJA"}})
+
 
 class RapidProBackendTest(UreportTest):
     def setUp(self):
         super(RapidProBackendTest, self).setUp()
         self.backend = RapidProBackend(self.rapidpro_backend)
+
+        archives_cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archives_cache_dir)
+        archives_cache_settings = override_settings(ARCHIVES_CACHE_DIR=archives_cache_dir)
+        archives_cache_settings.enable()
+        self.addCleanup(archives_cache_settings.disable)
         self.education_nigeria = Category.objects.create(
             org=self.nigeria, name="Education", created_by=self.admin, modified_by=self.admin
         )
@@ -738,7 +767,7 @@ class RapidProBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(10):
+        with self.assertNumQueries(8):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -807,7 +836,7 @@ class RapidProBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(11):
+        with self.assertNumQueries(9):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -877,7 +906,7 @@ class RapidProBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(12):
+        with self.assertNumQueries(10):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -943,7 +972,7 @@ class RapidProBackendTest(UreportTest):
             ),
         ]
 
-        with self.assertNumQueries(12):
+        with self.assertNumQueries(10):
             contact_results, resume_cursor = self.backend.pull_contacts(self.nigeria, None, None)
 
         self.assertEqual(
@@ -1233,7 +1262,8 @@ class RapidProBackendTest(UreportTest):
 
         mock_get_runs.side_effect = [MockClientQuery([temba_run])]
 
-        with self.assertNumQueries(6):
+        # the stats deltas of the fetched results are applied along with them
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -1248,8 +1278,13 @@ class RapidProBackendTest(UreportTest):
             (1, 0, 0, 0, 0, 1),
         )
         mock_get_runs.assert_called_with(flow="flow-uuid", after=None, reverse=True)
-        mock_redis_lock.assert_called_once_with(
-            Poll.POLL_PULL_RESULTS_TASK_LOCK % (poll.org.pk, poll.flow_uuid), timeout=7200
+        # the fetched results are written under the counts lock, within the pull lock
+        self.assertEqual(
+            mock_redis_lock.call_args_list,
+            [
+                call(Poll.POLL_PULL_RESULTS_TASK_LOCK % (poll.org.pk, poll.flow_uuid), timeout=7200),
+                call(Poll.POLL_REBUILD_COUNTS_LOCK % (poll.org.pk, poll.flow_uuid), timeout=7200),
+            ],
         )
 
         poll_result = PollResult.objects.filter(flow="flow-uuid", ruleset="ruleset-uuid", contact="C-001").first()
@@ -1261,6 +1296,10 @@ class RapidProBackendTest(UreportTest):
         self.assertEqual(poll_result.category, "Win")
         self.assertEqual(poll_result.text, "We'll win today")
 
+        # the result is counted in the poll stats with the sync
+        question = poll.questions.get(flow_result__result_uuid="ruleset-uuid")
+        self.assertEqual(PollStats.objects.filter(question=question).aggregate(Sum("count"))["count__sum"], 1)
+
         temba_run_1 = TembaRun.create(
             id=1235,
             flow=ObjectRef.create(uuid="flow-uuid", name="Flow 1"),
@@ -1301,7 +1340,7 @@ class RapidProBackendTest(UreportTest):
 
         mock_get_runs.side_effect = [MockClientQuery([temba_run_1, temba_run_2])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(12):
             (
                 num_val_created,
                 num_val_updated,
@@ -1345,7 +1384,7 @@ class RapidProBackendTest(UreportTest):
 
         mock_get_runs.side_effect = [MockClientQuery([temba_run_3])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -1431,7 +1470,7 @@ class RapidProBackendTest(UreportTest):
 
         mock_get_runs.side_effect = [MockClientQuery([temba_run_4])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -1476,7 +1515,7 @@ class RapidProBackendTest(UreportTest):
 
         mock_get_runs.side_effect = [MockClientQuery([temba_run_4])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -1503,7 +1542,7 @@ class RapidProBackendTest(UreportTest):
         PollResult.objects.filter(ruleset="ruleset-uuid-2").update(date=None)
         mock_get_runs.side_effect = [MockClientQuery([temba_run_4])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -1521,7 +1560,7 @@ class RapidProBackendTest(UreportTest):
         PollResult.objects.filter(ruleset="ruleset-uuid").update(date=None)
         mock_get_runs.side_effect = [MockClientQuery([temba_run_4])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -1630,7 +1669,7 @@ class RapidProBackendTest(UreportTest):
 
         mock_get_runs.side_effect = [MockClientQuery([temba_run_no_response])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -1693,7 +1732,7 @@ class RapidProBackendTest(UreportTest):
 
         mock_get_runs.side_effect = [MockClientQuery([temba_run])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -1715,6 +1754,130 @@ class RapidProBackendTest(UreportTest):
         self.assertEqual(poll_result.category, "Win")
         self.assertEqual(poll_result.text, "We'll win today")
 
+    @patch("ureport.backend.rapidpro.RapidProBackend.ARCHIVE_DOWNLOAD_CHUNK_SIZE", 16)
+    @patch("requests.get")
+    def test_iter_archive_records(self, mock_request_get):
+        stream = io.BytesIO()
+        gz = gzip.GzipFile(fileobj=stream, mode="wb")
+        for record in [
+            {"flow": {"uuid": "flow-uuid"}, "id": 1},
+            {"flow": {"uuid": "survey-uuid"}, "id": 2},
+            {"flow": {"uuid": "flow-uuid"}, "id": 3},
+        ]:
+            gz.write(json.dumps(record).encode("utf-8"))
+            gz.write(b"\n")
+        gz.close()
+        stream.seek(0)
+
+        mock_request_get.return_value = MockResponse(200, stream.read())
+
+        archive = TembaArchive.create(
+            archive_type="run",
+            start_date=timezone.now(),
+            period="daily",
+            record_count=3,
+            size=23,
+            hash="f0d79988b7772c003d04a28bd7417a62",
+            download_url="http://s3-bucket.aws.com/my/archive.jsonl.gz",
+        )
+
+        records = list(self.backend._iter_archive_records(archive, "flow-uuid"))
+        self.assertEqual([record["id"] for record in records], [1, 3])
+        mock_request_get.assert_called_once_with("http://s3-bucket.aws.com/my/archive.jsonl.gz", stream=True)
+
+        # other flows are read from the cached archive
+        records = list(self.backend._iter_archive_records(archive, "survey-uuid"))
+        self.assertEqual([record["id"] for record in records], [2])
+        self.assertEqual(list(self.backend._iter_archive_records(archive, "missing-uuid")), [])
+        mock_request_get.assert_called_once_with("http://s3-bucket.aws.com/my/archive.jsonl.gz", stream=True)
+
+        self.assertEqual(
+            self.backend._cache_archive(archive), {"flow-uuid": [[0, 41], [84, 41]], "survey-uuid": [[41, 43]]}
+        )
+
+        # reading a cached archive touches both its files so they are not pruned
+        data_path, index_path = self.backend._get_archive_cache_paths(archive)
+        os.utime(data_path, (0, 0))
+        os.utime(index_path, (0, 0))
+
+        self.backend._cache_archive(archive)
+        self.assertTrue(os.path.getmtime(data_path) > 0)
+        self.assertTrue(os.path.getmtime(index_path) > 0)
+        self.assertEqual(mock_request_get.call_count, 1)
+
+        # an archive pruned after being indexed is downloaded again
+        cache_archive = self.backend._cache_archive
+
+        def cache_archive_then_prune(archive):
+            index = cache_archive(archive)
+            if mock_cache_archive.call_count == 1:
+                os.remove(data_path)
+            return index
+
+        with patch.object(self.backend, "_cache_archive", side_effect=cache_archive_then_prune) as mock_cache_archive:
+            records = list(self.backend._iter_archive_records(archive, "flow-uuid"))
+            self.assertEqual([record["id"] for record in records], [1, 3])
+            self.assertEqual(mock_cache_archive.call_count, 2)
+
+        self.assertEqual(mock_request_get.call_count, 2)
+
+        # a failed decompression leaves no files in the cache
+        mock_request_get.return_value = MockResponse(200, b"not gzipped")
+        broken_archive = TembaArchive.create(
+            archive_type="run",
+            start_date=timezone.now(),
+            period="daily",
+            record_count=3,
+            size=23,
+            hash="4b8e1c8c5a4c3f6b06a4c0f0fbc5d2a1",
+            download_url="http://s3-bucket.aws.com/my/broken.jsonl.gz",
+        )
+
+        cached_files = set(os.listdir(settings.ARCHIVES_CACHE_DIR))
+        with self.assertRaises(OSError):
+            self.backend._cache_archive(broken_archive)
+        self.assertEqual(set(os.listdir(settings.ARCHIVES_CACHE_DIR)), cached_files)
+
+        # expired cached archives are removed
+        with override_settings(ARCHIVES_CACHE_MAX_AGE=-1):
+            self.backend._prune_archives_cache()
+
+        self.assertFalse(os.path.exists(data_path))
+        self.assertFalse(os.path.exists(index_path))
+
+    @override_settings(ARCHIVES_SYNC_WORKERS=2, ARCHIVES_SYNC_MAX_IN_FLIGHT_DOWNLOAD_SIZE=100)
+    @patch("ureport.backend.rapidpro.RapidProBackend._cache_archive")
+    def test_iter_prefetched_archives(self, mock_cache_archive):
+        mock_cache_archive.side_effect = lambda archive: archive.hash
+
+        def create_archive(archive_hash, record_count, size):
+            return TembaArchive.create(
+                archive_type="run",
+                start_date=timezone.now(),
+                period="daily",
+                record_count=record_count,
+                size=size,
+                hash=archive_hash,
+                download_url="http://s3-bucket.aws.com/my/%s.jsonl.gz" % archive_hash,
+            )
+
+        archives_fetches = [
+            [create_archive("archive-1", 10, 60), create_archive("archive-2", 0, 0)],
+            [create_archive("archive-3", 10, 60), create_archive("archive-4", 10, 20)],
+        ]
+
+        prefetched = [
+            (archive.hash, future.result() if future else None)
+            for archive, future in self.backend._iter_prefetched_archives(archives_fetches)
+        ]
+
+        # archives are yielded in order, the empty archives are not downloaded
+        self.assertEqual(
+            prefetched,
+            [("archive-1", "archive-1"), ("archive-2", None), ("archive-3", "archive-3"), ("archive-4", "archive-4")],
+        )
+        self.assertEqual(mock_cache_archive.call_count, 3)
+
     @patch("redis.client.StrictRedis.lock")
     @patch("ureport.polls.models.Poll.get_flow_date")
     @patch("dash.orgs.models.TembaClient.get_archives")
@@ -1864,7 +2027,7 @@ class RapidProBackendTest(UreportTest):
                             period="daily",
                             record_count=12,
                             size=23,
-                            hash="f0d79988b7772c003d04a28bd7417a62",
+                            hash="b6a4a2bbd6b2eb9d5e9b0ce33a4e7a4e",
                             download_url="http://s3-bucket.aws.com/my/archive.jsonl.gz",
                         )
                     ]
@@ -1942,7 +2105,7 @@ class RapidProBackendTest(UreportTest):
 
         mock_get_runs.side_effect = [MockClientQuery([temba_run])]
 
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(13):
             (
                 num_val_created,
                 num_val_updated,
@@ -2485,12 +2648,12 @@ class PerfTest(UreportTest):
 
         PollResult.objects.all().delete()
 
-        with patch("ureport.polls.models.Poll.rebuild_poll_results_counts") as mock_rebuild_counts:
+        with patch("ureport.polls.models.Poll.apply_poll_stats_deltas") as mock_apply_deltas:
             with patch(
                 "ureport.polls.models.Poll.POLL_RESULTS_MAX_SYNC_RUNS", new_callable=PropertyMock
             ) as mock_max_runs:
                 mock_max_runs.return_value = 300
-                mock_rebuild_counts.return_value = "REBUILT"
+                mock_apply_deltas.return_value = "APPLIED"
 
                 mock_get_runs.side_effect = [MockClientQuery(*active_fetches)]
 
@@ -2516,7 +2679,9 @@ class PerfTest(UreportTest):
                     (1, 0, 2 * fetch_size * num_steps - 1, 0, 0, 0),
                 )
 
-                mock_rebuild_counts.assert_called_with()
+                # the stats deltas are applied with each fetch, only the created result counts
+                self.assertEqual(2, mock_apply_deltas.call_count)
+                self.assertEqual(1, sum(sum(elt[0][0].values()) for elt in mock_apply_deltas.call_args_list))
 
                 mock_max_runs.return_value = 200
                 redis_client.delete(key)
@@ -2546,7 +2711,7 @@ class PerfTest(UreportTest):
                     ),
                     (1, 0, fetch_size * num_steps - 1, 0, 0, 0),
                 )
-                mock_rebuild_counts.assert_called_with()
+                self.assertEqual(3, mock_apply_deltas.call_count)
 
         now_date = datetime_to_json_date(now_date)
         mock_get_pull_cached_params.side_effect = [
@@ -2598,12 +2763,12 @@ class PerfTest(UreportTest):
     @patch("dash.orgs.models.TembaClient.get_runs")
     @patch("django.utils.timezone.now")
     @patch("ureport.polls.models.Poll.get_pull_cached_params")
-    @patch("ureport.polls.models.Poll.rebuild_poll_results_counts")
+    @patch("ureport.polls.models.Poll.apply_poll_stats_deltas")
     @patch("ureport.polls.models.Poll.POLL_RESULTS_MAX_SYNC_RUNS", new_callable=PropertyMock)
     def test_pull_results_batching(
         self,
         mock_max_runs,
-        mock_rebuild_counts,
+        mock_apply_deltas,
         mock_get_pull_cached_params,
         mock_timezone_now,
         mock_get_runs,
@@ -2613,7 +2778,7 @@ class PerfTest(UreportTest):
     ):
 
         mock_max_runs.return_value = 300
-        mock_rebuild_counts.return_value = "REBUILT"
+        mock_apply_deltas.return_value = "APPLIED"
         mock_get_pull_cached_params.side_effect = [(None, None)]
 
         now_date = json_date_to_datetime("2015-04-08T12:48:44.320Z")
@@ -8,11 +8,10 @@ from collections import defaultdict
 from dash.orgs.models import Org, OrgBackend
 from django_redis import get_redis_connection
 
-from django.db import connection, models
-from django.db.models import Count, Sum
+from django.db import connection, models, transaction
+from django.db.models import Sum
 from django.utils.translation import ugettext_lazy as _
 
-from ureport.utils import chunk_list
 
 CONTACT_LOCK_KEY = "lock:contact:%d:%s"
 CONTACT_FIELD_LOCK_KEY = "lock:contact-field:%d:%s"
@@ -122,36 +121,55 @@ class Contact(models.Model):
 
     @classmethod
     def recalculate_reporters_stats(cls, org):
-        ReportersCounter.objects.filter(org_id=org.id).delete()
-
-        all_contacts = Contact.objects.filter(org=org).values_list("id", flat=True).order_by("id")
+        """
+        Rebuilds the reporters counters of the org from its contacts, the counters are computed with grouped SQL over
+        one scan of the contacts and replace the existing counters in one transaction
+        """
         start = time.time()
-        i = 0
 
-        all_contacts = list(all_contacts)
-        all_contacts_count = len(all_contacts)
+        with transaction.atomic():
+            ReportersCounter.objects.filter(org_id=org.id).delete()
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO contacts_reporterscounter("org_id", "type", "count")
+                    SELECT c.org_id, counters.type, COUNT(*)
+                    FROM contacts_contact c
+                    CROSS JOIN LATERAL (
+                      VALUES
+                        ('total-reporters'),
+                        (CASE WHEN COALESCE(c.gender, '') <> '' THEN CONCAT('gender:', LOWER(c.gender)) END),
+                        (CASE WHEN COALESCE(c.born, 0) <> 0 THEN CONCAT('born:', c.born) END),
+                        (CASE WHEN COALESCE(c.occupation, '') <> ''
+                          THEN CONCAT('occupation:', LOWER(c.occupation)) END),
+                        (CASE WHEN c.registered_on IS NOT NULL
+                          THEN CONCAT('registered_on:', DATE(c.registered_on)) END),
+                        (CASE WHEN c.registered_on IS NOT NULL AND COALESCE(c.gender, '') <> ''
+                          THEN CONCAT('registered_gender:', DATE(c.registered_on), ':', LOWER(c.gender)) END),
+                        (CASE WHEN c.registered_on IS NOT NULL AND COALESCE(c.born, 0) <> 0
+                          THEN CONCAT('registered_born:', DATE(c.registered_on), ':', c.born) END),
+                        (CASE WHEN c.registered_on IS NOT NULL AND COALESCE(c.state, '') <> ''
+                          THEN CONCAT('registered_state:', DATE(c.registered_on), ':', UPPER(c.state)) END),
+                        (CASE WHEN COALESCE(c.state, '') <> '' THEN CONCAT('state:', UPPER(c.state)) END),
+                        (CASE WHEN COALESCE(c.district, '') <> '' THEN CONCAT('district:', UPPER(c.district)) END),
+                        (CASE WHEN COALESCE(c.ward, '') <> '' THEN CONCAT('ward:', UPPER(c.ward)) END)
+                    ) AS counters(type)
+                    WHERE c.org_id = %s AND c.is_active = TRUE AND counters.type IS NOT NULL
+                    GROUP BY c.org_id, counters.type
+                    RETURNING "org_id", "type", "count"
+                    """,
+                    [org.id],
+                )
+                counters = cursor.fetchall()
 
         counters_dict = defaultdict(int)
-
-        for contact_id_batch in chunk_list(all_contacts, 1000):
-            contact_batch = list(contact_id_batch)
-            contacts = Contact.objects.filter(id__in=contact_batch)
-            for contact in contacts:
-                i += 1
-                gen_counters = contact.generate_counters()
-                for dict_key in gen_counters.keys():
-                    counters_dict[(org.id, dict_key)] += gen_counters[dict_key]
-
-        counters_to_insert = []
-        for counter_tuple in counters_dict.keys():
-            org_id, counter_type = counter_tuple
-            count = counters_dict[counter_tuple]
-            counters_to_insert.append(ReportersCounter(org_id=org_id, type=counter_type, count=count))
-        ReportersCounter.objects.bulk_create(counters_to_insert)
+        for org_id, counter_type, count in counters:
+            counters_dict[(org_id, counter_type)] = count
 
         logger.info(
             "Finished Rebuilding the contacts reporters counters for org #%d in %ds, inserted %d counters objects for %s contacts"
-            % (org.id, time.time() - start, len(counters_to_insert), all_contacts_count)
+            % (org.id, time.time() - start, len(counters_dict), counters_dict.get((org.id, "total-reporters"), 0))
         )
 
         return counters_dict
@@ -227,6 +245,7 @@ class ReportersCounter(models.Model):
 
     COUNTS_SQUASH_LOCK = "org-reporters-counts-squash-lock"
     LAST_SQUASHED_ID_KEY = "org-reporters-last-squashed-id"
+    COUNTS_SQUASH_WINDOW = 100000
 
     org = models.ForeignKey(Org, on_delete=models.PROTECT, related_name="reporters_counters")
 
@@ -253,40 +272,45 @@ class ReportersCounter(models.Model):
                 start = time.time()
                 squash_count = 0
 
-                if last_squash < 1:
-                    counters = (
-                        ReportersCounter.objects.values("org_id", "type")
-                        .annotate(Count("id"))
-                        .filter(id__count__gt=1)
-                        .order_by("org_id", "type")
-                    )
-
-                else:
-                    counters = (
-                        ReportersCounter.objects.filter(id__gt=last_squash)
-                        .values("org_id", "type")
-                        .order_by("org_id", "type")
-                        .distinct("org_id", "type")
-                    )
+                counters = ReportersCounter.objects.filter(id__gt=last_squash)
+                min_id = counters.order_by("id").values_list("id", flat=True).first() or 0
+                max_id = counters.order_by("-id").values_list("id", flat=True).first() or 0
 
-                total_counters = len(counters)
+                # squash all the types with new counters in windows of ids, in one statement per window
+                first_window_start = window_start = max(last_squash, min_id - 1)
+                while window_start < max_id:
+                    window_end = min(window_start + ReportersCounter.COUNTS_SQUASH_WINDOW, max_id)
 
-                # get all the new added counters
-                for counter in counters:
-
-                    # perform our atomic squash in SQL by calling our squash method
                     with connection.cursor() as c:
                         c.execute(
-                            "SELECT ureport_squash_reporterscounters(%s, %s);", (counter["org_id"], counter["type"])
+                            """
+                            WITH squashed_types AS (
+                              SELECT DISTINCT "org_id", "type" FROM contacts_reporterscounter
+                              WHERE "id" > %s AND "id" <= %s
+                            ),
+                            deleted AS (
+                              DELETE FROM contacts_reporterscounter
+                              WHERE ("org_id", "type") IN (SELECT "org_id", "type" FROM squashed_types)
+                              RETURNING "org_id", "type", "count"
+                            )
+                            INSERT INTO contacts_reporterscounter("org_id", "type", "count")
+                            SELECT "org_id", "type", GREATEST(0, SUM("count")) FROM deleted GROUP BY "org_id", "type"
+                            """,
+                            (window_start, window_end),
                         )
+                        squash_count += c.rowcount
 
-                    squash_count += 1
+                    window_start = window_end
 
-                    if squash_count % 100 == 0:
-                        logger.info(
-                            "Squashing progress ... %0.2f/100 in in %0.3fs"
-                            % (squash_count * 100 / total_counters, time.time() - start)
+                    logger.info(
+                        "Squashing progress ... %0.2f/100, %d types in %0.3fs, %0.2f types/s"
+                        % (
+                            (window_start - first_window_start) * 100 / (max_id - first_window_start),
+                            squash_count,
+                            time.time() - start,
+                            squash_count / max(time.time() - start, 0.001),
                         )
+                    )
 
                 # insert our new top squashed id
                 max_id = ReportersCounter.objects.all().order_by("-id").first()
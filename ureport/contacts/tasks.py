@@ -14,7 +14,8 @@ from celery.utils.log import get_task_logger
 
 from ureport.celery import app
 from ureport.contacts.models import Contact
-from ureport.utils import datetime_to_json_date, update_cache_org_contact_counts
+from ureport.locations.models import Boundary
+from ureport.utils import clear_org_page_context, datetime_to_json_date, update_cache_org_contact_counts
 
 logger = get_task_logger(__name__)
 
@@ -26,6 +27,13 @@ def rebuild_contacts_counts():
         Contact.recalculate_reporters_stats(org)
 
 
+@app.task(name="contacts.rebuild_org_geojson_cache")
+def rebuild_org_geojson_cache(org_id):
+    org = Org.objects.filter(id=org_id, is_active=True).first()
+    if org:
+        Boundary.rebuild_org_geojson_cache(org)
+
+
 @org_task("update-org-contact-counts", 60 * 20)
 def update_org_contact_count(org, ignored_since, ignored_until):
     update_cache_org_contact_counts(org)
@@ -83,6 +91,10 @@ def pull_contacts(org, ignored_since, ignored_until):
             % (org.pk, boundaries_created, boundaries_updated, boundaries_deleted, ignored)
         )
 
+        if boundaries_created or boundaries_updated or boundaries_deleted:
+            rebuild_org_geojson_cache.delay(org.pk)
+            clear_org_page_context(org.pk)
+
         logger.info("Fetch boundaries for org #%d took %ss" % (org.pk, time.time() - start_boundaries))
         start_contacts = time.time()
 
@@ -6,7 +6,7 @@ from dash.utils.sync import SyncOutcome
 from mock import patch
 
 from ureport.contacts.models import Contact, ContactField, ReportersCounter
-from ureport.contacts.tasks import pull_contacts, update_org_contact_count
+from ureport.contacts.tasks import pull_contacts, rebuild_org_geojson_cache, update_org_contact_count
 from ureport.locations.models import Boundary
 from ureport.tests import TestBackend, UreportTest
 from ureport.utils import json_date_to_datetime
@@ -215,9 +215,13 @@ class ContactTest(UreportTest):
             district="R-OYO",
         )
         self.assertEqual(ReportersCounter.get_counts(self.nigeria), expected)
-        Contact.recalculate_reporters_stats(self.nigeria)
+        counters = Contact.recalculate_reporters_stats(self.nigeria)
 
         self.assertEqual(ReportersCounter.get_counts(self.nigeria), expected)
+        self.assertEqual(counters, {(self.nigeria.id, key): count for key, count in expected.items()})
+
+        # one counter row per type after the rebuild
+        self.assertEqual(ReportersCounter.objects.filter(org=self.nigeria).count(), len(expected))
 
     def test_reporters_counter(self):
         self.assertEqual(ReportersCounter.get_counts(self.nigeria), dict())
@@ -299,11 +303,31 @@ class ContactTest(UreportTest):
         self.assertFalse(ReportersCounter.objects.filter(pk__in=[counter1.pk, counter3.pk]))
         self.assertEqual(ReportersCounter.objects.filter(type="type-a").count(), 1)
 
-        self.assertTrue(ReportersCounter.objects.filter(pk=counter2.pk))
+        # type-b has a single new counter, it is squashed in place too
+        self.assertFalse(ReportersCounter.objects.filter(pk=counter2.pk))
+        self.assertEqual(ReportersCounter.objects.filter(type="type-b").count(), 1)
 
-        counter_type_a = ReportersCounter.objects.filter(type="type-a").first()
+        self.assertEqual(ReportersCounter.get_counts(self.nigeria), {"type-a": 5, "type-b": 1})
 
-        self.assertTrue(counter_type_a.count, 5)
+        # squashed in windows of ids
+        with patch("ureport.contacts.models.ReportersCounter.COUNTS_SQUASH_WINDOW", 1):
+            ReportersCounter.objects.create(org=self.nigeria, type="type-a", count=-1)
+            ReportersCounter.objects.create(org=self.nigeria, type="type-b", count=4)
+            ReportersCounter.objects.create(org=self.uganda, type="type-b", count=2)
+
+            ReportersCounter.squash_counts()
+
+        self.assertEqual(ReportersCounter.get_counts(self.nigeria), {"type-a": 4, "type-b": 5})
+        self.assertEqual(ReportersCounter.get_counts(self.uganda), {"type-b": 2})
+        self.assertEqual(ReportersCounter.objects.all().count(), 3)
+
+        # a lone negative counter is clamped to zero
+        ReportersCounter.objects.create(org=self.uganda, type="type-c", count=-3)
+
+        ReportersCounter.squash_counts()
+
+        self.assertEqual(ReportersCounter.get_counts(self.uganda), {"type-b": 2, "type-c": 0})
+        self.assertEqual(ReportersCounter.objects.filter(org=self.uganda, type="type-c").count(), 1)
 
 
 class ContactsTasksTest(UreportTest):
@@ -318,13 +342,32 @@ class ContactsTasksTest(UreportTest):
 
         mock_update_cache_org_contact_counts.assert_called_once_with(self.nigeria)
 
+    @patch("ureport.locations.models.Boundary.rebuild_org_geojson_cache")
+    def test_rebuild_org_geojson_cache(self, mock_rebuild_org_geojson_cache):
+        rebuild_org_geojson_cache(self.nigeria.pk)
+        mock_rebuild_org_geojson_cache.assert_called_once_with(self.nigeria)
+
+        mock_rebuild_org_geojson_cache.reset_mock()
+        self.nigeria.is_active = False
+        self.nigeria.save()
+
+        rebuild_org_geojson_cache(self.nigeria.pk)
+        mock_rebuild_org_geojson_cache.assert_not_called()
+
     @patch("dash.orgs.models.Org.get_backend")
     @patch("ureport.contacts.models.ReportersCounter.squash_counts")
     @patch("ureport.tests.TestBackend.pull_fields")
     @patch("ureport.tests.TestBackend.pull_boundaries")
     @patch("ureport.tests.TestBackend.pull_contacts")
+    @patch("ureport.contacts.tasks.rebuild_org_geojson_cache.delay")
     def test_pull_contacts(
-        self, mock_pull_contacts, mock_pull_boundaries, mock_pull_fields, mock_squash_counts, mock_get_backend
+        self,
+        mock_rebuild_org_geojson_cache,
+        mock_pull_contacts,
+        mock_pull_boundaries,
+        mock_pull_fields,
+        mock_squash_counts,
+        mock_get_backend,
     ):
         mock_get_backend.return_value = TestBackend(self.rapidpro_backend)
         mock_pull_fields.return_value = {
@@ -362,4 +405,7 @@ class ContactsTasksTest(UreportTest):
             },
         )
 
+        # the boundaries changed, their geojson is rebuilt in the background
+        mock_rebuild_org_geojson_cache.assert_called_once_with(self.nigeria.pk)
+
         # mock_squash_counts.assert_called_once_with()
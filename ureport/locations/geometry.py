@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+
+
+def point_segment_distance(point, start, end):
+    x, y = point[0], point[1]
+    x1, y1 = start[0], start[1]
+    x2, y2 = end[0], end[1]
+
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return math.hypot(x - x1, y - y1)
+
+    t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / float(dx * dx + dy * dy)))
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+def simplify_line(points, tolerance):
+    """
+    Simplifies a line of coordinates with the Douglas-Peucker algorithm, keeping the points further than the tolerance
+    from the simplified line
+    """
+    if len(points) < 3:
+        return points
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+
+        max_distance, max_index = 0, None
+        for index in range(first + 1, last):
+            distance = point_segment_distance(points[index], points[first], points[last])
+            if distance > max_distance:
+                max_distance, max_index = distance, index
+
+        if max_index is not None and max_distance > tolerance:
+            keep[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_polygon(rings, tolerance):
+    simplified_rings = []
+    for ring in rings:
+        simplified_ring = simplify_line(ring, tolerance)
+
+        # a closed ring needs at least 4 points, keep the original for the rings that collapse
+        if len(simplified_ring) < 4:
+            simplified_ring = ring
+
+        simplified_rings.append(simplified_ring)
+    return simplified_rings
+
+
+def simplify_geometry(geometry, tolerance):
+    """
+    Simplifies the coordinates of a GeoJSON Polygon or MultiPolygon geometry, other geometries are returned as is
+    """
+    if not tolerance or not geometry:
+        return geometry
+
+    geometry_type = geometry.get("type")
+    coordinates = geometry.get("coordinates")
+
+    try:
+        if geometry_type == "Polygon":
+            coordinates = simplify_polygon(coordinates, tolerance)
+        elif geometry_type == "MultiPolygon":
+            coordinates = [simplify_polygon(polygon, tolerance) for polygon in coordinates]
+        else:
+            return geometry
+    except (TypeError, IndexError):
+        # malformed coordinates are served as they are stored
+        return geometry
+
+    return dict(geometry, coordinates=coordinates)
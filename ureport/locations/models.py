@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import hashlib
 import json
 
 from dash.orgs.models import Org, OrgBackend
 from django_redis import get_redis_connection
 
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Q
 from django.utils.translation import ugettext_lazy as _
 
+from .geometry import simplify_geometry
+
 BOUNDARY_LOCK_KEY = "lock:boundary:%d:%s"
 
 
@@ -24,6 +29,10 @@ class Boundary(models.Model):
 
     BOUNDARIES_CACHE_TIMEOUT = 60 * 60 * 24 * 15
     BOUNDARIES_CACHE_KEY = "org:%d:boundaries-osm-ids"
+    BOUNDARIES_GEOJSON_CACHE_KEY = "org:%d:boundaries-geojson:%s:%s:%s"
+
+    # the geometry simplification tolerances in degrees, by the lowest map zoom they are used from
+    GEOJSON_ZOOM_TOLERANCES = ((0, 0.05), (6, 0.01), (9, 0.002), (12, 0))
 
     org = models.ForeignKey(Org, on_delete=models.PROTECT, verbose_name=_("Organization"), related_name="boundaries")
 
@@ -86,16 +95,110 @@ class Boundary(models.Model):
 
         return boundaries
 
-    def as_geojson(self):
+    def as_geojson(self, geometry=None):
         return dict(
             type="Feature",
-            geometry=json.loads(self.geometry),
+            geometry=json.loads(self.geometry) if geometry is None else geometry,
             properties=dict(id=self.osm_id, level=self.level, name=self.name),
         )
 
     @classmethod
-    def get_org_top_level_boundaries_name(cls, org):
+    def get_geojson_tolerance(cls, zoom=None):
+        if zoom is None:
+            return 0
+
+        tolerance = cls.GEOJSON_ZOOM_TOLERANCES[0][1]
+        for min_zoom, zoom_tolerance in cls.GEOJSON_ZOOM_TOLERANCES:
+            if zoom >= min_zoom:
+                tolerance = zoom_tolerance
+        return tolerance
+
+    @classmethod
+    def get_org_map_boundaries(cls, org, osm_id=None):
+        if org.get_config("common.is_global"):
+            location_boundaries = org.boundaries.filter(level=cls.COUNTRY_LEVEL)
+            limit_states = org.get_config("common.limit_states")
+            if limit_states:
+                limit_states = [elt.strip() for elt in limit_states.split(",")]
+                location_boundaries = location_boundaries.filter(osm_id__in=limit_states)
+
+        else:
+            org_boundaries = org.boundaries.all()
+
+            limit_states = org.get_config("common.limit_states")
+            if limit_states:
+                limit_states = [elt.strip() for elt in limit_states.split(",")]
+                org_boundaries = org_boundaries.filter(
+                    Q(level=1, name__in=limit_states)
+                    | Q(parent__name__in=limit_states, level=2)
+                    | Q(parent__parent__name__in=limit_states, level=3)
+                )
+
+            if osm_id:
+                location_boundaries = org_boundaries.filter(parent__osm_id=osm_id)
+            else:
+                location_boundaries = org_boundaries.filter(level=cls.STATE_LEVEL)
+
+        return location_boundaries
+
+    @classmethod
+    def get_geojson_cache_key(cls, org, osm_id, tolerance):
+        # the limited states are part of the key so a config change does not serve the previous boundaries
+        limit_states = org.get_config("common.limit_states") or ""
+        limit_states_hash = hashlib.md5(limit_states.encode("utf-8")).hexdigest()
         if org.get_config("common.is_global"):
+            osm_id = None
+        return cls.BOUNDARIES_GEOJSON_CACHE_KEY % (org.pk, limit_states_hash, osm_id or "", tolerance)
+
+    @classmethod
+    def build_org_geojson(cls, org, osm_id=None, tolerance=0):
+        """
+        Builds and caches the rendered GeoJSON feature collection of the org boundaries on the map for the parent
+        boundary, with the geometries simplified to the tolerance
+        """
+        from ureport.utils import render_json
+
+        boundaries = cls.get_org_map_boundaries(org, osm_id=osm_id).only("osm_id", "level", "name", "geometry")
+
+        features = []
+        for boundary in boundaries:
+            geometry = json.loads(boundary.geometry) if boundary.geometry else None
+            if geometry:
+                features.append(boundary.as_geojson(geometry=simplify_geometry(geometry, tolerance)))
+
+        rendered = render_json(dict(type="FeatureCollection", features=features))
+        cache.set(cls.get_geojson_cache_key(org, osm_id, tolerance), rendered, cls.BOUNDARIES_CACHE_TIMEOUT)
+        return rendered
+
+    @classmethod
+    def get_org_geojson(cls, org, osm_id=None, zoom=None):
+        tolerance = cls.get_geojson_tolerance(zoom)
+
+        rendered = cache.get(cls.get_geojson_cache_key(org, osm_id, tolerance), None)
+        if rendered is None:
+            rendered = cls.build_org_geojson(org, osm_id=osm_id, tolerance=tolerance)
+        return rendered
+
+    @classmethod
+    def rebuild_org_geojson_cache(cls, org):
+        parents_osm_ids = [None]
+        if not org.get_config("common.is_global"):
+            parents_osm_ids += list(
+                cls.objects.filter(org=org, parent__isnull=False).values_list("parent__osm_id", flat=True).distinct()
+            )
+
+        tolerances = [0] + [tolerance for min_zoom, tolerance in cls.GEOJSON_ZOOM_TOLERANCES]
+        for osm_id in parents_osm_ids:
+            for tolerance in sorted(set(tolerances)):
+                cls.build_org_geojson(org, osm_id=osm_id, tolerance=tolerance)
+
+    @classmethod
+    def get_org_top_level(cls, org):
+        return cls.COUNTRY_LEVEL if org.get_config("common.is_global") else cls.STATE_LEVEL
+
+    @classmethod
+    def get_org_top_level_boundaries_name(cls, org):
+        if cls.get_org_top_level(org) == cls.COUNTRY_LEVEL:
             top_boundaries = cls.objects.filter(org=org, level=cls.COUNTRY_LEVEL)
             limit_states = org.get_config("common.limit_poll_states")
             if limit_states:
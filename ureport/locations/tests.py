@@ -75,6 +75,92 @@ class LocationTest(UreportTest):
         self.assertEqual(reverse("public.boundaries", args=["COD.16_1"]), "/boundaries/COD.16_1/")
         self.assertEqual(reverse("public.boundaries", args=["COD.16_1_2"]), "/boundaries/COD.16_1_2/")
 
+    def test_simplify_geometry(self):
+        from .geometry import simplify_geometry, simplify_line
+
+        line = [[0, 0], [1, 0.001], [2, 0], [3, 1], [4, 0]]
+        self.assertEqual(simplify_line(line, 0.01), [[0, 0], [2, 0], [3, 1], [4, 0]])
+        self.assertEqual(simplify_line(line, 2), [[0, 0], [4, 0]])
+
+        polygon = dict(type="Polygon", coordinates=[[[0, 0], [1, 0.001], [2, 0], [2, 2], [0, 2], [0, 0]]])
+        self.assertEqual(
+            simplify_geometry(polygon, 0.01),
+            dict(type="Polygon", coordinates=[[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]]),
+        )
+        self.assertEqual(
+            simplify_geometry(dict(type="MultiPolygon", coordinates=[polygon["coordinates"]]), 0.01),
+            dict(type="MultiPolygon", coordinates=[[[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]]]),
+        )
+
+        # collapsed rings are kept as they are
+        self.assertEqual(simplify_geometry(polygon, 10), polygon)
+        self.assertEqual(simplify_geometry(polygon, 0), polygon)
+
+        point = dict(type="Point", coordinates=[1, 2])
+        self.assertEqual(simplify_geometry(point, 0.01), point)
+
+        malformed = dict(type="MultiPolygon", coordinates=[[1, 2]])
+        self.assertEqual(simplify_geometry(malformed, 0.01), malformed)
+
+    def test_get_org_geojson(self):
+        geometry = dict(type="Polygon", coordinates=[[[0, 0], [1, 0.001], [2, 0], [2, 2], [0, 2], [0, 0]]])
+
+        lagos = Boundary.objects.create(
+            org=self.nigeria, osm_id="R-LAGOS", name="Lagos", parent=None, level=1, geometry=json.dumps(geometry)
+        )
+        Boundary.objects.create(
+            org=self.nigeria, osm_id="R-IKEJA", name="Ikeja", parent=lagos, level=2, geometry=json.dumps(geometry)
+        )
+        Boundary.objects.create(org=self.nigeria, osm_id="R-OYO", name="Oyo", parent=None, level=1, geometry="{}")
+
+        self.assertEqual(Boundary.get_geojson_tolerance(), 0)
+        self.assertEqual(Boundary.get_geojson_tolerance(3), 0.05)
+        self.assertEqual(Boundary.get_geojson_tolerance(7), 0.01)
+        self.assertEqual(Boundary.get_geojson_tolerance(15), 0)
+
+        # the full resolution is served when no zoom is given
+        rendered = Boundary.get_org_geojson(self.nigeria)
+        self.assertEqual(
+            json.loads(rendered["content"]),
+            dict(type="FeatureCollection", features=[lagos.as_geojson()]),
+        )
+
+        rendered = Boundary.get_org_geojson(self.nigeria, zoom=7)
+        self.assertEqual(
+            json.loads(rendered["content"]),
+            dict(
+                type="FeatureCollection",
+                features=[
+                    lagos.as_geojson(geometry=dict(geometry, coordinates=[[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]]))
+                ],
+            ),
+        )
+        rendered = Boundary.get_org_geojson(self.nigeria)
+
+        # served from the cache
+        with self.assertNumQueries(0):
+            self.assertEqual(Boundary.get_org_geojson(self.nigeria), rendered)
+
+        rendered = Boundary.get_org_geojson(self.nigeria, osm_id="R-LAGOS", zoom=7)
+        features = json.loads(rendered["content"])["features"]
+        self.assertEqual([elt["properties"]["id"] for elt in features], ["R-IKEJA"])
+        self.assertEqual(features[0]["geometry"]["coordinates"], [[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]])
+
+        rendered = Boundary.get_org_geojson(self.nigeria, osm_id="R-LAGOS")
+        features = json.loads(rendered["content"])["features"]
+        self.assertEqual(features[0]["geometry"], geometry)
+
+        with patch("ureport.locations.models.Boundary.build_org_geojson") as mock_build_org_geojson:
+            Boundary.rebuild_org_geojson_cache(self.nigeria)
+
+            mock_build_org_geojson.assert_any_call(self.nigeria, osm_id=None, tolerance=0)
+            mock_build_org_geojson.assert_any_call(self.nigeria, osm_id="R-LAGOS", tolerance=0.05)
+            self.assertEqual(mock_build_org_geojson.call_count, 8)
+
+        response = self.client.get(reverse("public.boundaries"), SERVER_NAME="nigeria.ureport.io")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), json.loads(Boundary.get_org_geojson(self.nigeria)["content"]))
+
     def test_build_global_boundaries(self):
         with patch("ureport.locations.models.open") as my_mock:
             my_mock.return_value.__enter__ = lambda s: s
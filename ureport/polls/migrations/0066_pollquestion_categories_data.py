@@ -0,0 +1,26 @@
+# Generated by Django 2.2.20 on 2021-08-17 09:41
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("polls", "0065_auto_20210728_1326"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pollquestion",
+            name="open_ended",
+            field=models.BooleanField(default=False, help_text="Whether this question has a single response category"),
+        ),
+        migrations.AddField(
+            model_name="pollquestion",
+            name="public_categories",
+            field=django.contrib.postgres.fields.jsonb.JSONField(
+                default=list, help_text="The active response categories shown in the results, in their display order"
+            ),
+        ),
+    ]
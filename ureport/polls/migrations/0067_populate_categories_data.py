@@ -0,0 +1,41 @@
+# Generated by Django 2.2.20 on 2021-08-17 09:43
+
+from django.db import migrations
+
+IGNORED_CATEGORY_RULES = ["other", "no response"]
+
+
+def noop(apps, schema_editor):  # pragma: no cover
+    pass
+
+
+def populate_categories_data(apps, schema_editor):  # pragma: no cover
+    PollQuestion = apps.get_model("polls", "PollQuestion")
+    PollResponseCategory = apps.get_model("polls", "PollResponseCategory")
+
+    updated = 0
+
+    for question in PollQuestion.objects.all().only("id"):
+        active_categories = PollResponseCategory.objects.filter(question_id=question.id, is_active=True)
+
+        open_ended = active_categories.exclude(flow_result_category__category__icontains="no response").count() == 1
+        public_categories = [
+            dict(category=elt.category, label=elt.category_displayed or elt.category)
+            for elt in active_categories.order_by("pk")
+            if elt.category and elt.category.lower() not in IGNORED_CATEGORY_RULES
+        ]
+
+        PollQuestion.objects.filter(id=question.id).update(open_ended=open_ended, public_categories=public_categories)
+        updated += 1
+
+    if updated > 0:
+        print(f"populated categories data of {updated} poll questions")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("polls", "0066_pollquestion_categories_data"),
+    ]
+
+    operations = [migrations.RunPython(populate_categories_data, noop)]
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import json
 import logging
 import uuid
 from collections import defaultdict
@@ -16,13 +15,13 @@ from smartmin.models import SmartModel
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import JSONField
 from django.core.cache import cache
-from django.db import connection, models
+from django.db import connection, models, transaction
 from django.db.models import Count, F, Q, Sum
-from django.db.models.functions import Lower
+from django.db.models.functions import Lower, Upper
 from django.utils import timezone, translation
 from django.utils.html import strip_tags
-from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
 
 from ureport.flows.models import FlowResult, FlowResultCategory
@@ -97,6 +96,12 @@ class Poll(SmartModel):
 
     POLL_RESULTS_LAST_OTHER_POLLS_SYNCED_CACHE_KEY = "last:poll_last_other_polls_sync:org:%d:poll:%s"
 
+    POLL_RESULTS_CACHE_VERSION_KEY = "org:%d:poll:%d:results_cache_version"
+
+    POLL_PAGE_SNAPSHOT_CACHE_KEY = "org:%d:poll:%d:page_snapshot"
+
+    POLL_PAGE_SNAPSHOT_MISS_CACHE_TIMEOUT = 60
+
     POLL_RESULTS_LAST_OTHER_POLLS_SYNCED_CACHE_TIMEOUT = 60 * 60 * 24 * 2
 
     POLL_PULL_ALL_RESULTS_AFTER_DELETE_FLAG = "poll-results-pull-after-delete-flag:%s:%s"
@@ -206,6 +211,8 @@ class Poll(SmartModel):
 
             pull_refresh_from_archives.apply_async((poll.pk,), queue="sync")
 
+        latest_synced_obj_time, pull_after_delete = poll.get_pull_cached_params()
+
         (
             num_val_created,
             num_val_updated,
@@ -215,8 +222,11 @@ class Poll(SmartModel):
             num_path_ignored,
         ) = backend.pull_results(poll, None, None)
 
-        if num_val_created + num_val_updated + num_path_created + num_path_updated != 0:
+        # the backend applies the stats deltas with the results, unless the sync started over from cleared results
+        if pull_after_delete is not None:
             poll.rebuild_poll_results_counts()
+        elif num_val_created + num_val_updated + num_path_created + num_path_updated != 0:
+            poll.update_poll_results_caches()
 
         Poll.objects.filter(org=poll.org_id, flow_uuid=poll.flow_uuid).update(has_synced=True)
 
@@ -232,7 +242,7 @@ class Poll(SmartModel):
 
     def delete_poll_stats(self):
         from ureport.utils import chunk_list
-        from ureport.stats.models import PollStats
+        from ureport.stats.models import PollStats, PollStatsCounter
 
         if self.stopped_syncing:
             logger.error("Poll cannot delete stats for poll #%d on org #%d" % (self.pk, self.org_id), exc_info=True)
@@ -240,6 +250,8 @@ class Poll(SmartModel):
 
         question_ids = self.questions.all().values_list("id", flat=True)
 
+        deleted_dates = PollStatsCounter.get_questions_dates(self.org_id, question_ids)
+
         poll_stats_ids = PollStats.objects.filter(org_id=self.org_id, question_id__in=question_ids)
         poll_stats_ids = poll_stats_ids.values_list("pk", flat=True)
 
@@ -248,6 +260,8 @@ class Poll(SmartModel):
         for batch in chunk_list(poll_stats_ids, 1000):
             PollStats.objects.filter(pk__in=batch).delete()
 
+        PollStatsCounter.refresh_counts(self.org_id, deleted_dates)
+
         logger.info("Deleted %d poll stats for poll #%d on org #%d" % (poll_stats_ids_count, self.pk, self.org_id))
 
     def delete_poll_results(self):
@@ -265,27 +279,132 @@ class Poll(SmartModel):
         cache.delete(Poll.POLL_PULL_ALL_RESULTS_AFTER_DELETE_FLAG % (self.org_id, self.pk))
         cache.delete(Poll.POLL_RESULTS_LAST_PULL_CACHE_KEY % (self.org.pk, self.flow_uuid))
 
+    def get_results_cache_version_key(self):
+        return Poll.POLL_RESULTS_CACHE_VERSION_KEY % (self.org_id, self.pk)
+
+    def get_results_cache_version(self):
+        from ureport.utils.local_cache import local_cache
+
+        return local_cache.get(self.get_results_cache_version_key(), 0) or 0
+
+    def invalidate_results_cache(self):
+        """
+        Marks all the cached questions results of this poll as stale by bumping the poll results cache version
+        """
+        from ureport.utils.local_cache import local_cache
+
+        key = self.get_results_cache_version_key()
+        cache.add(key, 0, None)
+        version = cache.incr(key)
+        local_cache.invalidate(key)
+        return version
+
     def update_questions_results_cache(self):
+        # results are written with the next version so readers keep getting fresh hits while we recalculate
+        version = self.get_results_cache_version() + 1
+
         for question in self.questions.all():
             question.calculate_polled()
             question.calculate_responded()
-            question.calculate_results()
-            question.calculate_results(segment=dict(location="State"))
-            question.calculate_results(segment=dict(age="Age"))
-            question.calculate_results(segment=dict(gender="Gender"))
+            question.calculate_results(version=version)
+            question.calculate_results(segment=dict(location="State"), version=version)
+            question.calculate_results(segment=dict(age="Age"), version=version)
+            question.calculate_results(segment=dict(gender="Gender"), version=version)
 
-        self.update_poll_participation_maps_cache()
+        self.update_poll_participation_maps_cache(version=version)
+
+        # any other cached segment results are now stale and get recalculated in the background when requested
+        self.invalidate_results_cache()
+
+        self.update_page_snapshot()
 
     def update_questions_results_cache_task(self):
         from ureport.polls.tasks import update_questions_results_cache
 
         update_questions_results_cache.delay(self.pk)
 
+    def get_page_snapshot_cache_key(self):
+        return Poll.POLL_PAGE_SNAPSHOT_CACHE_KEY % (self.org_id, self.pk)
+
+    def get_page_snapshot(self):
+        """
+        Returns the snapshot of the questions and stats shown on the public poll page, built on a cache miss
+        """
+        from ureport.utils.local_cache import local_cache
+
+        snapshot = local_cache.get(self.get_page_snapshot_cache_key(), None)
+        if snapshot is None:
+            # the results may still be calculating and read as empty, only keep this snapshot until the next rebuild
+            snapshot = self.update_page_snapshot(timeout=Poll.POLL_PAGE_SNAPSHOT_MISS_CACHE_TIMEOUT)
+        return snapshot
+
+    def update_page_snapshot(self, timeout=None):
+        """
+        Builds the snapshot of the questions and stats shown on the public poll page from the cached questions results
+        and stores it as a single cache entry
+        """
+        from ureport.stats.models import GenderSegment
+        from ureport.utils.local_cache import local_cache
+
+        questions = PollQuestion.load_results(
+            self.get_questions(), segments=[dict(gender="gender"), dict(age="age"), dict(location="state")]
+        )
+
+        snapshot = dict(
+            questions=[question.as_page_snapshot() for question in questions],
+            top_question=None,
+            responded_runs="---",
+            response_percentage="---",
+            gender_stats=None,
+            age_stats=None,
+            locations_stats=None,
+        )
+
+        top_question = questions[0] if questions else None
+        if top_question:
+            snapshot["top_question"] = snapshot["questions"][0]
+            snapshot["responded_runs"] = top_question.get_responded()
+            snapshot["response_percentage"] = top_question.get_response_percentage()
+
+            gender_stats = top_question.get_gender_stats()
+            total_gender = 0
+            for elt in gender_stats:
+                total_gender += elt["set"]
+
+            gender_label_dict = {str(v.lower()): k.lower() for k, v in GenderSegment.GENDERS.items()}
+            snapshot["gender_stats"] = {
+                gender_label_dict.get(elt["label"].lower()): dict(
+                    count=elt["set"], percentage=int(round(elt["set"] * 100 / float(total_gender)))
+                )
+                for elt in gender_stats
+                if total_gender
+            }
+
+            age_stats = top_question.get_age_stats()
+            total_age = 0
+            for elt in age_stats:
+                total_age += elt["set"]
+
+            snapshot["age_stats"] = [
+                dict(name=elt["label"], y=int(round(elt["set"] * 100 / float(total_age))))
+                for elt in age_stats
+                if total_age
+            ]
+            snapshot["locations_stats"] = top_question.get_location_stats()
+
+        local_cache.set(self.get_page_snapshot_cache_key(), snapshot, timeout)
+        return snapshot
+
+    def clear_page_snapshot(self):
+        from ureport.utils.local_cache import local_cache
+
+        local_cache.delete(self.get_page_snapshot_cache_key())
+
     def update_question_word_clouds(self):
         for question in self.questions.all().select_related("flow_result"):
             question.generate_word_cloud()
 
-    def update_poll_participation_maps_cache(self):
+    def update_poll_participation_maps_cache(self, version=None):
         top_question = self.get_questions().first()
         if not top_question:
             return
@@ -293,10 +412,12 @@ class Poll(SmartModel):
         org = self.org
         states = org.get_segment_org_boundaries({"location": "State"})
         for state in states:
-            top_question.calculate_results(segment=dict(location="District", parent=state["osm_id"]))
+            top_question.calculate_results(segment=dict(location="District", parent=state["osm_id"]), version=version)
             districts = org.get_segment_org_boundaries(dict(location="state", parent=state["osm_id"]))
             for district in districts:
-                top_question.calculate_results(segment=dict(location="Ward", parent=district["osm_id"]))
+                top_question.calculate_results(
+                    segment=dict(location="Ward", parent=district["osm_id"]), version=version
+                )
 
     @classmethod
     def pull_poll_results_task(cls, poll):
@@ -317,10 +438,232 @@ class Poll(SmartModel):
         Poll.objects.filter(id=self.pk).update(stopped_syncing=False)
         Poll.pull_poll_results_task(self)
 
-    def rebuild_poll_results_counts(self):
-        from ureport.utils import chunk_list
+    def build_poll_stats(self, stats_dict):
+        """
+        Converts the counts keyed by the PollResult generated stats keys to PollStats objects for this poll
+        """
         from ureport.stats.models import PollStats, AgeSegment, GenderSegment
         from ureport.locations.models import Boundary
+
+        poll_year = self.poll_date.year
+
+        questions = self.questions.all().select_related("flow_result")
+        questions = questions.prefetch_related("response_categories__flow_result_category")
+        questions_dict = dict()
+
+        for qsn in questions:
+            categories = qsn.response_categories.all()
+            categoryies_dict = {elt.flow_result_category.category.lower(): elt.id for elt in categories}
+            questions_dict[qsn.flow_result.result_uuid] = dict(id=qsn.id, categories=categoryies_dict)
+
+        gender_dict = {elt.gender.lower(): elt.id for elt in GenderSegment.objects.all()}
+        age_dict = {elt.min_age: elt.id for elt in AgeSegment.objects.all()}
+
+        # only look up the boundaries the stats are keyed by
+        osm_ids = {osm_id for stat_tuple in stats_dict.keys() for osm_id in stat_tuple[5:8] if osm_id}
+        boundaries = Boundary.objects.annotate(upper_osm_id=Upper("osm_id"))
+        boundaries = boundaries.filter(org_id=self.org_id, upper_osm_id__in=osm_ids).only("id", "osm_id")
+        location_dict = {elt.osm_id.upper(): elt.id for elt in boundaries}
+
+        poll_stats_objs = []
+        for stat_tuple in stats_dict.keys():
+            org_id, ruleset, category, born, gender, state, district, ward, date = stat_tuple
+            count = stats_dict.get(stat_tuple)
+            stat_kwargs = dict(org_id=org_id, count=count, date=date)
+
+            if ruleset not in questions_dict:
+                continue
+
+            question_id = questions_dict[ruleset].get("id")
+            if not question_id:
+                continue
+
+            category_id = questions_dict[ruleset].get("categories", dict()).get(category)
+
+            gender_id = None
+            if gender:
+                gender_id = gender_dict.get(gender, gender_dict.get("O"))
+
+            age_id = None
+            if born:
+                age_id = age_dict.get(AgeSegment.get_age_segment_min_age(max(poll_year - int(born), 0)))
+
+            location_id = None
+            if ward:
+                location_id = location_dict.get(ward)
+            elif district:
+                location_id = location_dict.get(district)
+            elif state:
+                location_id = location_dict.get(state)
+
+            if question_id:
+                stat_kwargs["question_id"] = question_id
+            if category_id:
+                stat_kwargs["category_id"] = category_id
+            if age_id:
+                stat_kwargs["age_segment_id"] = age_id
+            if gender_id:
+                stat_kwargs["gender_segment_id"] = gender_id
+            if location_id:
+                stat_kwargs["location_id"] = location_id
+
+            poll_stats_objs.append(PollStats(**stat_kwargs))
+
+        return poll_stats_objs
+
+    def apply_poll_stats_deltas(self, poll_stats_deltas):
+        """
+        Inserts the stats count deltas of the results created or updated by a sync batch as new PollStats rows,
+        squashing merges them later. Callers hold the poll counts lock while writing the results and their deltas
+        so a concurrent rebuild_poll_results_counts, which stays the repair path, cannot count them twice
+        """
+        from ureport.stats.models import PollStats
+
+        poll_stats_deltas = {key: count for key, count in poll_stats_deltas.items() if count}
+
+        # no results were created or updated
+        if not poll_stats_deltas:
+            return
+
+        flow_polls = Poll.objects.filter(org_id=self.org_id, flow_uuid=self.flow_uuid, stopped_syncing=False)
+        for flow_poll in flow_polls:
+            PollStats.objects.bulk_create(flow_poll.build_poll_stats(poll_stats_deltas))
+
+    def update_poll_results_caches(self):
+        """
+        Refreshes the word clouds and the cached questions results once a sync applied new stats deltas
+        """
+        import time
+
+        flow_polls = Poll.objects.filter(org_id=self.org_id, flow_uuid=self.flow_uuid, stopped_syncing=False)
+        for flow_poll in flow_polls:
+            # update the word clouds for questions
+            flow_poll.update_question_word_clouds()
+
+            start_update_cache = time.time()
+            flow_poll.update_questions_results_cache()
+            logger.info(
+                "Calculated questions results and updated the cache for poll #%d on org #%d in %ds"
+                % (flow_poll.pk, flow_poll.org_id, time.time() - start_update_cache)
+            )
+
+    def rebuild_poll_stats(self):
+        """
+        Rebuilds the PollStats of this poll questions from the flow results in the database, the results are
+        normalized and grouped with one INSERT ... SELECT into a staging table which is then swapped in
+        """
+        from ureport.stats.models import AgeSegment, PollStatsCounter
+
+        # same buckets as AgeSegment.get_age_segment_min_age
+        age_min_age_sql = "CASE %s END" % " ".join(
+            [
+                "WHEN GREATEST(%%(poll_year)s - r.born, 0) >= %d THEN %d" % (elt, elt)
+                for elt in reversed(AgeSegment.MIN_AGES)
+            ]
+        )
+
+        category_sql = """
+        CASE WHEN r.category IS NOT NULL AND r.category <> '' AND LOWER(r.category) NOT IN %(ignored_categories)s
+        THEN LOWER(r.category) ELSE '' END
+        """
+
+        insert_sql = """
+        INSERT INTO poll_stats_staging("org_id", "question_id", "category_id", "age_segment_id", "gender_segment_id", "location_id", "date", "count")
+        SELECT r.org_id, q.id, c.id, a.id, g.id,
+          CASE
+            WHEN COALESCE(r.ward, '') <> '' THEN w.id
+            WHEN COALESCE(r.district, '') <> '' THEN d.id
+            WHEN COALESCE(r.state, '') <> '' THEN s.id
+          END AS location_id,
+          date_trunc('day', r.date) AS date,
+          COUNT(*)
+        FROM polls_pollquestion q
+        INNER JOIN flows_flowresult fr ON fr.id = q.flow_result_id
+        INNER JOIN polls_pollresult r
+          ON r.org_id = %%(org_id)s AND r.flow = %%(flow)s AND r.ruleset <> '' AND LOWER(r.ruleset) = fr.result_uuid
+        LEFT JOIN (
+          SELECT prc.question_id, LOWER(frc.category) AS category, MAX(prc.id) AS id
+          FROM polls_pollresponsecategory prc
+          INNER JOIN flows_flowresultcategory frc ON frc.id = prc.flow_result_category_id
+          INNER JOIN polls_pollquestion pq ON pq.id = prc.question_id AND pq.poll_id = %%(poll_id)s
+          GROUP BY prc.question_id, LOWER(frc.category)
+        ) c ON c.question_id = q.id AND c.category = %(category_sql)s
+        LEFT JOIN (
+          SELECT LOWER(gender) AS gender, MAX(id) AS id FROM stats_gendersegment GROUP BY LOWER(gender)
+        ) g ON COALESCE(r.gender, '') <> '' AND g.gender = LOWER(r.gender)
+        LEFT JOIN stats_agesegment a ON COALESCE(r.born, 0) <> 0 AND a.min_age = %(age_min_age_sql)s
+        LEFT JOIN (
+          SELECT UPPER(osm_id) AS osm_id, MAX(id) AS id FROM locations_boundary WHERE org_id = %%(org_id)s
+          GROUP BY UPPER(osm_id)
+        ) s ON s.osm_id = UPPER(r.state)
+        LEFT JOIN (
+          SELECT UPPER(osm_id) AS osm_id, MAX(id) AS id FROM locations_boundary WHERE org_id = %%(org_id)s
+          GROUP BY UPPER(osm_id)
+        ) d ON d.osm_id = UPPER(r.district)
+        LEFT JOIN (
+          SELECT UPPER(osm_id) AS osm_id, MAX(id) AS id FROM locations_boundary WHERE org_id = %%(org_id)s
+          GROUP BY UPPER(osm_id)
+        ) w ON w.osm_id = UPPER(r.ward)
+        WHERE q.poll_id = %%(poll_id)s
+        GROUP BY 1, 2, 3, 4, 5, 6, 7
+        """ % dict(
+            category_sql=category_sql, age_min_age_sql=age_min_age_sql
+        )
+
+        params = dict(
+            org_id=self.org_id,
+            flow=self.flow_uuid,
+            poll_id=self.pk,
+            poll_year=self.poll_date.year,
+            ignored_categories=tuple(PollResponseCategory.IGNORED_CATEGORY_RULES),
+        )
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # the staging table lives until the outermost transaction commits, a rebuild run again within the
+                # same transaction reuses it
+                cursor.execute(
+                    """
+                    CREATE TEMPORARY TABLE IF NOT EXISTS poll_stats_staging (
+                      "org_id" integer, "question_id" integer, "category_id" integer, "age_segment_id" integer,
+                      "gender_segment_id" integer, "location_id" integer, "date" timestamp with time zone,
+                      "count" integer
+                    ) ON COMMIT DROP
+                    """
+                )
+                cursor.execute("TRUNCATE poll_stats_staging")
+                cursor.execute(insert_sql, params)
+
+                # swap the staged stats in for the poll questions
+                cursor.execute(
+                    """
+                    WITH deleted AS (
+                      DELETE FROM stats_pollstats WHERE "org_id" = %(org_id)s
+                      AND "question_id" IN (SELECT "id" FROM polls_pollquestion WHERE "poll_id" = %(poll_id)s)
+                      RETURNING "date"
+                    )
+                    SELECT DISTINCT "date"::date FROM deleted WHERE "date" IS NOT NULL
+                    UNION
+                    SELECT DISTINCT "date"::date FROM poll_stats_staging WHERE "date" IS NOT NULL
+                    """,
+                    params,
+                )
+                rebuilt_dates = [elt[0] for elt in cursor.fetchall()]
+
+                cursor.execute(
+                    """
+                    INSERT INTO stats_pollstats("org_id", "question_id", "category_id", "age_segment_id", "gender_segment_id", "location_id", "date", "count", "is_squashed")
+                    SELECT "org_id", "question_id", "category_id", "age_segment_id", "gender_segment_id", "location_id", "date", "count", TRUE
+                    FROM poll_stats_staging
+                    """
+                )
+                inserted_stats = cursor.rowcount
+
+            PollStatsCounter.refresh_counts(self.org_id, rebuilt_dates)
+
+        return inserted_stats
+
+    def rebuild_poll_results_counts(self):
         import time
 
         start = time.time()
@@ -328,7 +671,6 @@ class Poll(SmartModel):
         poll_id = self.pk
         org_id = self.org_id
         flow = self.flow_uuid
-        poll_year = self.poll_date.year
 
         if self.stopped_syncing:
             flow_polls = Poll.objects.filter(org_id=org_id, flow_uuid=flow, stopped_syncing=True)
@@ -356,103 +698,18 @@ class Poll(SmartModel):
                 flow_polls = Poll.objects.filter(org_id=org_id, flow_uuid=flow, stopped_syncing=False)
                 for flow_poll in flow_polls:
                     poll_id = flow_poll.id
-                    poll_year = flow_poll.poll_date.year
-
-                    poll_results_ids = PollResult.objects.filter(org_id=org_id, flow=flow).values_list("pk", flat=True)
-
-                    poll_results_ids_count = len(poll_results_ids)
-
-                    questions = (
-                        flow_poll.questions.all().select_related("flow_result").prefetch_related("response_categories")
-                    )
-                    questions_dict = dict()
 
-                    if not questions.exists():
+                    if not flow_poll.questions.exists():
                         logger.info("Poll cannot sync without questions for poll #%d on org #%d" % (poll_id, org_id))
                         return
 
-                    for qsn in questions:
-                        categories = qsn.response_categories.all().select_related("flow_result_category")
-                        categoryies_dict = {elt.flow_result_category.category.lower(): elt.id for elt in categories}
-                        questions_dict[qsn.flow_result.result_uuid] = dict(id=qsn.id, categories=categoryies_dict)
-
-                    gender_dict = {elt.gender.lower(): elt.id for elt in GenderSegment.objects.all()}
-                    age_dict = {elt.min_age: elt.id for elt in AgeSegment.objects.all()}
-
-                    boundaries = Boundary.objects.filter(org_id=org_id)
-                    location_dict = {elt.osm_id.upper(): elt.id for elt in boundaries}
-
-                    logger.info("Results query time for pair %s, %s took %ds" % (org_id, flow, time.time() - start))
-
-                    logger.info("Results query time for pair %s, %s took %ds" % (org_id, flow, time.time() - start))
-
-                    processed_results = 0
-                    stats_dict = defaultdict(int)
-
-                    for batch in chunk_list(poll_results_ids, 1000):
-                        poll_results = list(PollResult.objects.filter(pk__in=batch))
-
-                        for result in poll_results:
-                            gen_stats = result.generate_poll_stats()
-                            for dict_key in gen_stats.keys():
-                                stats_dict[dict_key] += gen_stats[dict_key]
-
-                            processed_results += 1
+                    inserted_stats = flow_poll.rebuild_poll_stats()
 
                     logger.info(
-                        "Rebuild counts progress... build counters dict for pair %s, %s, processed %d of %d in %ds"
-                        % (org_id, flow, processed_results, poll_results_ids_count, time.time() - start)
+                        "Rebuild counts progress... inserted %d poll stats for pair %s, %s in %ds"
+                        % (inserted_stats, org_id, flow, time.time() - start)
                     )
 
-                    poll_stats_obj_to_insert = []
-                    for stat_tuple in stats_dict.keys():
-                        org_id, ruleset, category, born, gender, state, district, ward, date = stat_tuple
-                        count = stats_dict.get(stat_tuple)
-                        stat_kwargs = dict(org_id=org_id, count=count, date=date)
-
-                        if ruleset not in questions_dict:
-                            continue
-
-                        question_id = questions_dict[ruleset].get("id")
-                        if not question_id:
-                            continue
-
-                        category_id = questions_dict[ruleset].get("categories", dict()).get(category)
-
-                        gender_id = None
-                        if gender:
-                            gender_id = gender_dict.get(gender, gender_dict.get("O"))
-
-                        age_id = None
-                        if born:
-                            age_id = age_dict.get(AgeSegment.get_age_segment_min_age(max(poll_year - int(born), 0)))
-
-                        location_id = None
-                        if ward:
-                            location_id = location_dict.get(ward)
-                        elif district:
-                            location_id = location_dict.get(district)
-                        elif state:
-                            location_id = location_dict.get(state)
-
-                        if question_id:
-                            stat_kwargs["question_id"] = question_id
-                        if category_id:
-                            stat_kwargs["category_id"] = category_id
-                        if age_id:
-                            stat_kwargs["age_segment_id"] = age_id
-                        if gender_id:
-                            stat_kwargs["gender_segment_id"] = gender_id
-                        if location_id:
-                            stat_kwargs["location_id"] = location_id
-
-                        poll_stats_obj_to_insert.append(PollStats(**stat_kwargs))
-
-                    # Delete existing counters and then create new counters
-                    flow_poll.delete_poll_stats()
-
-                    PollStats.objects.bulk_create(poll_stats_obj_to_insert)
-
                     # update the word clouds for questions
                     flow_poll.update_question_word_clouds()
 
@@ -496,8 +753,10 @@ class Poll(SmartModel):
 
     @classmethod
     def get_brick_polls_ids(cls, org):
+        from ureport.utils.local_cache import local_cache
+
         cache_key = "brick_polls_ids:%d" % org.id
-        brick_polls = cache.get(cache_key, None)
+        brick_polls = local_cache.get(cache_key, None)
 
         if brick_polls is None:
             poll_with_questions = PollQuestion.objects.filter(is_active=True, poll__org=org).values_list(
@@ -519,7 +778,7 @@ class Poll(SmartModel):
             for poll in polls:
                 if poll.get_first_question():
                     brick_polls.append(poll.pk)
-            cache.set(cache_key, brick_polls, BRICK_POLLS_CACHE_TIME)
+            local_cache.set(cache_key, brick_polls, BRICK_POLLS_CACHE_TIME)
 
         return brick_polls
 
@@ -689,6 +948,7 @@ class PollQuestion(SmartModel):
     POLL_QUESTION_POLLED_CACHE_KEY = "org:%d:poll:%d:question_polled:%d"
     POLL_QUESTION_RESULTS_CACHE_KEY = "org:%d:poll:%d:question_results:%d"
     POLL_QUESTION_RESULTS_CACHE_TIMEOUT = 60 * 12
+    POLL_QUESTION_RESULTS_LOCK = "poll-question-results-lock:org:%d:poll:%d:question:%d:%s"
 
     poll = models.ForeignKey(
         Poll, on_delete=models.PROTECT, related_name="questions", help_text=_("The poll this question is part of")
@@ -712,6 +972,14 @@ class PollQuestion(SmartModel):
 
     flow_result = models.ForeignKey(FlowResult, on_delete=models.PROTECT)
 
+    open_ended = models.BooleanField(
+        default=False, help_text=_("Whether this question has a single response category")
+    )
+
+    public_categories = JSONField(
+        default=list, help_text=_("The active response categories shown in the results, in their display order")
+    )
+
     @classmethod
     def update_or_create(cls, user, poll, ruleset_label, uuid, ruleset_type):
         flow_result = FlowResult.update_or_create(poll.org, poll.flow_uuid, uuid, ruleset_label)
@@ -736,6 +1004,25 @@ class PollQuestion(SmartModel):
             )
         return question
 
+    def update_categories_data(self):
+        """
+        Updates the stored open ended flag and public categories from the response categories
+        """
+        self.open_ended = (
+            self.response_categories.filter(is_active=True)
+            .exclude(flow_result_category__category__icontains="no response")
+            .count()
+            == 1
+        )
+
+        categories = self.response_categories.filter(is_active=True).order_by("pk")
+        self.public_categories = [
+            dict(category=elt.category, label=elt.category_displayed or elt.category)
+            for elt in categories
+            if elt.category and elt.category.lower() not in PollResponseCategory.IGNORED_CATEGORY_RULES
+        ]
+        self.save(update_fields=("open_ended", "public_categories"))
+
     def get_public_categories(self):
         return (
             self.response_categories.filter(is_active=True)
@@ -745,14 +1032,116 @@ class PollQuestion(SmartModel):
             .order_by("pk")
         )
 
-    def get_results(self, segment=None):
-        key = PollQuestion.POLL_QUESTION_RESULTS_CACHE_KEY % (self.poll.org.pk, self.poll.pk, self.pk)
+    @classmethod
+    def load_results(cls, questions, segments=None):
+        """
+        Loads the cached results for each of the segments and the cached polled and responded counts of the questions
+        with one cache get_many, the question methods then read these loaded values instead of hitting the cache one
+        key at a time
+        """
+        from ureport.utils.local_cache import local_cache
+
+        questions = list(questions)
+        if not questions:
+            return questions
+
+        segments = [None] + list(segments or [])
+
+        questions_keys = dict()
+        for question in questions:
+            keys = [question.get_results_cache_key(segment=segment) for segment in segments]
+            keys += [question.get_polled_cache_key(), question.get_responded_cache_key()]
+            keys += [question.poll.get_results_cache_version_key()]
+            questions_keys[question.pk] = keys
+
+        cached_values = local_cache.get_many([key for keys in questions_keys.values() for key in keys])
+
+        for question in questions:
+            question._loaded_cache_values = {key: cached_values.get(key) for key in questions_keys[question.pk]}
+
+        return questions
+
+    def get_cached_values(self, keys):
+        from ureport.utils.local_cache import local_cache
+
+        loaded_cache_values = getattr(self, "_loaded_cache_values", None)
+        if loaded_cache_values is not None and all(key in loaded_cache_values for key in keys):
+            return {key: loaded_cache_values[key] for key in keys}
+
+        return local_cache.get_many(keys)
+
+    def get_cached_value(self, key):
+        return self.get_cached_values([key]).get(key, None)
+
+    @staticmethod
+    def get_segment_cache_key(segment):
+        """
+        Builds the same key part for equivalent segments, whatever the order of their keys and the case of the segment
+        names, the parent boundary osm ids are kept as is
+        """
+        parts = []
+        for name, value in segment.items():
+            name = six.text_type(name).lower()
+            value = six.text_type(value)
+            if name != "parent":
+                value = value.lower()
+            parts.append("%s=%s" % (name, value))
+        return ":".join(sorted(parts))
+
+    def get_results_cache_key(self, segment=None):
+        key = PollQuestion.POLL_QUESTION_RESULTS_CACHE_KEY % (self.poll.org_id, self.poll_id, self.pk)
         if segment:
-            key += ":" + slugify(six.text_type(json.dumps(segment)))
+            key += ":" + PollQuestion.get_segment_cache_key(segment)
+        return key
+
+    def get_polled_cache_key(self):
+        return PollQuestion.POLL_QUESTION_POLLED_CACHE_KEY % (self.poll.org_id, self.poll_id, self.pk)
+
+    def get_responded_cache_key(self):
+        return PollQuestion.POLL_QUESTION_RESPONDED_CACHE_KEY % (self.poll.org_id, self.poll_id, self.pk)
+
+    def get_results_lock_key(self, segment=None):
+        segment_key = PollQuestion.get_segment_cache_key(segment) if segment else ""
+        return PollQuestion.POLL_QUESTION_RESULTS_LOCK % (self.poll.org_id, self.poll_id, self.pk, segment_key)
+
+    def acquire_results_lock(self, segment=None):
+        r = get_redis_connection()
+        key = self.get_results_lock_key(segment=segment)
+        return bool(r.set(key, "1", ex=PollQuestion.POLL_QUESTION_RESULTS_CACHE_TIMEOUT, nx=True))
+
+    def release_results_lock(self, segment=None):
+        r = get_redis_connection()
+        r.delete(self.get_results_lock_key(segment=segment))
+
+    def update_results_cache_task(self, segment=None):
+        from ureport.polls.tasks import update_question_results_cache
+
+        # only one recalculation of the same results is queued at a time
+        if self.acquire_results_lock(segment=segment):
+            update_question_results_cache.delay(self.pk, segment)
 
-        cached_value = cache.get(key, None)
+    def get_results(self, segment=None):
+        return self.get_results_cache_value(segment=segment)["results"]
+
+    def get_rendered_results(self, segment=None):
+        from ureport.utils import render_json
+
+        cached_value = self.get_results_cache_value(segment=segment)
+        return cached_value.get("rendered") or render_json(cached_value["results"])
+
+    def get_results_cache_value(self, segment=None):
+        from ureport.utils import render_json
+
+        key = self.get_results_cache_key(segment=segment)
+        version_key = self.poll.get_results_cache_version_key()
+
+        cached_values = self.get_cached_values([key, version_key])
+        cached_value = cached_values.get(key)
         if cached_value:
-            return cached_value["results"]
+            # stale results are still served while they get recalculated in the background
+            if cached_value.get("version", -1) < (cached_values.get(version_key) or 0):
+                self.update_results_cache_task(segment=segment)
+            return cached_value
 
         if getattr(settings, "IS_PROD", False):
             if not segment:
@@ -765,7 +1154,16 @@ class PollQuestion(SmartModel):
                     "Question get results with state segment cache missed", exc_info=True, extra={"stack": True}
                 )
 
-        return self.calculate_results(segment=segment)
+        # nothing to serve, only one request calculates the results and the others get empty results meanwhile
+        if not self.acquire_results_lock(segment=segment):
+            return dict(results=[], rendered=render_json([]))
+
+        try:
+            results = self.calculate_results(segment=segment)
+        finally:
+            self.release_results_lock(segment=segment)
+
+        return dict(results=results, rendered=render_json(results))
 
     def generate_word_cloud(self):
         from ureport.stats.models import PollWordCloud
@@ -796,10 +1194,16 @@ class PollQuestion(SmartModel):
             poll_word_cloud.words = categories
             poll_word_cloud.save()
 
-    def calculate_results(self, segment=None):
+    def calculate_results(self, segment=None, version=None):
         from ureport.stats.models import AgeSegment, PollStats, GenderSegment, PollWordCloud
+        from ureport.utils import render_json
+        from ureport.utils.local_cache import local_cache
         from stop_words import safe_get_stop_words
 
+        # read the version before calculating so an invalidation happening meanwhile leaves these results stale
+        if version is None:
+            version = self.poll.get_results_cache_version()
+
         org = self.poll.org
         open_ended = self.is_open_ended()
         responded = self.calculate_responded()
@@ -837,7 +1241,7 @@ class PollQuestion(SmartModel):
             results.append(dict(open_ended=open_ended, set=responded, unset=polled - responded, categories=categories))
 
         else:
-            categories_qs = self.response_categories.filter(is_active=True).order_by("pk")
+            public_categories = self.public_categories
 
             if segment:
 
@@ -848,42 +1252,44 @@ class PollQuestion(SmartModel):
                 if location_part in ["state", "district", "ward"]:
 
                     location_boundaries = org.get_segment_org_boundaries(segment)
+                    boundaries_ids = set([boundary["id"] for boundary in location_boundaries])
+
+                    # a single grouped query, rows are rolled up to the segment boundaries through the parents chain
+                    segment_stats = (
+                        PollStats.objects.filter(org=org, question=self)
+                        .filter(
+                            Q(location__id__in=boundaries_ids)
+                            | Q(location__parent__id__in=boundaries_ids)
+                            | Q(location__parent__parent__id__in=boundaries_ids)
+                        )
+                        .values(
+                            "location_id",
+                            "location__parent",
+                            "location__parent__parent",
+                            "category_id",
+                            "category__category",
+                        )
+                        .annotate(Sum("count"))
+                    )
+
+                    def boundary_key(elt):
+                        for boundary_id in (
+                            elt["location_id"],
+                            elt["location__parent"],
+                            elt["location__parent__parent"],
+                        ):
+                            if boundary_id in boundaries_ids:
+                                return boundary_id
+
+                    categories_counts, unset_counts = PollQuestion.aggregate_segment_stats(segment_stats, boundary_key)
 
                     for boundary in location_boundaries:
-                        categories = []
                         osm_id = boundary.get("osm_id").upper()
 
-                        categories_results = (
-                            PollStats.objects.filter(org=org, question=self)
-                            .filter(
-                                Q(location__id=boundary["id"])
-                                | Q(location__parent__id=boundary["id"])
-                                | Q(location__parent__parent__id=boundary["id"])
-                            )
-                            .exclude(category=None)
-                            .values("category__category")
-                            .annotate(label=F("category__category"), count=Sum("count"))
-                            .values("label", "count")
-                        )
-                        categories_results_dict = {elt["label"].lower(): elt["count"] for elt in categories_results}
-
-                        unset_count_stats = (
-                            PollStats.objects.filter(org=org, question=self, category=None)
-                            .filter(
-                                Q(location__id=boundary["id"])
-                                | Q(location__parent__id=boundary["id"])
-                                | Q(location__parent__parent__id=boundary["id"])
-                            )
-                            .aggregate(Sum("count"))
+                        categories = self.build_categories_results(
+                            public_categories, categories_counts.get(boundary["id"], dict())
                         )
-                        unset_count = unset_count_stats.get("count__sum", 0) or 0
-
-                        for category_obj in categories_qs:
-                            key = category_obj.category.lower()
-                            categorie_label = category_obj.category_displayed or category_obj.category
-                            if key not in PollResponseCategory.IGNORED_CATEGORY_RULES:
-                                category_count = categories_results_dict.get(key, 0)
-                                categories.append(dict(count=category_count, label=strip_tags(categorie_label)))
+                        unset_count = unset_counts.get(boundary["id"], 0)
 
                         set_count = sum([elt["count"] for elt in categories])
 
@@ -899,6 +1305,17 @@ class PollQuestion(SmartModel):
                         )
                 elif age_part:
                     ages = AgeSegment.objects.all().values("id", "min_age", "max_age")
+
+                    segment_stats = (
+                        PollStats.objects.filter(org=org, question=self)
+                        .exclude(age_segment=None)
+                        .values("age_segment_id", "category_id", "category__category")
+                        .annotate(Sum("count"))
+                    )
+                    categories_counts, unset_counts = PollQuestion.aggregate_segment_stats(
+                        segment_stats, lambda elt: elt["age_segment_id"]
+                    )
+
                     results = []
                     for age in ages:
                         if age["min_age"] == 0:
@@ -914,27 +1331,10 @@ class PollQuestion(SmartModel):
                         elif age["min_age"] == 35:
                             data_key = "35+"
 
-                        categories_results = (
-                            PollStats.objects.filter(org=org, question=self, age_segment_id=age["id"])
-                            .exclude(category=None)
-                            .values("category__category")
-                            .annotate(label=F("category__category"), count=Sum("count"))
-                            .values("label", "count")
+                        categories = self.build_categories_results(
+                            public_categories, categories_counts.get(age["id"], dict())
                         )
-                        categories_results_dict = {elt["label"].lower(): elt["count"] for elt in categories_results}
-
-                        unset_count_stats = PollStats.objects.filter(
-                            org=org, question=self, category=None, age_segment_id=age["id"]
-                        ).aggregate(Sum("count"))
-                        unset_count = unset_count_stats.get("count__sum", 0) or 0
-
-                        categories = []
-                        for category_obj in categories_qs:
-                            key = category_obj.category.lower()
-                            categorie_label = category_obj.category_displayed or category_obj.category
-                            if key not in PollResponseCategory.IGNORED_CATEGORY_RULES:
-                                category_count = categories_results_dict.get(key, 0)
-                                categories.append(dict(count=category_count, label=strip_tags(categorie_label)))
+                        unset_count = unset_counts.get(age["id"], 0)
 
                         set_count = sum([elt["count"] for elt in categories])
 
@@ -949,30 +1349,22 @@ class PollQuestion(SmartModel):
 
                     genders = genders.values("gender", "id")
 
+                    segment_stats = (
+                        PollStats.objects.filter(org=org, question=self)
+                        .exclude(gender_segment=None)
+                        .values("gender_segment_id", "category_id", "category__category")
+                        .annotate(Sum("count"))
+                    )
+                    categories_counts, unset_counts = PollQuestion.aggregate_segment_stats(
+                        segment_stats, lambda elt: elt["gender_segment_id"]
+                    )
+
                     results = []
                     for gender in genders:
-
-                        categories_results = (
-                            PollStats.objects.filter(org=org, question=self, gender_segment_id=gender["id"])
-                            .exclude(category=None)
-                            .values("category__category")
-                            .annotate(label=F("category__category"), count=Sum("count"))
-                            .values("label", "count")
+                        categories = self.build_categories_results(
+                            public_categories, categories_counts.get(gender["id"], dict())
                         )
-                        categories_results_dict = {elt["label"].lower(): elt["count"] for elt in categories_results}
-                        categories = []
-
-                        unset_count_stats = PollStats.objects.filter(
-                            org=org, question=self, category=None, gender_segment_id=gender["id"]
-                        ).aggregate(Sum("count"))
-                        unset_count = unset_count_stats.get("count__sum", 0) or 0
-
-                        for category_obj in categories_qs:
-                            key = category_obj.category.lower()
-                            categorie_label = category_obj.category_displayed or category_obj.category
-                            if key not in PollResponseCategory.IGNORED_CATEGORY_RULES:
-                                category_count = categories_results_dict.get(key, 0)
-                                categories.append(dict(count=category_count, label=strip_tags(categorie_label)))
+                        unset_count = unset_counts.get(gender["id"], 0)
 
                         set_count = sum([elt["count"] for elt in categories])
                         results.append(
@@ -993,27 +1385,50 @@ class PollQuestion(SmartModel):
                     .values("label", "count")
                 )
                 categories_results_dict = {elt["label"].lower(): elt["count"] for elt in categories_results}
-                categories = []
-
-                for category_obj in categories_qs:
-                    key = category_obj.category.lower()
-                    categorie_label = category_obj.category_displayed or category_obj.category
-                    if key not in PollResponseCategory.IGNORED_CATEGORY_RULES:
-                        category_count = categories_results_dict.get(key, 0)
-                        categories.append(dict(count=category_count, label=strip_tags(categorie_label)))
+                categories = self.build_categories_results(public_categories, categories_results_dict)
 
                 results.append(
                     dict(open_ended=open_ended, set=responded, unset=polled - responded, categories=categories)
                 )
 
-        key = PollQuestion.POLL_QUESTION_RESULTS_CACHE_KEY % (self.poll.org.pk, self.poll.pk, self.pk)
-        if segment:
-            key += ":" + slugify(six.text_type(json.dumps(segment)))
+        key = self.get_results_cache_key(segment=segment)
 
-        cache.set(key, {"results": results}, None)
+        local_cache.set(key, {"results": results, "version": version, "rendered": render_json(results)}, None)
 
         return results
 
+    @staticmethod
+    def aggregate_segment_stats(segment_stats, segment_key):
+        """
+        Splits grouped stats rows into the responded counts by category and the unset counts for each segment key
+        """
+        categories_labels_counts = defaultdict(lambda: defaultdict(int))
+        unset_counts = defaultdict(int)
+
+        for elt in segment_stats:
+            key = segment_key(elt)
+            if key is None:
+                continue
+
+            if elt["category_id"] is None:
+                unset_counts[key] += elt["count__sum"]
+            else:
+                categories_labels_counts[key][elt["category__category"]] += elt["count__sum"]
+
+        categories_counts = dict()
+        for key, labels_counts in categories_labels_counts.items():
+            categories_counts[key] = {label.lower(): count for label, count in labels_counts.items()}
+
+        return categories_counts, unset_counts
+
+    @staticmethod
+    def build_categories_results(public_categories, categories_results_dict):
+        categories = []
+        for category in public_categories:
+            category_count = categories_results_dict.get(category["category"].lower(), 0)
+            categories.append(dict(count=category_count, label=strip_tags(category["label"])))
+        return categories
+
     def get_total_summary_data(self):
         cached_results = self.get_results()
         if cached_results:
@@ -1021,16 +1436,22 @@ class PollQuestion(SmartModel):
         return dict()
 
     def is_open_ended(self):
-        return (
-            self.response_categories.filter(is_active=True)
-            .exclude(flow_result_category__category__icontains="no response")
-            .count()
-            == 1
+        return self.open_ended
+
+    def as_page_snapshot(self):
+        # the keys match the question attributes the poll page template reads
+        return dict(
+            id=self.pk,
+            title=self.title,
+            flow_result=dict(result_uuid=self.flow_result.result_uuid),
+            get_responded=self.get_responded(),
+            get_polled=self.get_polled(),
+            is_open_ended=self.is_open_ended(),
         )
 
     def get_responded(self):
-        key = PollQuestion.POLL_QUESTION_RESPONDED_CACHE_KEY % (self.poll.org.pk, self.poll.pk, self.pk)
-        cached_value = cache.get(key, None)
+        key = self.get_responded_cache_key()
+        cached_value = self.get_cached_value(key)
         if cached_value:
             return cached_value["results"]
         if getattr(settings, "IS_PROD", False):
@@ -1040,20 +1461,21 @@ class PollQuestion(SmartModel):
 
     def calculate_responded(self):
         from ureport.stats.models import PollStats
+        from ureport.utils.local_cache import local_cache
 
-        key = PollQuestion.POLL_QUESTION_RESPONDED_CACHE_KEY % (self.poll.org.pk, self.poll.pk, self.pk)
+        key = self.get_responded_cache_key()
         responded_stats = (
             PollStats.objects.filter(org=self.poll.org_id, question=self)
             .exclude(category=None)
             .aggregate(Sum("count"))
         )
         results = responded_stats.get("count__sum", 0) or 0
-        cache.set(key, {"results": results}, None)
+        local_cache.set(key, {"results": results}, None)
         return results
 
     def get_polled(self):
-        key = PollQuestion.POLL_QUESTION_POLLED_CACHE_KEY % (self.poll.org.pk, self.poll.pk, self.pk)
-        cached_value = cache.get(key, None)
+        key = self.get_polled_cache_key()
+        cached_value = self.get_cached_value(key)
         if cached_value:
             return cached_value["results"]
         if getattr(settings, "IS_PROD", False):
@@ -1063,13 +1485,14 @@ class PollQuestion(SmartModel):
 
     def calculate_polled(self):
         from ureport.stats.models import PollStats
+        from ureport.utils.local_cache import local_cache
 
-        key = PollQuestion.POLL_QUESTION_POLLED_CACHE_KEY % (self.poll.org.pk, self.poll.pk, self.pk)
+        key = self.get_polled_cache_key()
 
         polled_stats = PollStats.objects.filter(org_id=self.poll.org_id, question=self).aggregate(Sum("count"))
         results = polled_stats.get("count__sum", 0) or 0
 
-        cache.set(key, {"results": results}, None)
+        local_cache.set(key, {"results": results}, None)
         return results
 
     def get_response_percentage(self):
@@ -1142,6 +1565,8 @@ class PollResponseCategory(models.Model):
                 flow_result_category=flow_result_category,
                 is_active=True,
             )
+
+        question.update_categories_data()
         return existing
 
     class Meta:
@@ -15,8 +15,8 @@ from django.utils import timezone
 
 from ureport.celery import app
 from ureport.utils import (
-    fetch_flows,
     fetch_old_sites_count as do_fetch_old_sites_count,
+    fetch_orgs_flows,
     fetch_shared_sites_count,
     populate_age_and_gender_poll_results,
     update_poll_flow_data,
@@ -265,6 +265,20 @@ def update_questions_results_cache(poll_id):
         poll.update_questions_results_cache()
 
 
+@app.task(name="polls.update_question_results_cache")
+def update_question_results_cache(question_id, segment=None):
+    from .models import PollQuestion
+
+    question = PollQuestion.objects.filter(id=question_id).select_related("poll").first()
+    if not question:
+        return
+
+    try:
+        question.calculate_results(segment=segment)
+    finally:
+        question.release_results_lock(segment=segment)
+
+
 @app.task(name="polls.pull_refresh_from_archives")
 def pull_refresh_from_archives(poll_id):
     from .models import Poll
@@ -320,8 +334,7 @@ def refresh_org_flows(org_id=None):
             if org_id:
                 active_orgs = Org.objects.filter(pk=org_id)
 
-            for org in active_orgs:
-                fetch_flows(org)
+            fetch_orgs_flows(active_orgs)
 
         logger.info("Task: refresh_flows took %ss" % (time.time() - start))
 
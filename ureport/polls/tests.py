@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import json
 import uuid
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 import pytz
@@ -36,7 +38,14 @@ from ureport.polls.tasks import (
     update_results_age_gender,
 )
 from ureport.polls.templatetags.ureport import question_segmented_results
-from ureport.stats.models import AgeSegment, ContactActivity, GenderSegment, PollStats, PollWordCloud
+from ureport.stats.models import (
+    AgeSegment,
+    ContactActivity,
+    GenderSegment,
+    PollStats,
+    PollStatsCounter,
+    PollWordCloud,
+)
 from ureport.tests import MockTembaClient, TestBackend, UreportTest
 from ureport.utils import datetime_to_json_date, json_date_to_datetime
 
@@ -1242,12 +1251,20 @@ class PollTest(UreportTest):
 
         self.assertFalse(PollResult.objects.filter(org=self.nigeria, flow=poll.flow_uuid))
 
+    @patch("ureport.polls.models.Poll.rebuild_poll_results_counts")
+    @patch("ureport.polls.models.Poll.update_poll_results_caches")
     @patch("ureport.polls.tasks.pull_refresh_from_archives.apply_async")
     @patch("ureport.polls.models.Poll.get_flow_date")
     @patch("dash.orgs.models.Org.get_backend")
     @patch("ureport.tests.TestBackend.pull_results")
     def test_poll_pull_results(
-        self, mock_pull_results, mock_get_backend, mock_poll_flow_date, mock_pull_refresh_from_archives_task
+        self,
+        mock_pull_results,
+        mock_get_backend,
+        mock_poll_flow_date,
+        mock_pull_refresh_from_archives_task,
+        mock_update_poll_results_caches,
+        mock_rebuild_poll_results_counts,
     ):
         mock_get_backend.return_value = TestBackend(self.rapidpro_backend)
         mock_pull_results.return_value = (1, 2, 3, 4, 5, 6)
@@ -1266,6 +1283,30 @@ class PollTest(UreportTest):
         self.assertEqual(mock_get_backend.call_args[1], {"backend_slug": "rapidpro"})
         mock_pull_results.assert_called_once()
 
+        # the stats deltas were applied by the backend, only the caches are refreshed
+        mock_update_poll_results_caches.assert_called_once_with()
+        self.assertFalse(mock_rebuild_poll_results_counts.called)
+
+        mock_update_poll_results_caches.reset_mock()
+        mock_pull_results.return_value = (0, 0, 3, 0, 0, 6)
+
+        Poll.pull_results(poll.pk)
+        self.assertFalse(mock_update_poll_results_caches.called)
+        self.assertFalse(mock_rebuild_poll_results_counts.called)
+
+        # the results were cleared for this sync, the counts are rebuilt
+        cache.set(
+            Poll.POLL_PULL_ALL_RESULTS_AFTER_DELETE_FLAG % (poll.org_id, poll.pk),
+            datetime_to_json_date(timezone.now()),
+            None,
+        )
+
+        Poll.pull_results(poll.pk)
+        mock_rebuild_poll_results_counts.assert_called_once_with()
+        self.assertFalse(mock_update_poll_results_caches.called)
+
+        cache.delete(Poll.POLL_PULL_ALL_RESULTS_AFTER_DELETE_FLAG % (poll.org_id, poll.pk))
+
     @patch("ureport.polls.tasks.pull_refresh_from_archives.apply_async")
     @patch("ureport.polls.models.Poll.get_flow_date")
     @patch("dash.orgs.models.Org.get_backend")
@@ -1344,6 +1385,157 @@ class PollQuestionTest(UreportTest):
 
         self.assertEqual(poll_question1.calculate_results(), calculated_results)
 
+    def test_load_results(self):
+        poll1 = self.create_poll(self.uganda, "Poll 1", "uuid-1", self.health_uganda, self.admin, featured=True)
+
+        poll_question1 = self.create_poll_question(self.admin, poll1, "question 1", "uuid-101")
+        poll_question2 = self.create_poll_question(self.admin, poll1, "question 2", "uuid-102")
+
+        self.create_poll_response_category(poll_question1, "rule-uuid-1", "Yes")
+        self.create_poll_response_category(poll_question1, "rule-uuid-2", "No")
+        self.create_poll_response_category(poll_question2, "rule-uuid-3", "Other")
+
+        cache.set(poll_question1.get_results_cache_key(), {"results": ["all"], "version": 0}, None)
+        cache.set(
+            poll_question1.get_results_cache_key(segment=dict(age="Age")), {"results": ["age"], "version": 0}, None
+        )
+        cache.set(poll_question1.get_polled_cache_key(), {"results": 10}, None)
+        cache.set(poll_question1.get_responded_cache_key(), {"results": 7}, None)
+
+        with self.assertNumQueries(1):
+            questions = PollQuestion.load_results(poll1.questions.all().order_by("pk"), segments=[dict(age="Age")])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(questions[0].get_results(), ["all"])
+            self.assertEqual(questions[0].get_results(segment=dict(age="Age")), ["age"])
+            self.assertEqual(questions[0].get_polled(), 10)
+            self.assertEqual(questions[0].get_responded(), 7)
+            self.assertFalse(questions[0].is_open_ended())
+            self.assertTrue(questions[1].is_open_ended())
+
+        self.assertEqual(PollQuestion.load_results([]), [])
+
+    @patch("ureport.polls.tasks.update_question_results_cache.delay")
+    def test_get_results_cache(self, mock_task_delay):
+        poll1 = self.create_poll(self.uganda, "Poll 1", "uuid-1", self.health_uganda, self.admin, featured=True)
+
+        poll_question1 = self.create_poll_question(self.admin, poll1, "question 1", "uuid-101")
+
+        self.assertEqual(
+            poll_question1.get_results_cache_key(segment=dict(location="State", parent="R123")),
+            poll_question1.get_results_cache_key(segment=dict(parent="R123", location="state")),
+        )
+        self.assertTrue(
+            poll_question1.get_results_cache_key(segment=dict(location="District", parent="R123")).endswith(
+                ":location=district:parent=R123"
+            )
+        )
+
+        # the version is kept in redis and the poll ids are reused by other test runs
+        cache.delete(poll1.get_results_cache_version_key())
+        self.assertEqual(poll1.get_results_cache_version(), 0)
+
+        # cold cache, the results are calculated and written through
+        results = poll_question1.get_results(segment=dict(age="Age"))
+        cached_value = cache.get(poll_question1.get_results_cache_key(segment=dict(age="Age")))
+        self.assertEqual(cached_value["results"], results)
+        self.assertEqual(cached_value["version"], 0)
+        self.assertEqual(json.loads(cached_value["rendered"]["content"]), results)
+        self.assertEqual(poll_question1.get_rendered_results(segment=dict(age="Age")), cached_value["rendered"])
+        self.assertFalse(mock_task_delay.called)
+
+        # another request is already calculating the results
+        cache.delete(poll_question1.get_results_cache_key(segment=dict(age="Age")))
+        self.assertTrue(poll_question1.acquire_results_lock(segment=dict(age="Age")))
+        self.assertEqual(poll_question1.get_results(segment=dict(age="Age")), [])
+        poll_question1.release_results_lock(segment=dict(age="Age"))
+
+        cache.set(poll_question1.get_results_cache_key(), {"results": ["stale"], "version": 0}, None)
+        self.assertEqual(poll1.invalidate_results_cache(), 1)
+
+        # stale results are served and recalculated in the background once
+        self.assertEqual(poll_question1.get_results(), ["stale"])
+        self.assertEqual(poll_question1.get_results(), ["stale"])
+        mock_task_delay.assert_called_once_with(poll_question1.pk, None)
+
+        poll_question1.release_results_lock()
+
+        with patch("ureport.polls.models.PollQuestion.calculate_results") as mock_calculate_results, patch(
+            "ureport.polls.models.Poll.update_page_snapshot"
+        ) as mock_update_page_snapshot:
+            mock_calculate_results.return_value = "Done"
+
+            poll1.update_questions_results_cache()
+            mock_calculate_results.assert_any_call(version=2)
+            mock_calculate_results.assert_any_call(segment=dict(age="Age"), version=2)
+            mock_update_page_snapshot.assert_called_once_with()
+
+        self.assertEqual(poll1.get_results_cache_version(), 2)
+
+    def test_page_snapshot(self):
+        poll1 = self.create_poll(self.uganda, "Poll 1", "uuid-1", self.health_uganda, self.admin, featured=True)
+
+        snapshot = poll1.get_page_snapshot()
+        self.assertEqual(snapshot["questions"], [])
+        self.assertIsNone(snapshot["top_question"])
+        self.assertIsNone(snapshot["gender_stats"])
+
+        # snapshots built on a miss may hold results still being calculated so they expire soon
+        self.assertTrue(
+            0 < cache.ttl(poll1.get_page_snapshot_cache_key()) <= Poll.POLL_PAGE_SNAPSHOT_MISS_CACHE_TIMEOUT
+        )
+
+        poll_question1 = self.create_poll_question(self.admin, poll1, "question 1", "uuid-101")
+
+        # the snapshot is served from the cache until it is rebuilt
+        self.assertEqual(poll1.get_page_snapshot(), snapshot)
+
+        cache.set(poll_question1.get_polled_cache_key(), {"results": 40}, None)
+        cache.set(poll_question1.get_responded_cache_key(), {"results": 10}, None)
+        cache.set(
+            poll_question1.get_results_cache_key(segment=dict(gender="gender")),
+            {
+                "results": [dict(label="Male", set=3, unset=0), dict(label="Female", set=1, unset=0)],
+                "version": 0,
+            },
+            None,
+        )
+        cache.set(
+            poll_question1.get_results_cache_key(segment=dict(age="age")),
+            {"results": [dict(label="0-14", set=2, unset=0), dict(label="15-19", set=2, unset=0)], "version": 0},
+            None,
+        )
+        cache.set(
+            poll_question1.get_results_cache_key(segment=dict(location="state")),
+            {"results": [dict(label="Kampala", set=4, unset=0)], "version": 0},
+            None,
+        )
+
+        snapshot = poll1.update_page_snapshot()
+        self.assertEqual(poll1.get_page_snapshot(), snapshot)
+        self.assertIsNone(cache.ttl(poll1.get_page_snapshot_cache_key()))
+
+        question_snapshot = dict(
+            id=poll_question1.pk,
+            title="question 1",
+            flow_result=dict(result_uuid="uuid-101"),
+            get_responded=10,
+            get_polled=40,
+            is_open_ended=poll_question1.is_open_ended(),
+        )
+        self.assertEqual(snapshot["questions"], [question_snapshot])
+        self.assertEqual(snapshot["top_question"], question_snapshot)
+        self.assertEqual(snapshot["responded_runs"], 10)
+        self.assertEqual(snapshot["response_percentage"], "25%")
+        self.assertEqual(
+            snapshot["gender_stats"], dict(m=dict(count=3, percentage=75), f=dict(count=1, percentage=25))
+        )
+        self.assertEqual(snapshot["age_stats"], [dict(name="0-14", y=50), dict(name="15-19", y=50)])
+        self.assertEqual(snapshot["locations_stats"], [dict(label="Kampala", set=4, unset=0)])
+
+        poll1.clear_page_snapshot()
+        self.assertIsNone(cache.get(poll1.get_page_snapshot_cache_key()))
+
     def test_poll_question_model(self):
         poll1 = self.create_poll(self.uganda, "Poll 1", "uuid-1", self.health_uganda, self.admin, featured=True)
 
@@ -1362,10 +1554,12 @@ class PollQuestionTest(UreportTest):
 
         self.create_poll_response_category(poll_question1, "rule-uuid-2", "No")
         PollResponseCategory.objects.filter(category="No").update(is_active=False)
+        poll_question1.update_categories_data()
 
         self.assertTrue(poll_question1.is_open_ended())
 
         PollResponseCategory.objects.filter(category="No").update(is_active=True)
+        poll_question1.update_categories_data()
 
         self.assertFalse(poll_question1.is_open_ended())
 
@@ -1566,10 +1760,12 @@ class PollQuestionTest(UreportTest):
 
         no_category = self.create_poll_response_category(poll_question1, "rule-uuid-2", "No")
         PollResponseCategory.objects.filter(category="No").update(is_active=False)
+        poll_question1.update_categories_data()
 
         self.assertTrue(poll_question1.is_open_ended())
 
         PollResponseCategory.objects.filter(category="No").update(is_active=True)
+        poll_question1.update_categories_data()
 
         self.assertFalse(poll_question1.is_open_ended())
 
@@ -1744,10 +1940,12 @@ class PollQuestionTest(UreportTest):
 
         no_category = self.create_poll_response_category(poll_question1, "rule-uuid-2", "No")
         PollResponseCategory.objects.filter(category="No").update(is_active=False)
+        poll_question1.update_categories_data()
 
         self.assertTrue(poll_question1.is_open_ended())
 
         PollResponseCategory.objects.filter(category="No").update(is_active=True)
+        poll_question1.update_categories_data()
 
         self.assertFalse(poll_question1.is_open_ended())
 
@@ -1823,6 +2021,10 @@ class PollQuestionTest(UreportTest):
         ]
         self.assertEqual(poll_question1.calculate_results(), calculated_results)
 
+        # the daily counters of the squashed day are refreshed
+        counters = PollStatsCounter.objects.filter(org=self.uganda, date=now.date())
+        self.assertEqual(dict(counters.values_list("is_responded", "count")), {False: 1, True: 6})
+
         PollStats.objects.create(
             org=self.uganda,
             question=poll_question1,
@@ -2071,11 +2273,12 @@ class PollQuestionTest(UreportTest):
 
         self.poll = self.create_poll(self.org, "Poll 1", "uuid-1", self.education, self.admin)
 
-        with patch("ureport.polls.tasks.fetch_flows") as mock_fetch_flows:
-            mock_fetch_flows.return_value = "FETCHED"
+        with patch("ureport.polls.tasks.fetch_orgs_flows") as mock_fetch_orgs_flows:
+            mock_fetch_orgs_flows.return_value = "FETCHED"
 
             refresh_org_flows(self.org.pk)
-            mock_fetch_flows.assert_called_once_with(self.org)
+            self.assertEqual(mock_fetch_orgs_flows.call_count, 1)
+            self.assertEqual(list(mock_fetch_orgs_flows.call_args[0][0]), [self.org])
 
         with patch("ureport.polls.tasks.do_fetch_old_sites_count") as mock_fetch_old_sites_count:
             mock_fetch_old_sites_count.return_value = "FETCHED"
@@ -2537,6 +2740,125 @@ class PollResultsTest(UreportTest):
             [{"count": 1, "label": "Yes"}, {"count": 0, "label": "No"}],
         )
 
+        PollStats.objects.create(
+            org=self.nigeria, question=self.poll_question, category=None, location=oyo_boundary, date=None, count=3
+        )
+
+        self.assertEqual(
+            self.poll_question.calculate_results(segment=dict(location="State")),
+            [
+                dict(
+                    open_ended=False,
+                    set=1,
+                    unset=3,
+                    boundary="R-LAGOS",
+                    label="Lagos",
+                    categories=[{"count": 1, "label": "Yes"}, {"count": 0, "label": "No"}],
+                )
+            ],
+        )
+
+    def test_apply_poll_stats_deltas(self):
+        rule_uuid = uuid.uuid4()
+        yes_category = self.create_poll_response_category(self.poll_question, rule_uuid, "Yes")
+
+        rule_uuid = uuid.uuid4()
+        no_category = self.create_poll_response_category(self.poll_question, rule_uuid, "No")
+
+        poll_result = PollResult.objects.create(
+            org=self.nigeria,
+            flow=self.poll.flow_uuid,
+            ruleset=self.poll_question.flow_result.result_uuid,
+            contact="contact-uuid",
+            category="Yes",
+            text="Yeah",
+            completed=False,
+            gender="F",
+            date=self.now,
+        )
+
+        # nothing synced, nothing applied
+        self.poll.apply_poll_stats_deltas(dict())
+        self.assertFalse(PollStats.objects.all())
+
+        poll_stats_deltas = defaultdict(int)
+        for key, count in poll_result.generate_poll_stats().items():
+            poll_stats_deltas[key] += count
+
+        self.poll.apply_poll_stats_deltas(poll_stats_deltas)
+
+        self.assertEqual(PollStats.objects.all().count(), 1)
+        poll_stat = PollStats.objects.get()
+        self.assertEqual(poll_stat.question, self.poll_question)
+        self.assertEqual(poll_stat.category, yes_category)
+        self.assertEqual(poll_stat.gender_segment, GenderSegment.objects.get(gender="F"))
+        self.assertEqual(poll_stat.count, 1)
+
+        # the result changed category
+        poll_stats_deltas = defaultdict(int)
+        for key, count in poll_result.generate_poll_stats().items():
+            poll_stats_deltas[key] -= count
+
+        poll_result.category = "No"
+        poll_result.save()
+
+        for key, count in poll_result.generate_poll_stats().items():
+            poll_stats_deltas[key] += count
+
+        self.poll.apply_poll_stats_deltas(poll_stats_deltas)
+        self.poll.update_poll_results_caches()
+
+        self.assertEqual(PollStats.objects.filter(category=yes_category).aggregate(Sum("count"))["count__sum"], 0)
+        self.assertEqual(PollStats.objects.filter(category=no_category).aggregate(Sum("count"))["count__sum"], 1)
+        self.assertEqual(
+            self.poll_question.get_results()[0]["categories"],
+            [{"count": 0, "label": "Yes"}, {"count": 1, "label": "No"}],
+        )
+
+        # same counts as a full rebuild
+        self.poll.rebuild_poll_results_counts()
+        self.assertEqual(PollStats.objects.filter(category=yes_category).count(), 0)
+        self.assertEqual(PollStats.objects.filter(category=no_category).aggregate(Sum("count"))["count__sum"], 1)
+
+    def test_rebuild_poll_stats(self):
+        rule_uuid = uuid.uuid4()
+        yes_category = self.create_poll_response_category(self.poll_question, rule_uuid, "Yes")
+
+        for contact, category in [("contact-1", "Yes"), ("contact-2", "yes"), ("contact-3", "Other")]:
+            PollResult.objects.create(
+                org=self.nigeria,
+                flow=self.poll.flow_uuid,
+                ruleset=self.poll_question.flow_result.result_uuid,
+                contact=contact,
+                category=category,
+                text="Yeah",
+                completed=False,
+                gender="F",
+                born=self.poll.poll_date.year - 22,
+                date=self.now,
+            )
+
+        PollStats.objects.create(org=self.nigeria, question=self.poll_question, category=yes_category, count=10)
+
+        self.assertEqual(self.poll.rebuild_poll_stats(), 2)
+
+        # grouped by the stats dimensions and replacing the existing stats
+        self.assertEqual(PollStats.objects.filter(question=self.poll_question).count(), 2)
+        self.assertFalse(PollStats.objects.filter(is_squashed=False))
+
+        yes_stat = PollStats.objects.get(category=yes_category)
+        self.assertEqual(yes_stat.count, 2)
+        self.assertEqual(yes_stat.gender_segment, GenderSegment.objects.get(gender="F"))
+        self.assertEqual(yes_stat.age_segment, AgeSegment.objects.get(min_age=20))
+        self.assertEqual(yes_stat.date, self.now.replace(hour=0, minute=0, second=0, microsecond=0))
+
+        self.assertEqual(PollStats.objects.get(category=None).count, 1)
+
+        # rebuilding again in the same transaction reuses the emptied staging table
+        self.assertEqual(self.poll.rebuild_poll_stats(), 2)
+        self.assertEqual(PollStats.objects.filter(question=self.poll_question).count(), 2)
+        self.assertEqual(PollStats.objects.get(category=yes_category).count, 2)
+
 
 class PollsTasksTest(UreportTest):
     def setUp(self):
@@ -450,9 +450,12 @@ class PollCRUDL(SmartCRUDL):
             return self.form
 
         def save(self, obj):
+            from ureport.stats.models import PollStatsCounter
+
             data = self.form.cleaned_data
             poll = self.object
             questions = self.get_questions()
+            toggled_question_ids = []
 
             # for each question
             for question in questions:
@@ -468,6 +471,8 @@ class PollCRUDL(SmartCRUDL):
                 PollQuestion.objects.filter(poll=poll, flow_result__result_uuid=result_uuid).update(
                     is_active=included, title=title, priority=priority
                 )
+                if question.is_active != included:
+                    toggled_question_ids.append(question.id)
 
                 categories = question.get_public_categories()
                 for category in categories:
@@ -486,6 +491,12 @@ class PollCRUDL(SmartCRUDL):
 
                     PollResponseCategory.objects.filter(id=category_id).update(category_displayed=category_displayed)
 
+                question.update_categories_data()
+
+            # the daily counters only count the active questions
+            if toggled_question_ids:
+                PollStatsCounter.refresh_questions_counts(poll.org_id, toggled_question_ids)
+
             return self.object
 
         def post_save(self, obj):
@@ -494,6 +505,8 @@ class PollCRUDL(SmartCRUDL):
             # clear our cache of featured polls
             Poll.clear_brick_polls_cache(obj.org)
 
+            # the poll page shows the edited questions right away, with the results rebuilt in the background
+            obj.clear_page_snapshot()
             obj.update_questions_results_cache_task()
 
             return obj
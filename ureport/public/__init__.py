@@ -0,0 +1 @@
+default_app_config = "ureport.public.apps.PublicConfig"
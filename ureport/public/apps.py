@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class PublicConfig(AppConfig):
+    name = "ureport.public"
+
+    def ready(self):
+        from ureport.public import signals  # noqa: F401
@@ -1,13 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import json
-import operator
-from functools import reduce
-
 from django.conf import settings
 
-from ureport.utils import get_linked_orgs
+from ureport.utils import get_linked_orgs, get_org_page_context
 
 
 def set_has_better_domain(request):
@@ -63,37 +59,19 @@ def set_config_display_flags(request):
     org = request.org
     context = dict()
     if org:
-        backend_options = org.backends.filter(is_active=True).values_list("slug", flat=True)
-
-        context["district_zoom"] = reduce(
-            operator.or_, [bool(org.get_config("%s.district_label" % option)) for option in backend_options], False
-        )
-        context["ward_zoom"] = reduce(
-            operator.or_, [bool(org.get_config("%s.ward_label" % option)) for option in backend_options], False
-        )
-        context["show_maps"] = reduce(
-            operator.or_, [bool(org.get_config("%s.state_label" % option)) for option in backend_options], False
-        )
-        context["show_age_stats"] = reduce(
-            operator.or_, [bool(org.get_config("%s.born_label" % option)) for option in backend_options], False
-        )
-        context["show_gender_stats"] = reduce(
-            operator.or_, [bool(org.get_config("%s.gender_label" % option)) for option in backend_options], False
-        )
-        context["show_occupation_stats"] = reduce(
-            operator.or_, [bool(org.get_config("%s.occupation_label" % option)) for option in backend_options], False
-        )
-        context["colors_map"] = [str(color.strip()) for color in org.get_config("colors_map", "").split(",")]
-
-        other_languages_sites = {}
-        try:
-            other_languages_sites = json.loads(org.get_config("other_languages_sites"))
-        except Exception:
-            pass
-
-        context["other_languages_sites"] = sorted(
-            [dict(name=key, link=val) for key, val in other_languages_sites.items()], key=lambda q: q["name"]
-        )
+        page_context = get_org_page_context(org)
+
+        for flag in (
+            "district_zoom",
+            "ward_zoom",
+            "show_maps",
+            "show_age_stats",
+            "show_gender_stats",
+            "show_occupation_stats",
+            "colors_map",
+            "other_languages_sites",
+        ):
+            context[flag] = page_context[flag]
 
     return context
 
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from dash.categories.models import CategoryImage
+from dash.orgs.models import Org, OrgBackend
+from dash.stories.models import Story, StoryImage
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ureport.utils import clear_org_page_context
+
+# The cached org page context is cleared when the objects it is built from are saved or deleted. Updates done with
+# queryset.update() do not send these signals, the code doing them must call clear_org_page_context itself, or the
+# context stays stale until it expires.
+
+
+@receiver(post_save, sender=Org)
+def clear_org_page_context_on_org_change(sender, instance, **kwargs):
+    clear_org_page_context(instance.pk)
+
+
+@receiver(post_save, sender=OrgBackend)
+@receiver(post_delete, sender=OrgBackend)
+@receiver(post_save, sender=Story)
+@receiver(post_delete, sender=Story)
+def clear_org_page_context_on_related_change(sender, instance, **kwargs):
+    clear_org_page_context(instance.org_id)
+
+
+@receiver(post_save, sender=StoryImage)
+@receiver(post_delete, sender=StoryImage)
+def clear_org_page_context_on_story_image_change(sender, instance, **kwargs):
+    clear_org_page_context(instance.story.org_id)
+
+
+@receiver(post_save, sender=CategoryImage)
+@receiver(post_delete, sender=CategoryImage)
+def clear_org_page_context_on_category_image_change(sender, instance, **kwargs):
+    clear_org_page_context(instance.category.org_id)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import gzip
 import json
 from datetime import timedelta
 
@@ -19,6 +20,7 @@ from django.utils.http import urlquote
 from ureport.countries.models import CountryAlias
 from ureport.news.models import NewsItem, Video
 from ureport.tests import MockTembaClient, UreportJobsTest, UreportTest
+from ureport.utils import render_json
 
 
 class PublicTest(UreportTest):
@@ -35,6 +37,9 @@ class PublicTest(UreportTest):
             org=self.nigeria, name="Education", created_by=self.admin, modified_by=self.admin
         )
 
+    def get_main_stories_ids(self, response):
+        return [elt["pk"] for elt in response.context["main_stories"]]
+
     def test_org_config_fields(self):
         edit_url = reverse("orgs.org_edit")
 
@@ -199,7 +204,7 @@ class PublicTest(UreportTest):
         self.assertEqual(response.context["org"], self.uganda)
 
         self.assertTrue(response.context["main_stories"])
-        self.assertTrue(story1 in response.context["main_stories"])
+        self.assertTrue(story1.pk in self.get_main_stories_ids(response))
 
         story2 = Story.objects.create(
             title="story 2",
@@ -215,7 +220,7 @@ class PublicTest(UreportTest):
         self.assertEqual(response.context["org"], self.uganda)
 
         self.assertTrue(response.context["main_stories"])
-        self.assertFalse(story2 in response.context["main_stories"])
+        self.assertFalse(story2.pk in self.get_main_stories_ids(response))
 
         story3 = Story.objects.create(
             title="story 3",
@@ -231,7 +236,7 @@ class PublicTest(UreportTest):
         self.assertEqual(response.context["org"], self.uganda)
 
         self.assertTrue(response.context["main_stories"])
-        self.assertFalse(story3 in response.context["main_stories"])
+        self.assertFalse(story3.pk in self.get_main_stories_ids(response))
 
         story4 = Story.objects.create(
             title="story 4",
@@ -247,9 +252,9 @@ class PublicTest(UreportTest):
         self.assertEqual(response.context["org"], self.uganda)
 
         self.assertTrue(response.context["main_stories"])
-        self.assertFalse(story2 in response.context["main_stories"])
-        self.assertFalse(story3 in response.context["main_stories"])
-        self.assertEqual(response.context["main_stories"][0].pk, story4.pk)
+        self.assertFalse(story2.pk in self.get_main_stories_ids(response))
+        self.assertFalse(story3.pk in self.get_main_stories_ids(response))
+        self.assertEqual(response.context["main_stories"][0]["pk"], story4.pk)
 
         story4.featured = False
         story4.save()
@@ -258,7 +263,7 @@ class PublicTest(UreportTest):
         self.assertEqual(response.request["PATH_INFO"], "/")
         self.assertEqual(response.context["org"], self.uganda)
 
-        self.assertFalse(story4 in response.context["main_stories"])
+        self.assertFalse(story4.pk in self.get_main_stories_ids(response))
 
     def test_additional_menu(self):
         additional_menu_url = reverse("public.custom_page", args=["faq"])
@@ -408,6 +413,54 @@ class PublicTest(UreportTest):
         response = self.client.get(pollquestion_results_url, SERVER_NAME="uganda.ureport.io")
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.request["PATH_INFO"], f"/pollquestion/{question1.pk}/results/")
+        self.assertTrue(response["ETag"])
+
+        results = json.loads(response.content)
+        etag = response["ETag"]
+
+        response = self.client.get(pollquestion_results_url, SERVER_NAME="uganda.ureport.io", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            pollquestion_results_url, SERVER_NAME="uganda.ureport.io", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), results)
+
+        # the gzipped content has its own ETag
+        self.assertEqual(response["ETag"], etag[:-1] + '-gzip"')
+
+        response = self.client.get(
+            pollquestion_results_url,
+            SERVER_NAME="uganda.ureport.io",
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        response = self.client.get(
+            pollquestion_results_url,
+            SERVER_NAME="uganda.ureport.io",
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # gzip with a zero quality is not acceptable
+        response = self.client.get(
+            pollquestion_results_url, SERVER_NAME="uganda.ureport.io", HTTP_ACCEPT_ENCODING="gzip;q=0, identity"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(json.loads(response.content), results)
+
+        response = self.client.get(
+            pollquestion_results_url, SERVER_NAME="uganda.ureport.io", HTTP_ACCEPT_ENCODING="deflate, gzip;q=0.5"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
 
         response = self.client.get(
             pollquestion_results_url + "?segment=%0D%0ASPIHeader%3A%20SPIValue&", SERVER_NAME="uganda.ureport.io"
@@ -428,6 +481,16 @@ class PublicTest(UreportTest):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.request["PATH_INFO"], "/contact_field_results/")
 
+        with mock.patch("dash.orgs.models.Org.get_rendered_ureporters_locations_stats") as mock_rendered_stats:
+            mock_rendered_stats.return_value = render_json([dict(boundary="R-LAGOS", label="Lagos", set=3)])
+
+            response = self.client.get(
+                reporter_results_url + '?segment={"location":"State"}', SERVER_NAME="nigeria.ureport.io"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, mock_rendered_stats.return_value["content"])
+            mock_rendered_stats.assert_called_once_with(dict(location="State"))
+
     def test_engagement_data(self):
         ureporters_url = reverse("public.engagement_data")
 
@@ -557,10 +620,10 @@ class PublicTest(UreportTest):
 
         response = self.client.get(polls_url, SERVER_NAME="nigeria.ureport.io")
         self.assertEqual(len(response.context["main_stories"]), 0)
-        self.assertTrue(story4 not in response.context["main_stories"])
-        self.assertTrue(story1 not in response.context["main_stories"])
-        self.assertTrue(story2 not in response.context["main_stories"])
-        self.assertTrue(story3 not in response.context["main_stories"])
+        self.assertTrue(story4.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story1.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story2.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story3.pk not in self.get_main_stories_ids(response))
 
         response = self.client.get(polls_url, SERVER_NAME="uganda.ureport.io")
         self.assertEqual(response.request["PATH_INFO"], "/opinions/")
@@ -581,31 +644,31 @@ class PublicTest(UreportTest):
         self.assertEqual(response.context["polls"][2], poll1)
 
         self.assertEqual(len(response.context["main_stories"]), 0)
-        self.assertTrue(story4 not in response.context["main_stories"])
-        self.assertTrue(story1 not in response.context["main_stories"])
-        self.assertTrue(story2 not in response.context["main_stories"])
-        self.assertTrue(story3 not in response.context["main_stories"])
+        self.assertTrue(story4.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story1.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story2.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story3.pk not in self.get_main_stories_ids(response))
 
         story1.featured = True
         story1.save()
 
         response = self.client.get(polls_url, SERVER_NAME="uganda.ureport.io")
         self.assertEqual(len(response.context["main_stories"]), 1)
-        self.assertTrue(story1 in response.context["main_stories"])
-        self.assertTrue(story4 not in response.context["main_stories"])
-        self.assertTrue(story2 not in response.context["main_stories"])
-        self.assertTrue(story3 not in response.context["main_stories"])
-        self.assertEqual(response.context["main_stories"][0], story1)
+        self.assertTrue(story1.pk in self.get_main_stories_ids(response))
+        self.assertTrue(story4.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story2.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story3.pk not in self.get_main_stories_ids(response))
+        self.assertEqual(response.context["main_stories"][0]["pk"], story1.pk)
 
         story1.is_active = False
         story1.save()
 
         response = self.client.get(polls_url, SERVER_NAME="uganda.ureport.io")
         self.assertEqual(len(response.context["main_stories"]), 0)
-        self.assertTrue(story4 not in response.context["main_stories"])
-        self.assertTrue(story1 not in response.context["main_stories"])
-        self.assertTrue(story2 not in response.context["main_stories"])
-        self.assertTrue(story3 not in response.context["main_stories"])
+        self.assertTrue(story4.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story1.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story2.pk not in self.get_main_stories_ids(response))
+        self.assertTrue(story3.pk not in self.get_main_stories_ids(response))
 
         poll1.is_featured = True
         poll1.save()
@@ -767,7 +830,7 @@ class PublicTest(UreportTest):
         self.assertEqual(response.context["categories"][1], self.health_uganda)
 
         self.assertEqual(len(response.context["main_stories"]), 1)
-        self.assertEqual(response.context["main_stories"][0], story1)
+        self.assertEqual(response.context["main_stories"][0]["pk"], story1.pk)
 
         story2.is_active = False
         story2.save()
@@ -775,7 +838,7 @@ class PublicTest(UreportTest):
         response = self.client.get(stories_url, SERVER_NAME="uganda.ureport.io")
 
         self.assertEqual(len(response.context["main_stories"]), 1)
-        self.assertEqual(response.context["main_stories"][0], story1)
+        self.assertEqual(response.context["main_stories"][0]["pk"], story1.pk)
 
         story2.is_active = True
         story2.save()
@@ -849,10 +912,10 @@ class PublicTest(UreportTest):
         self.assertEqual(response.context["categories"][1], self.health_uganda)
 
         self.assertEqual(len(response.context["main_stories"]), 2)
-        self.assertFalse(story4 in response.context["main_stories"])
-        self.assertFalse(story2 in response.context["main_stories"])
-        self.assertTrue(story1 in response.context["main_stories"])
-        self.assertTrue(story3 in response.context["main_stories"])
+        self.assertFalse(story4.pk in self.get_main_stories_ids(response))
+        self.assertFalse(story2.pk in self.get_main_stories_ids(response))
+        self.assertTrue(story1.pk in self.get_main_stories_ids(response))
+        self.assertTrue(story3.pk in self.get_main_stories_ids(response))
 
     def test_news(self):
         news_url = reverse("public.news")
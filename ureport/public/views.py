@@ -18,9 +18,8 @@ from django_redis import get_redis_connection
 from smartmin.views import SmartReadView, SmartTemplateView
 
 from django.conf import settings
-from django.core.cache import cache
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.db.models import Prefetch, Q
+from django.db.models import Prefetch
 from django.http import Http404, HttpResponse
 from django.urls import reverse
 from django.utils import timezone, translation
@@ -34,13 +33,17 @@ from ureport.jobs.models import JobSource
 from ureport.locations.models import Boundary
 from ureport.news.models import NewsItem, Video
 from ureport.polls.models import Poll, PollQuestion
-from ureport.stats.models import GenderSegment, PollStats
+from ureport.stats.models import PollStats
 from ureport.utils import (
     get_global_count,
+    get_org_page_context,
     get_shared_countries_number,
     get_shared_global_count,
     get_shared_sites_count,
+    render_json,
+    rendered_json_response,
 )
+from ureport.utils.local_cache import local_cache
 
 
 class IndexView(SmartTemplateView):
@@ -55,7 +58,7 @@ class IndexView(SmartTemplateView):
         latest_poll = Poll.get_main_poll(org)
         context["latest_poll"] = latest_poll
 
-        cache_value = cache.get("shared_sites", None)
+        cache_value = local_cache.get("shared_sites", None)
         if not cache_value:
             get_shared_sites_count()
 
@@ -75,7 +78,7 @@ class IndexView(SmartTemplateView):
             .order_by("-created_on")[4:]
         )
 
-        context["main_stories"] = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
+        context["main_stories"] = get_org_page_context(org)["main_stories"]
 
         return context
 
@@ -196,7 +199,7 @@ class AboutView(SmartTemplateView):
         videos = Video.objects.filter(is_active=True, org=org).order_by("-created_on")
         context["videos"] = videos
 
-        context["main_stories"] = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
+        context["main_stories"] = get_org_page_context(org)["main_stories"]
         return context
 
 
@@ -211,48 +214,27 @@ class PollContextMixin(object):
         org = self.request.org
         context["org"] = org
 
-        context["states"] = sorted(
-            [dict(id=k, name=v) for k, v in Boundary.get_org_top_level_boundaries_name(org).items()],
-            key=lambda c: c["name"],
-        )
+        context["states"] = get_org_page_context(org)["states"]
 
         main_poll = self.derive_main_poll()
         context["latest_poll"] = main_poll
 
+        top_question = None
         if main_poll:
-            top_question = main_poll.get_questions().first()
+            # the questions and stats of the poll page are rendered from one cached snapshot
+            snapshot = main_poll.get_page_snapshot()
+            context["latest_poll_snapshot"] = snapshot
+            context["latest_poll_questions"] = snapshot["questions"]
+
+            top_question = snapshot["top_question"]
             context["top_question"] = top_question
 
             if top_question:
-                gender_stats = top_question.get_gender_stats()
-                total_gender = 0
-                for elt in gender_stats:
-                    total_gender += elt["set"]
-
-                gender_label_dict = {str(v.lower()): k.lower() for k, v in GenderSegment.GENDERS.items()}
-                gender_stats_dict = {
-                    gender_label_dict.get(elt["label"].lower()): dict(
-                        count=elt["set"], percentage=int(round(elt["set"] * 100 / float(total_gender)))
-                    )
-                    for elt in gender_stats
-                    if total_gender
-                }
-
-                context["gender_stats"] = gender_stats_dict
-
-                age_stats = top_question.get_age_stats()
-                total_age = 0
-                for elt in age_stats:
-                    total_age += elt["set"]
-
-                context["age_stats"] = [
-                    dict(name=elt["label"], y=int(round(elt["set"] * 100 / float(total_age))))
-                    for elt in age_stats
-                    if total_age
-                ]
-                context["locations_stats"] = top_question.get_location_stats()
-
-        if not main_poll or not main_poll.get_questions().first():
+                context["gender_stats"] = snapshot["gender_stats"]
+                context["age_stats"] = snapshot["age_stats"]
+                context["locations_stats"] = snapshot["locations_stats"]
+
+        if not top_question:
             context["gender_stats"] = org.get_gender_stats()
             context["age_stats"] = org.get_age_stats()
 
@@ -267,7 +249,7 @@ class PollContextMixin(object):
         )
         context["polls"] = polls
 
-        context["main_stories"] = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
+        context["main_stories"] = get_org_page_context(org)["main_stories"]
         return context
 
 
@@ -316,8 +298,7 @@ class StoriesView(SmartTemplateView):
         )
         context["stories"] = Story.objects.filter(org=org, is_active=True).order_by("title")
 
-        featured_stories = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
-        context["main_stories"] = featured_stories
+        context["main_stories"] = get_org_page_context(org)["main_stories"]
 
         return context
 
@@ -339,7 +320,7 @@ class StoryReadView(SmartReadView):
         context["org"] = org
         context["categories"] = Category.objects.filter(org=org, is_active=True).order_by("name")
 
-        context["main_stories"] = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
+        context["main_stories"] = get_org_page_context(org)["main_stories"]
         return context
 
 
@@ -351,20 +332,20 @@ class ReportersResultsView(SmartReadView):
         return self.request.org
 
     def render_to_response(self, context, **kwargs):
-        output_data = []
+        rendered = None
         try:
             segment = self.request.GET.get("segment", None)
             if segment:
                 segment = json.loads(segment)
-                output_data = self.get_object().get_ureporters_locations_stats(segment)
+                rendered = self.get_object().get_rendered_ureporters_locations_stats(segment)
         except json.JSONDecodeError:
-            output_data = []
+            rendered = None
             pass
         except Exception as e:
-            output_data = []
+            rendered = None
             raise e
 
-        return HttpResponse(json.dumps(output_data))
+        return rendered_json_response(self.request, rendered or render_json([]))
 
 
 class EngagementDataView(SmartReadView):
@@ -375,7 +356,7 @@ class EngagementDataView(SmartReadView):
         return self.request.org
 
     def render_to_response(self, context, **kwargs):
-        output_data = []
+        rendered = None
 
         try:
             results_params = self.request.GET.get("results_params", None)
@@ -385,15 +366,15 @@ class EngagementDataView(SmartReadView):
                 segment_slug = results_params.get("segment")
                 time_filter = int(results_params.get("filter", "12"))
 
-                output_data = PollStats.get_engagement_data(self.get_object(), metric, segment_slug, time_filter)
+                rendered = PollStats.get_rendered_engagement_data(self.get_object(), metric, segment_slug, time_filter)
         except json.JSONDecodeError:
-            output_data = []
+            rendered = None
             pass
         except Exception as e:
-            output_data = []
+            rendered = None
             raise e
 
-        return HttpResponse(json.dumps(output_data))
+        return rendered_json_response(self.request, rendered or render_json([]))
 
 
 class UreportersView(SmartTemplateView):
@@ -410,17 +391,14 @@ class UreportersView(SmartTemplateView):
         # remove the first option '' from calender.month_abbr
         context["months"] = [six.text_type(_("%s")) % m for m in calendar.month_abbr][1:]
 
-        context["states"] = sorted(
-            [dict(id=k, name=v) for k, v in Boundary.get_org_top_level_boundaries_name(org).items()],
-            key=lambda c: c["name"],
-        )
+        context["states"] = get_org_page_context(org)["states"]
 
         context["gender_stats"] = org.get_gender_stats()
         context["age_stats"] = json.loads(org.get_age_stats())
         context["registration_stats"] = org.get_registration_stats()
         context["occupation_stats"] = org.get_occupation_stats()
         context["reporters"] = org.get_reporters_count()
-        context["main_stories"] = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
+        context["main_stories"] = get_org_page_context(org)["main_stories"]
 
         # global counter
         context["global_counter"] = get_global_count()
@@ -453,7 +431,7 @@ class JoinEngageView(SmartTemplateView):
         context = super(JoinEngageView, self).get_context_data(**kwargs)
         org = self.request.org
         context["org"] = org
-        context["main_stories"] = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
+        context["main_stories"] = get_org_page_context(org)["main_stories"]
         return context
 
 
@@ -474,46 +452,19 @@ class JobsView(SmartTemplateView):
         context["job_sources"] = JobSource.objects.filter(org=org, is_active=True).order_by(
             "-is_featured", "-created_on"
         )
-        context["main_stories"] = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
+        context["main_stories"] = get_org_page_context(org)["main_stories"]
         return context
 
 
 class BoundaryView(SmartTemplateView):
     def render_to_response(self, context, **kwargs):
-        org = self.request.org
-
-        if org.get_config("common.is_global"):
-            location_boundaries = org.boundaries.filter(level=0)
-            limit_states = org.get_config("common.limit_states")
-            if limit_states:
-                limit_states = [elt.strip() for elt in limit_states.split(",")]
-                location_boundaries = location_boundaries.filter(osm_id__in=limit_states)
-
-        else:
-            osm_id = self.kwargs.get("osm_id", None)
-
-            org_boundaries = org.boundaries.all()
-
-            limit_states = org.get_config("common.limit_states")
-            if limit_states:
-                limit_states = [elt.strip() for elt in limit_states.split(",")]
-                org_boundaries = org_boundaries.filter(
-                    Q(level=1, name__in=limit_states)
-                    | Q(parent__name__in=limit_states, level=2)
-                    | Q(parent__parent__name__in=limit_states, level=3)
-                )
-
-            if osm_id:
-                location_boundaries = org_boundaries.filter(parent__osm_id=osm_id)
-            else:
-                location_boundaries = org_boundaries.filter(level=1)
-
-        boundaries = dict(
-            type="FeatureCollection",
-            features=[elt.as_geojson() for elt in location_boundaries if elt.geometry and json.loads(elt.geometry)],
-        )
+        try:
+            zoom = int(self.request.GET.get("zoom"))
+        except (TypeError, ValueError):
+            zoom = None
 
-        return HttpResponse(json.dumps(boundaries))
+        rendered = Boundary.get_org_geojson(self.request.org, osm_id=self.kwargs.get("osm_id", None), zoom=zoom)
+        return rendered_json_response(self.request, rendered)
 
 
 class PollQuestionResultsView(SmartReadView):
@@ -525,21 +476,21 @@ class PollQuestionResultsView(SmartReadView):
         return queryset
 
     def render_to_response(self, context, **kwargs):
-        results = []
+        rendered = None
         try:
             segment = self.request.GET.get("segment", None)
             if segment:
                 segment = json.loads(segment)
 
-            results = self.object.get_results(segment=segment)
+            rendered = self.object.get_rendered_results(segment=segment)
         except json.JSONDecodeError:
-            results = []
+            rendered = None
             pass
         except Exception as e:
-            results = []
+            rendered = None
             raise e
 
-        return HttpResponse(json.dumps(results))
+        return rendered_json_response(self.request, rendered or render_json([]))
 
 
 class CountriesView(SmartTemplateView):
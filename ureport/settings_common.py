@@ -3,6 +3,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import os
 import sys
+import tempfile
 from datetime import timedelta
 
 import sentry_sdk
@@ -669,6 +670,7 @@ INSTALLED_APPS = (
     "ureport.locations",
     "ureport.news",
     "ureport.polls",
+    "ureport.public",
     "ureport.stats",
     "django_countries",
     "rest_framework",
@@ -863,6 +865,10 @@ CACHES = {
 if "test" in sys.argv:
     CACHES["default"]["LOCATION"] = "redis://127.0.0.1:6379/15"
 
+# per process LRU cache in front of the redis cache for the read mostly keys of the public pages
+LOCAL_CACHE_TIMEOUT = 0 if TESTING else 30
+LOCAL_CACHE_MAX_SIZE = 1000
+
 # -----------------------------------------------------------------------------------
 # SMS Configs
 # -----------------------------------------------------------------------------------
@@ -958,6 +964,27 @@ CELERYBEAT_SCHEDULE = {
     },
 }
 
+# -----------------------------------------------------------------------------------
+# Local cache of the downloaded run archives, shared by the polls of an org
+# -----------------------------------------------------------------------------------
+ARCHIVES_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ureport-archives")
+ARCHIVES_CACHE_MAX_AGE = 60 * 60 * 24 * 2
+
+# archives downloaded ahead of the results writer, by number and by total compressed download size in bytes, the
+# decompressed archives are written to the cache dir and only their indexes are held in memory
+ARCHIVES_SYNC_WORKERS = 4
+ARCHIVES_SYNC_MAX_IN_FLIGHT_DOWNLOAD_SIZE = 1024 * 1024 * 1024
+
+# flows of the orgs fetched concurrently, in total and by API host
+FLOWS_FETCH_WORKERS = 8
+FLOWS_FETCH_HOST_WORKERS = 4
+
+# the old sites counts are fetched concurrently, the sites failing repeatedly are skipped for a while
+OLD_SITES_FETCH_WORKERS = 10
+OLD_SITES_FETCH_TIMEOUT = 10
+OLD_SITES_CIRCUIT_BREAKER_FAILURES = 3
+OLD_SITES_CIRCUIT_BREAKER_TIMEOUT = 60 * 30
+
 # -----------------------------------------------------------------------------------
 # U-Report Defaults
 # -----------------------------------------------------------------------------------
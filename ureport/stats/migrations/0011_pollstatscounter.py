@@ -0,0 +1,49 @@
+# Generated by Django 2.2.20 on 2021-08-16 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orgs", "0026_fix_org_config_rapidpro"),
+        ("stats", "0010_add_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PollStatsCounter",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                (
+                    "location_osm_id",
+                    models.CharField(
+                        help_text="The OSM id of the top level boundary of the org for these stats",
+                        max_length=15,
+                        null=True,
+                    ),
+                ),
+                ("is_responded", models.BooleanField(help_text="Whether these stats have a response category")),
+                ("count", models.IntegerField(default=0, help_text="Number of items with this counter")),
+                (
+                    "age_segment",
+                    models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to="stats.AgeSegment"),
+                ),
+                (
+                    "gender_segment",
+                    models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.SET_NULL, to="stats.GenderSegment"
+                    ),
+                ),
+                (
+                    "org",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT, related_name="poll_stats_counters", to="orgs.Org"
+                    ),
+                ),
+            ],
+            options={"index_together": {("org", "date")}},
+        )
+    ]
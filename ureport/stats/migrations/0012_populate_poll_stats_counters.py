@@ -0,0 +1,60 @@
+# Generated by Django 2.2.20 on 2021-08-16 10:14
+
+from django.db import connection, migrations
+
+# language=SQL
+POPULATE_SQL = """
+INSERT INTO stats_pollstatscounter("org_id", "date", "age_segment_id", "gender_segment_id", "location_osm_id", "is_responded", "count")
+SELECT s."org_id", date_trunc('day', s."date")::date, s."age_segment_id", s."gender_segment_id",
+  CASE
+    WHEN b."level" = %(top_level)s THEN b."osm_id"
+    WHEN p."level" = %(top_level)s THEN p."osm_id"
+    WHEN gp."level" = %(top_level)s THEN gp."osm_id"
+  END,
+  s."category_id" IS NOT NULL,
+  SUM(s."count")
+FROM stats_pollstats s
+INNER JOIN polls_pollquestion q ON q."id" = s."question_id" AND q."is_active"
+LEFT JOIN locations_boundary b ON b."id" = s."location_id"
+LEFT JOIN locations_boundary p ON p."id" = b."parent_id"
+LEFT JOIN locations_boundary gp ON gp."id" = p."parent_id"
+WHERE s."org_id" = %(org_id)s AND s."date" IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5, 6;
+"""
+
+# same levels as Boundary.COUNTRY_LEVEL and Boundary.STATE_LEVEL
+COUNTRY_LEVEL = 0
+STATE_LEVEL = 1
+
+
+def populate_poll_stats_counters(apps, schema_editor):
+    Org = apps.get_model("orgs", "Org")
+
+    for org in Org.objects.all():
+        # global orgs have countries as their top level boundaries
+        is_global = (org.config or dict()).get("common", dict()).get("is_global")
+        top_level = COUNTRY_LEVEL if is_global else STATE_LEVEL
+
+        with connection.cursor() as cursor:
+            cursor.execute(POPULATE_SQL, dict(org_id=org.id, top_level=top_level))
+
+
+def reverse(apps, schema_editor):  # pragma: no cover
+    pass
+
+
+def apply_manual():  # pragma: no cover
+    from django.apps import apps
+
+    populate_poll_stats_counters(apps, None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0006_boundary_backend"),
+        ("polls", "0065_auto_20210728_1326"),
+        ("stats", "0011_pollstatscounter"),
+    ]
+
+    operations = [migrations.RunPython(populate_poll_stats_counters, reverse)]
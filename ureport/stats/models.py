@@ -3,13 +3,14 @@ import time
 from collections import defaultdict
 from datetime import timedelta
 
+import pytz
 from dash.orgs.models import Org
 
 from django.contrib.postgres.fields import JSONField
 from django.core.cache import cache
-from django.db import connection, models
+from django.db import connection, models, transaction
 from django.db.models import Count, ExpressionWrapper, F, IntegerField, Q, Sum
-from django.db.models.functions import ExtractYear
+from django.db.models.functions import ExtractYear, TruncDay
 from django.utils import timezone, translation
 from django.utils.translation import ugettext_lazy as _
 
@@ -27,13 +28,16 @@ class GenderSegment(models.Model):
 
 
 class AgeSegment(models.Model):
+    MIN_AGES = [0, 15, 20, 25, 31, 35]
+
+    AGE_LABELS = {0: "0-14", 15: "15-19", 20: "20-24", 25: "25-30", 31: "31-34", 35: "35+"}
+
     min_age = models.IntegerField(null=True)
     max_age = models.IntegerField(null=True)
 
     @classmethod
     def get_age_segment_min_age(cls, age):
-        min_ages = [0, 15, 20, 25, 31, 35]
-        return [elt for elt in min_ages if age >= elt][-1]
+        return [elt for elt in cls.MIN_AGES if age >= elt][-1]
 
 
 class PollStats(models.Model):
@@ -48,6 +52,9 @@ class PollStats(models.Model):
         "active-users": _("Active Users"),
     }
 
+    SQUASH_WINDOW_SIZE = 10000
+    SQUASH_MAX_WINDOWS = 50
+
     id = models.BigAutoField(auto_created=True, primary_key=True, verbose_name="ID")
 
     org = models.ForeignKey(Org, on_delete=models.PROTECT, related_name="poll_stats")
@@ -70,104 +77,103 @@ class PollStats(models.Model):
 
     @classmethod
     def squash(cls):
+        """
+        Merges the unsquashed stats with all the stats of the same key into one squashed row per key, in windows of
+        unsquashed rows with one statement per window, the daily counters of the squashed days are then refreshed.
+        The stats dates are truncated to the day when generated so the keys match on the dates directly
+        """
         start = time.time()
         num_sets = 0
-
-        stats_objs = (
-            cls.objects.exclude(is_squashed=True)
-            .exclude(date=None)
-            .order_by(
-                "org_id", "question_id", "category_id", "age_segment_id", "gender_segment_id", "location_id", "date"
-            )
-            .distinct(
-                "org_id", "question_id", "category_id", "age_segment_id", "gender_segment_id", "location_id", "date"
-            )[:50000]
+        num_rows = 0
+
+        key_columns = ["org_id", "question_id", "category_id", "age_segment_id", "gender_segment_id", "location_id"]
+        nullable_key_columns = ["question_id", "category_id", "age_segment_id", "gender_segment_id", "location_id"]
+
+        sql = """
+        WITH squashed_keys AS (
+          SELECT DISTINCT %(key_columns)s, "date" FROM stats_pollstats WHERE "id" IN (
+            SELECT "id" FROM stats_pollstats
+            WHERE "is_squashed" IS NOT TRUE AND "date" IS NOT NULL
+            ORDER BY "id"
+            LIMIT %%s
+          )
+        ),
+        deleted AS (
+          DELETE FROM stats_pollstats s USING squashed_keys k
+          WHERE %(key_join)s AND s."date" = k."date"
+          RETURNING %(deleted_columns)s, k."date", s."count"
+        ),
+        inserted AS (
+          INSERT INTO stats_pollstats(%(key_columns)s, "date", "count", "is_squashed")
+          SELECT %(key_columns)s, "date", GREATEST(0, SUM("count")), TRUE FROM deleted
+          GROUP BY %(key_columns)s, "date"
+          RETURNING "id"
+        )
+        SELECT "org_id", "date"::date, COUNT(*), (SELECT COUNT(*) FROM inserted) FROM deleted GROUP BY "org_id", "date"
+        """ % dict(
+            key_columns=", ".join('"%s"' % col for col in key_columns),
+            key_join=" AND ".join(
+                's."%s" %s k."%s"' % (col, "IS NOT DISTINCT FROM" if col in nullable_key_columns else "=", col)
+                for col in key_columns
+            ),
+            deleted_columns=", ".join('s."%s"' % col for col in key_columns),
         )
 
-        for distinct_set in stats_objs:
+        squashed_dates = defaultdict(set)
+
+        for i in range(cls.SQUASH_MAX_WINDOWS):
             with connection.cursor() as cursor:
+                cursor.execute(sql, [cls.SQUASH_WINDOW_SIZE])
+                squashed_days = cursor.fetchall()
 
-                where_sql = ""
-                if distinct_set.org_id is not None:
-                    where_sql += '"org_id" = %s AND ' % distinct_set.org_id
-                else:
-                    where_sql += '"org_id" IS NULL AND'
-
-                if distinct_set.question_id is not None:
-                    where_sql += '"question_id" = %s AND' % distinct_set.question_id
-                else:
-                    where_sql += '"question_id" IS NULL AND'
-
-                if distinct_set.category_id is not None:
-                    where_sql += '"category_id" = %s AND' % distinct_set.category_id
-                else:
-                    where_sql += '"category_id" IS NULL AND'
-
-                if distinct_set.age_segment_id is not None:
-                    where_sql += '"age_segment_id" = %s AND' % distinct_set.age_segment_id
-                else:
-                    where_sql += '"age_segment_id" IS NULL AND'
-
-                if distinct_set.gender_segment_id is not None:
-                    where_sql += '"gender_segment_id" = %s AND' % distinct_set.gender_segment_id
-                else:
-                    where_sql += '"gender_segment_id" IS NULL AND'
-
-                if distinct_set.location_id is not None:
-                    where_sql += '"location_id" = %s AND' % distinct_set.location_id
-                else:
-                    where_sql += '"location_id" IS NULL AND'
-
-                where_sql += """
-                "date" = date_trunc('day', TIMESTAMP '%s')::TIMESTAMP
-                """ % str(
-                    distinct_set.date
-                )
+            inserted_count = squashed_days[0][3] if squashed_days else 0
 
-                sql = """
-                WITH deleted as (
-                  DELETE FROM stats_pollstats WHERE "id" IN (
-                    SELECT "id" FROM stats_pollstats
-                      WHERE %(where_sql)s
-                      LIMIT 10000
-                  ) RETURNING "count"
-                )
-                INSERT INTO stats_pollstats("org_id", "question_id", "category_id", "age_segment_id", "gender_segment_id", "location_id", "date", "count", "is_squashed")
-                VALUES (%%s, %%s, %%s, %%s, %%s, %%s, date_trunc('day', TIMESTAMP %%s)::TIMESTAMP, GREATEST(0, (SELECT SUM("count") FROM deleted)), TRUE);
-                """ % {
-                    "where_sql": where_sql
-                }
-
-                params = (
-                    distinct_set.org_id,
-                    distinct_set.question_id,
-                    distinct_set.category_id,
-                    distinct_set.age_segment_id,
-                    distinct_set.gender_segment_id,
-                    distinct_set.location_id,
-                    str(distinct_set.date),
-                )
+            for org_id, date, deleted_count, _inserted_count in squashed_days:
+                squashed_dates[org_id].add(date)
+                num_rows += deleted_count
+            num_sets += inserted_count
 
-                cursor.execute(sql, params)
+            if not inserted_count:
+                break
 
-            num_sets += 1
+        # the unsquashed stats are the deltas applied since the last squash
+        for org_id, dates in squashed_dates.items():
+            PollStatsCounter.refresh_counts(org_id, dates)
 
         time_taken = time.time() - start
 
-        logger.info("Squashed %d distinct sets of %s in %0.3fs" % (num_sets, cls.__name__, time_taken))
+        logger.info(
+            "Squashed %d distinct sets of %s from %d rows in %0.3fs, %0.2f rows/s"
+            % (num_sets, cls.__name__, num_rows, time_taken, num_rows / max(time_taken, 0.001))
+        )
 
     @classmethod
     def get_engagement_data(cls, org, metric, segment_slug, time_filter):
+        from ureport.utils.local_cache import local_cache
 
         key = f"org:{org.id}:metric:{metric}:segment:{segment_slug}:filter:{time_filter}"
-        output_data = cache.get(key, None)
+        output_data = local_cache.get(key, None)
         if output_data:
             return output_data["results"]
 
         return PollStats.refresh_engagement_data(org, metric, segment_slug, time_filter)
 
+    @classmethod
+    def get_rendered_engagement_data(cls, org, metric, segment_slug, time_filter):
+        from ureport.utils import render_json
+        from ureport.utils.local_cache import local_cache
+
+        key = f"org:{org.id}:metric:{metric}:segment:{segment_slug}:filter:{time_filter}"
+        output_data = local_cache.get(key, None)
+        if output_data and output_data.get("rendered"):
+            return output_data["rendered"]
+
+        return render_json(PollStats.get_engagement_data(org, metric, segment_slug, time_filter))
+
     @classmethod
     def refresh_engagement_data(cls, org, metric, segment_slug, time_filter):
+        from ureport.utils import render_json
+        from ureport.utils.local_cache import local_cache
 
         key = f"org:{org.id}:metric:{metric}:segment:{segment_slug}:filter:{time_filter}"
 
@@ -213,23 +219,136 @@ class PollStats(models.Model):
                 output_data = ContactActivity.get_contact_activity_location(org, time_filter)
 
         if output_data:
-            cache.set(key, {"results": output_data}, None)
+            local_cache.set(key, {"results": output_data, "rendered": render_json(output_data)}, None)
         return output_data
 
     @classmethod
-    def get_all_opinion_responses(cls, org, time_filter):
+    def refresh_org_engagement_data(cls, org):
+        """
+        Refreshes the engagement data of the org for all the metrics, segments and time filters, the daily counts of
+        the last year are fetched once per segment and bucketed for each time filter in memory
+        """
+        from ureport.utils import render_json
+        from ureport.utils.local_cache import local_cache
+
+        translation.activate(org.language)
+
+        stats_series = PollStats.get_segments_series_stats(org)
+        activity_series = ContactActivity.get_segments_series_activity(org)
+
+        for time_filter in cls.DATA_TIME_FILTERS.keys():
+            for segment_slug in cls.DATA_SEGMENTS.keys():
+                for metric in cls.DATA_METRICS.keys():
+                    key = f"org:{org.id}:metric:{metric}:segment:{segment_slug}:filter:{time_filter}"
+
+                    output_data = []
+                    if metric == "opinion-responses":
+                        for series in stats_series[segment_slug]:
+                            series_data = PollStats.get_counts_data(series["responded"], time_filter)
+                            series_attrs = series["attrs"] or dict(name=str(cls.DATA_METRICS[metric]))
+                            output_data.append(dict(series_attrs, data=series_data))
+
+                    if metric == "sign-up-rate":
+                        if segment_slug == "all":
+                            output_data = org.get_sign_up_rate(time_filter)
+                        if segment_slug == "age":
+                            output_data = org.get_sign_up_rate_age(time_filter)
+                        if segment_slug == "gender":
+                            output_data = org.get_sign_up_rate_gender(time_filter)
+                        if segment_slug == "location":
+                            output_data = org.get_sign_up_rate_location(time_filter)
+
+                    if metric == "response-rate":
+                        for series in stats_series[segment_slug]:
+                            series_data = PollStats.get_response_rate_data(
+                                series["polled"], series["responded"], time_filter
+                            )
+                            series_attrs = series["attrs"] or dict(name=str(cls.DATA_METRICS[metric]))
+                            output_data.append(dict(series_attrs, data=series_data))
+
+                    if metric == "active-users":
+                        for series in activity_series[segment_slug]:
+                            series_data = ContactActivity.get_activity_data(series["activities"], time_filter)
+                            series_attrs = series["attrs"] or dict(name=str(cls.DATA_METRICS[metric]))
+                            output_data.append(dict(series_attrs, data=series_data))
+
+                    if output_data:
+                        local_cache.set(key, {"results": output_data, "rendered": render_json(output_data)}, None)
+
+    @classmethod
+    def get_segments_series_stats(cls, org):
+        """
+        Returns the daily polled and responded counts of the last year for the series of each segment, using one
+        grouped query on the daily counters per segment
+        """
         now = timezone.now()
         year_ago = now - timedelta(days=365)
-        start = year_ago.replace(day=1)
-        translation.activate(org.language)
+        start = year_ago.replace(day=1).date()
+
+        stats_qs = PollStatsCounter.objects.filter(org=org, date__gte=start)
+
+        segments_series = dict()
+
+        all_series = dict(attrs=dict(), polled=[], responded=[])
+        PollStats.add_series_stats(stats_qs, None, {None: [all_series]})
+        segments_series["all"] = [all_series]
+
+        genders = GenderSegment.objects.all()
+        if not org.get_config("common.has_extra_gender"):
+            genders = genders.exclude(gender="O")
 
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
+        gender_series_map = dict()
+        for gender in genders.values("gender", "id"):
+            attrs = dict(name=str(GenderSegment.GENDERS.get(gender["gender"])))
+            gender_series_map[gender["id"]] = [dict(attrs=attrs, polled=[], responded=[])]
+        PollStats.add_series_stats(stats_qs, "gender_segment_id", gender_series_map)
+        segments_series["gender"] = [elt[0] for elt in gender_series_map.values()]
+
+        age_series_map = dict()
+        for age in AgeSegment.objects.all().values("id", "min_age", "max_age"):
+            attrs = dict(name=AgeSegment.AGE_LABELS.get(age["min_age"]))
+            age_series_map[age["id"]] = [dict(attrs=attrs, polled=[], responded=[])]
+        PollStats.add_series_stats(stats_qs, "age_segment_id", age_series_map)
+        segments_series["age"] = [elt[0] for elt in age_series_map.values()]
+
+        top_boundaries = Boundary.get_org_top_level_boundaries_name(org)
+        location_series = {
+            osm_id: dict(attrs=dict(name=name, osm_id=osm_id), polled=[], responded=[])
+            for osm_id, name in top_boundaries.items()
+        }
+
+        # the counters are kept by top level boundary
+        location_series_map = {osm_id: [series] for osm_id, series in location_series.items()}
+        PollStats.add_series_stats(stats_qs, "location_osm_id", location_series_map)
+        segments_series["location"] = list(location_series.values())
+
+        return segments_series
+
+    @classmethod
+    def add_series_stats(cls, stats_qs, group_field, series_map):
+        """
+        Adds the daily polled and responded counts to the series mapped by the value of the group field
+        """
+        values_fields = ["date", group_field] if group_field else ["date"]
+        daily_stats = stats_qs.values(*values_fields).annotate(
+            polled=Sum("count"), responded=Sum("count", filter=Q(is_responded=True))
         )
 
+        for elt in daily_stats:
+            for series in series_map.get(elt[group_field] if group_field else None, []):
+                series["polled"].append(dict(date=elt["date"], count__sum=elt["polled"]))
+                if elt["responded"] is not None:
+                    series["responded"].append(dict(date=elt["date"], count__sum=elt["responded"]))
+
+    @classmethod
+    def get_all_opinion_responses(cls, org, time_filter):
+        now = timezone.now()
+        year_ago = now - timedelta(days=365)
+        start = year_ago.replace(day=1).date()
+        translation.activate(org.language)
+
         responses = (
-            PollStats.objects.filter(org=org, date__gte=start, question_id__in=question_ids)
-            .exclude(category=None)
+            PollStatsCounter.objects.filter(org=org, date__gte=start, is_responded=True)
             .values("date")
             .annotate(Sum("count"))
         )
@@ -239,13 +358,9 @@ class PollStats(models.Model):
     def get_gender_opinion_responses(cls, org, time_filter):
         now = timezone.now()
         year_ago = now - timedelta(days=365)
-        start = year_ago.replace(day=1)
+        start = year_ago.replace(day=1).date()
         translation.activate(org.language)
 
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
-        )
-
         genders = GenderSegment.objects.all()
         if not org.get_config("common.has_extra_gender"):
             genders = genders.exclude(gender="O")
@@ -255,10 +370,9 @@ class PollStats(models.Model):
         output_data = []
         for gender in genders:
             responses = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, gender_segment_id=gender["id"], question_id__in=question_ids
+                PollStatsCounter.objects.filter(
+                    org=org, date__gte=start, gender_segment_id=gender["id"], is_responded=True
                 )
-                .exclude(category=None)
                 .values("date")
                 .annotate(Sum("count"))
             )
@@ -270,25 +384,13 @@ class PollStats(models.Model):
     def get_location_opinion_responses(cls, org, time_filter):
         now = timezone.now()
         year_ago = now - timedelta(days=365)
-        start = year_ago.replace(day=1)
-
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
-        )
+        start = year_ago.replace(day=1).date()
 
         top_boundaries = Boundary.get_org_top_level_boundaries_name(org)
         output_data = []
         for osm_id, name in top_boundaries.items():
-            boundary_ids = list(
-                Boundary.objects.filter(org=org)
-                .filter(Q(osm_id=osm_id) | Q(parent__osm_id=osm_id) | Q(parent__parent__osm_id=osm_id))
-                .values_list("pk", flat=True)
-            )
             responses = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, location_id__in=boundary_ids, question_id__in=question_ids
-                )
-                .exclude(category=None)
+                PollStatsCounter.objects.filter(org=org, date__gte=start, location_osm_id=osm_id, is_responded=True)
                 .values("date")
                 .annotate(Sum("count"))
             )
@@ -300,10 +402,7 @@ class PollStats(models.Model):
     def get_age_opinion_responses(cls, org, time_filter):
         now = timezone.now()
         year_ago = now - timedelta(days=365)
-        start = year_ago.replace(day=1)
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
-        )
+        start = year_ago.replace(day=1).date()
 
         ages = AgeSegment.objects.all().values("id", "min_age", "max_age")
         output_data = []
@@ -322,10 +421,7 @@ class PollStats(models.Model):
                 data_key = "35+"
 
             responses = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, age_segment_id=age["id"], question_id__in=question_ids
-                )
-                .exclude(category=None)
+                PollStatsCounter.objects.filter(org=org, date__gte=start, age_segment_id=age["id"], is_responded=True)
                 .values("date")
                 .annotate(Sum("count"))
             )
@@ -342,7 +438,7 @@ class PollStats(models.Model):
 
         responses_data_dict = defaultdict(int)
         for elt in stats_qs:
-            key = dates_map.get(str(elt["date"].date()))
+            key = dates_map.get(str(elt["date"]))
             responses_data_dict[key] += elt["count__sum"]
 
         data = dict()
@@ -355,21 +451,12 @@ class PollStats(models.Model):
     def get_all_response_rate_series(cls, org, time_filter):
         now = timezone.now()
         year_ago = now - timedelta(days=365)
-        start = year_ago.replace(day=1)
+        start = year_ago.replace(day=1).date()
         translation.activate(org.language)
 
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
-        )
-
-        polled_stats = (
-            PollStats.objects.filter(org=org, date__gte=start, question_id__in=question_ids)
-            .values("date")
-            .annotate(Sum("count"))
-        )
+        polled_stats = PollStatsCounter.objects.filter(org=org, date__gte=start).values("date").annotate(Sum("count"))
         responded_stats = (
-            PollStats.objects.filter(org=org, date__gte=start, question_id__in=question_ids)
-            .exclude(category=None)
+            PollStatsCounter.objects.filter(org=org, date__gte=start, is_responded=True)
             .values("date")
             .annotate(Sum("count"))
         )
@@ -385,31 +472,18 @@ class PollStats(models.Model):
     def get_location_response_rate_series(cls, org, time_filter):
         now = timezone.now()
         year_ago = now - timedelta(days=365)
-        start = year_ago.replace(day=1)
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
-        )
+        start = year_ago.replace(day=1).date()
 
         top_boundaries = Boundary.get_org_top_level_boundaries_name(org)
         output_data = []
         for osm_id, name in top_boundaries.items():
-            boundary_ids = list(
-                Boundary.objects.filter(org=org)
-                .filter(Q(osm_id=osm_id) | Q(parent__osm_id=osm_id) | Q(parent__parent__osm_id=osm_id))
-                .values_list("pk", flat=True)
-            )
             polled_stats = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, location_id__in=boundary_ids, question_id__in=question_ids
-                )
+                PollStatsCounter.objects.filter(org=org, date__gte=start, location_osm_id=osm_id)
                 .values("date")
                 .annotate(Sum("count"))
             )
             responded_stats = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, location_id__in=boundary_ids, question_id__in=question_ids
-                )
-                .exclude(category=None)
+                PollStatsCounter.objects.filter(org=org, date__gte=start, location_osm_id=osm_id, is_responded=True)
                 .values("date")
                 .annotate(Sum("count"))
             )
@@ -421,10 +495,7 @@ class PollStats(models.Model):
     def get_gender_response_rate_series(cls, org, time_filter):
         now = timezone.now()
         year_ago = now - timedelta(days=365)
-        start = year_ago.replace(day=1)
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
-        )
+        start = year_ago.replace(day=1).date()
         translation.activate(org.language)
 
         genders = GenderSegment.objects.all()
@@ -436,17 +507,14 @@ class PollStats(models.Model):
         output_data = []
         for gender in genders:
             polled_stats = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, gender_segment_id=gender["id"], question_id__in=question_ids
-                )
+                PollStatsCounter.objects.filter(org=org, date__gte=start, gender_segment_id=gender["id"])
                 .values("date")
                 .annotate(Sum("count"))
             )
             responded_stats = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, gender_segment_id=gender["id"], question_id__in=question_ids
+                PollStatsCounter.objects.filter(
+                    org=org, date__gte=start, gender_segment_id=gender["id"], is_responded=True
                 )
-                .exclude(category=None)
                 .values("date")
                 .annotate(Sum("count"))
             )
@@ -459,10 +527,7 @@ class PollStats(models.Model):
     def get_age_response_rate_series(cls, org, time_filter):
         now = timezone.now()
         year_ago = now - timedelta(days=365)
-        start = year_ago.replace(day=1)
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
-        )
+        start = year_ago.replace(day=1).date()
 
         ages = AgeSegment.objects.all().values("id", "min_age", "max_age")
         output_data = []
@@ -481,17 +546,12 @@ class PollStats(models.Model):
                 data_key = "35+"
 
             polled_stats = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, age_segment_id=age["id"], question_id__in=question_ids
-                )
+                PollStatsCounter.objects.filter(org=org, date__gte=start, age_segment_id=age["id"])
                 .values("date")
                 .annotate(Sum("count"))
             )
             responded_stats = (
-                PollStats.objects.filter(
-                    org=org, date__gte=start, age_segment_id=age["id"], question_id__in=question_ids
-                )
-                .exclude(category=None)
+                PollStatsCounter.objects.filter(org=org, date__gte=start, age_segment_id=age["id"], is_responded=True)
                 .values("date")
                 .annotate(Sum("count"))
             )
@@ -508,12 +568,12 @@ class PollStats(models.Model):
 
         polled_data_dict = defaultdict(int)
         for elt in polled_qs:
-            key = dates_map.get(str(elt["date"].date()))
+            key = dates_map.get(str(elt["date"]))
             polled_data_dict[key] += elt["count__sum"]
 
         responded_data_dict = defaultdict(int)
         for elt in responded_qs:
-            key = dates_map.get(str(elt["date"].date()))
+            key = dates_map.get(str(elt["date"]))
             responded_data_dict[key] += elt["count__sum"]
 
         data = dict()
@@ -543,16 +603,8 @@ class PollStats(models.Model):
 
         key = f"org:{org.id}:average_response_rate"
 
-        question_ids = list(
-            PollQuestion.objects.filter(is_active=True, poll__org_id=org.id).values_list("id", flat=True)
-        )
-
-        polled_stats = PollStats.objects.filter(org=org, question_id__in=question_ids).aggregate(Sum("count"))
-        responded_stats = (
-            PollStats.objects.filter(org=org, question_id__in=question_ids)
-            .exclude(category=None)
-            .aggregate(Sum("count"))
-        )
+        polled_stats = PollStatsCounter.objects.filter(org=org).aggregate(Sum("count"))
+        responded_stats = PollStatsCounter.objects.filter(org=org, is_responded=True).aggregate(Sum("count"))
 
         responded = responded_stats.get("count__sum", 0)
         if responded is None:
@@ -567,6 +619,100 @@ class PollStats(models.Model):
         return percentage
 
 
+class PollStatsCounter(models.Model):
+    """
+    Daily rollup of the PollStats of the active questions by segments and top level boundary, that the engagement
+    series read instead of the raw stats
+    """
+
+    COUNTS_SQL = """
+    INSERT INTO stats_pollstatscounter("org_id", "date", "age_segment_id", "gender_segment_id", "location_osm_id", "is_responded", "count")
+    SELECT s."org_id", date_trunc('day', s."date")::date, s."age_segment_id", s."gender_segment_id",
+      CASE
+        WHEN b."level" = %(top_level)s THEN b."osm_id"
+        WHEN p."level" = %(top_level)s THEN p."osm_id"
+        WHEN gp."level" = %(top_level)s THEN gp."osm_id"
+      END,
+      s."category_id" IS NOT NULL,
+      SUM(s."count")
+    FROM stats_pollstats s
+    INNER JOIN polls_pollquestion q ON q."id" = s."question_id" AND q."is_active"
+    LEFT JOIN locations_boundary b ON b."id" = s."location_id"
+    LEFT JOIN locations_boundary p ON p."id" = b."parent_id"
+    LEFT JOIN locations_boundary gp ON gp."id" = p."parent_id"
+    WHERE s."org_id" = %(org_id)s AND s."date" >= %(start)s AND s."date" < %(end)s
+      AND date_trunc('day', s."date")::date = ANY(%(dates)s)
+    GROUP BY 1, 2, 3, 4, 5, 6
+    """
+
+    org = models.ForeignKey(Org, on_delete=models.PROTECT, related_name="poll_stats_counters")
+
+    date = models.DateField()
+
+    age_segment = models.ForeignKey(AgeSegment, null=True, on_delete=models.SET_NULL)
+
+    gender_segment = models.ForeignKey(GenderSegment, null=True, on_delete=models.SET_NULL)
+
+    location_osm_id = models.CharField(
+        max_length=15, null=True, help_text=_("The OSM id of the top level boundary of the org for these stats")
+    )
+
+    is_responded = models.BooleanField(help_text=_("Whether these stats have a response category"))
+
+    count = models.IntegerField(default=0, help_text=_("Number of items with this counter"))
+
+    class Meta:
+        index_together = ("org", "date")
+
+    @classmethod
+    def refresh_counts(cls, org_id, dates):
+        """
+        Recomputes the counters of the org for the given days from the PollStats of the active questions
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return 0
+
+        org = Org.objects.get(pk=org_id)
+        params = dict(
+            org_id=org_id,
+            dates=dates,
+            start=dates[0],
+            end=dates[-1] + timedelta(days=1),
+            top_level=Boundary.get_org_top_level(org),
+        )
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'DELETE FROM stats_pollstatscounter WHERE "org_id" = %(org_id)s AND "date" = ANY(%(dates)s)',
+                    params,
+                )
+                cursor.execute(cls.COUNTS_SQL, params)
+                return cursor.rowcount
+
+    @classmethod
+    def get_questions_dates(cls, org_id, question_ids):
+        """
+        Returns the days the given questions have stats on
+        """
+        days = (
+            PollStats.objects.filter(org_id=org_id, question_id__in=question_ids)
+            .exclude(date=None)
+            .annotate(day=TruncDay("date", tzinfo=pytz.utc))
+            .values_list("day", flat=True)
+            .distinct()
+        )
+        return [elt.date() for elt in days]
+
+    @classmethod
+    def refresh_questions_counts(cls, org_id, question_ids):
+        """
+        Recomputes the counters of the org for all the days the given questions have stats on
+        """
+        return cls.refresh_counts(org_id, cls.get_questions_dates(org_id, question_ids))
+
+
 class ContactActivity(models.Model):
     org = models.ForeignKey(Org, on_delete=models.PROTECT, related_name="contact_activities")
 
@@ -607,6 +753,69 @@ class ContactActivity(models.Model):
 
         return dict(data)
 
+    @classmethod
+    def get_segments_series_activity(cls, org):
+        """
+        Returns the monthly activities of the last year for the series of each segment, using one grouped query per
+        segment
+        """
+        now = timezone.now()
+        today = now.date()
+        year_ago = now - timedelta(days=365)
+        start = year_ago.replace(day=1).date()
+
+        activities_qs = ContactActivity.objects.filter(org=org, date__lte=today, date__gte=start)
+
+        segments_series = dict()
+
+        all_series = dict(attrs=dict(), activities=[])
+        for elt in activities_qs.values("date").annotate(Count("id")):
+            all_series["activities"].append(elt)
+        segments_series["all"] = [all_series]
+
+        ages = AgeSegment.objects.all().values("id", "min_age", "max_age")
+        age_series = [
+            (age, dict(attrs=dict(name=AgeSegment.AGE_LABELS.get(age["min_age"])), activities=[])) for age in ages
+        ]
+        age_activities = (
+            activities_qs.exclude(born=None)
+            .exclude(date=None)
+            .annotate(year=ExtractYear("date"))
+            .annotate(age=ExpressionWrapper(F("year") - F("born"), output_field=IntegerField()))
+            .values("date", "age")
+            .annotate(Count("id"))
+        )
+        for elt in age_activities:
+            for age, series in age_series:
+                if age["min_age"] <= elt["age"] <= age["max_age"]:
+                    series["activities"].append(elt)
+        segments_series["age"] = [series for age, series in age_series]
+
+        genders = GenderSegment.objects.all()
+        if not org.get_config("common.has_extra_gender"):
+            genders = genders.exclude(gender="O")
+
+        gender_series = {
+            gender: dict(attrs=dict(name=str(GenderSegment.GENDERS.get(gender))), activities=[])
+            for gender in genders.values_list("gender", flat=True)
+        }
+        for elt in activities_qs.values("date", "gender").annotate(Count("id")):
+            if elt["gender"] in gender_series:
+                gender_series[elt["gender"]]["activities"].append(elt)
+        segments_series["gender"] = list(gender_series.values())
+
+        top_boundaries = Boundary.get_org_top_level_boundaries_name(org)
+        location_series = {
+            osm_id: dict(attrs=dict(name=name, osm_id=osm_id), activities=[])
+            for osm_id, name in top_boundaries.items()
+        }
+        for elt in activities_qs.values("date", "state").annotate(Count("id")):
+            if elt["state"] in location_series:
+                location_series[elt["state"]]["activities"].append(elt)
+        segments_series["location"] = list(location_series.values())
+
+        return segments_series
+
     @classmethod
     def get_activity(cls, org, time_filter):
         now = timezone.now()
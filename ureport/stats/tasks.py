@@ -12,17 +12,7 @@ def refresh_engagement_data(org, since, until):
 
     start = time.time()
 
-    time_filters = list(PollStats.DATA_TIME_FILTERS.keys())
-    segments = list(PollStats.DATA_SEGMENTS.keys())
-    metrics = list(PollStats.DATA_METRICS.keys())
-
-    for time_filter in time_filters:
-        for segment in segments:
-            for metric in metrics:
-                PollStats.refresh_engagement_data(org, metric, segment, time_filter)
-                logger.info(
-                    f"Task: refresh_engagement_data org {org.id} in progress for {time.time() - start}s, for time_filter - {time_filter}, segment - {segment}, metric - {metric}"
-                )
+    PollStats.refresh_org_engagement_data(org)
 
     PollStats.calculate_average_response_rate(org)
 
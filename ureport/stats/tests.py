@@ -0,0 +1,313 @@
+from datetime import timedelta
+from importlib import import_module
+
+from dash.categories.models import Category
+
+from django.apps import apps
+from django.core.cache import cache
+from django.utils import timezone
+
+from ureport.locations.models import Boundary
+from ureport.stats.models import AgeSegment, ContactActivity, GenderSegment, PollStats, PollStatsCounter
+from ureport.tests import UreportTest
+
+
+class PollStatsCounterTest(UreportTest):
+    def setUp(self):
+        super(PollStatsCounterTest, self).setUp()
+
+        self.now = timezone.now()
+
+        self.education_nigeria = Category.objects.create(
+            org=self.nigeria, name="Education", created_by=self.admin, modified_by=self.admin
+        )
+        self.poll = self.create_poll(self.nigeria, "Poll 1", "flow-uuid", self.education_nigeria, self.admin)
+        self.poll_question = self.create_poll_question(self.admin, self.poll, "question 1", "step-uuid")
+        self.yes_category = self.create_poll_response_category(self.poll_question, "rule-uuid", "Yes")
+
+        self.nigeria_boundary = Boundary.objects.create(
+            org=self.nigeria,
+            osm_id="R-NIGERIA",
+            name="Nigeria",
+            parent=None,
+            level=Boundary.COUNTRY_LEVEL,
+            geometry='{"type":"MultiPolygon", "coordinates":[[1, 2]]}',
+        )
+        self.lagos_boundary = Boundary.objects.create(
+            org=self.nigeria,
+            osm_id="R-LAGOS",
+            name="Lagos",
+            parent=self.nigeria_boundary,
+            level=Boundary.STATE_LEVEL,
+            geometry='{"type":"MultiPolygon", "coordinates":[[1, 2]]}',
+        )
+        self.oyo_boundary = Boundary.objects.create(
+            org=self.nigeria,
+            osm_id="R-OYO",
+            name="Oyo",
+            parent=self.lagos_boundary,
+            level=Boundary.DISTRICT_LEVEL,
+            geometry='{"type":"MultiPolygon", "coordinates":[[1, 2]]}',
+        )
+        self.ikeja_boundary = Boundary.objects.create(
+            org=self.nigeria,
+            osm_id="R-IKEJA",
+            name="Ikeja",
+            parent=self.oyo_boundary,
+            level=Boundary.WARD_LEVEL,
+            geometry='{"type":"MultiPolygon", "coordinates":[[1, 2]]}',
+        )
+
+        for location, category, count in [
+            (self.lagos_boundary, self.yes_category, 2),
+            (self.oyo_boundary, None, 3),
+            (self.ikeja_boundary, self.yes_category, 4),
+            (None, self.yes_category, 1),
+        ]:
+            PollStats.objects.create(
+                org=self.nigeria,
+                question=self.poll_question,
+                category=category,
+                location=location,
+                date=self.now,
+                count=count,
+            )
+
+    def get_counters(self):
+        counters = PollStatsCounter.objects.filter(org=self.nigeria, date=self.now.date())
+        return {(elt.location_osm_id, elt.is_responded): elt.count for elt in counters}
+
+    def test_refresh_counts(self):
+        self.assertEqual(PollStatsCounter.refresh_counts(self.nigeria.id, []), 0)
+
+        PollStatsCounter.refresh_counts(self.nigeria.id, [self.now.date()])
+
+        # the districts and wards are counted in their state
+        self.assertEqual(self.get_counters(), {("R-LAGOS", True): 6, ("R-LAGOS", False): 3, (None, True): 1})
+
+        # refreshing again replaces the counters of the day
+        PollStatsCounter.refresh_counts(self.nigeria.id, [self.now.date()])
+        self.assertEqual(self.get_counters(), {("R-LAGOS", True): 6, ("R-LAGOS", False): 3, (None, True): 1})
+
+        # the top level boundaries of global orgs are countries, the wards are too deep to be counted in one
+        self.nigeria.set_config("common.is_global", True)
+
+        PollStatsCounter.refresh_counts(self.nigeria.id, [self.now.date()])
+        self.assertEqual(self.get_counters(), {("R-NIGERIA", True): 2, ("R-NIGERIA", False): 3, (None, True): 5})
+
+        # the counters keep their location when the boundaries are deleted to be pulled again
+        Boundary.objects.filter(org=self.nigeria).update(parent=None)
+        Boundary.objects.filter(org=self.nigeria).delete()
+        self.assertEqual(self.get_counters(), {("R-NIGERIA", True): 2, ("R-NIGERIA", False): 3, (None, True): 5})
+
+        # inactive questions are not counted
+        self.poll_question.is_active = False
+        self.poll_question.save()
+
+        PollStatsCounter.refresh_counts(self.nigeria.id, [self.now.date()])
+        self.assertEqual(self.get_counters(), dict())
+
+    def test_squash(self):
+        day = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        male = GenderSegment.objects.get(gender="M")
+
+        PollStats.objects.all().delete()
+
+        def create_stats(category, gender, location, count):
+            PollStats.objects.create(
+                org=self.nigeria,
+                question=self.poll_question,
+                category=category,
+                gender_segment=gender,
+                location=location,
+                date=day,
+                count=count,
+            )
+
+        def get_stats():
+            stats = PollStats.objects.filter(org=self.nigeria)
+            return {(elt.category_id, elt.gender_segment_id, elt.location_id): elt.count for elt in stats}
+
+        create_stats(None, None, None, 1)
+        create_stats(None, None, None, 2)
+        create_stats(self.yes_category, None, None, 3)
+        create_stats(self.yes_category, None, None, 4)
+        create_stats(self.yes_category, male, None, 5)
+        create_stats(self.yes_category, male, self.lagos_boundary, 6)
+        create_stats(self.yes_category, male, self.lagos_boundary, 7)
+
+        PollStats.squash()
+
+        # the NULL keys are only merged with the stats with the same NULL keys
+        self.assertEqual(
+            get_stats(),
+            {
+                (None, None, None): 3,
+                (self.yes_category.id, None, None): 7,
+                (self.yes_category.id, male.id, None): 5,
+                (self.yes_category.id, male.id, self.lagos_boundary.id): 13,
+            },
+        )
+        self.assertEqual(PollStats.objects.filter(is_squashed=True).count(), 4)
+
+        # new stats are merged into the squashed ones
+        create_stats(None, None, None, 4)
+        create_stats(self.yes_category, male, None, -1)
+
+        PollStats.squash()
+
+        self.assertEqual(
+            get_stats(),
+            {
+                (None, None, None): 7,
+                (self.yes_category.id, None, None): 7,
+                (self.yes_category.id, male.id, None): 4,
+                (self.yes_category.id, male.id, self.lagos_boundary.id): 13,
+            },
+        )
+        self.assertEqual(PollStats.objects.filter(is_squashed=True).count(), 4)
+
+        # the daily counters of the squashed day are refreshed
+        self.assertEqual(self.get_counters(), {("R-LAGOS", True): 13, (None, True): 7, (None, False): 7})
+
+        # stats left without a question are still squashed together
+        for count in [2, 3]:
+            PollStats.objects.create(org=self.nigeria, question=None, category=None, date=day, count=count)
+
+        PollStats.squash()
+
+        question_stats = PollStats.objects.filter(org=self.nigeria, question=None)
+        self.assertEqual([(elt.count, elt.is_squashed) for elt in question_stats], [(5, True)])
+        self.assertEqual(PollStats.objects.filter(is_squashed=True).count(), 5)
+
+    def test_location_series(self):
+        month_key = str(self.now.date().replace(day=1))
+
+        PollStatsCounter.refresh_counts(self.nigeria.id, [self.now.date()])
+
+        series = PollStats.get_location_opinion_responses(self.nigeria, 12)
+        self.assertEqual([(elt["name"], elt["osm_id"]) for elt in series], [("Lagos", "R-LAGOS")])
+        self.assertEqual(series[0]["data"][month_key], 6)
+        self.assertEqual(sum(series[0]["data"].values()), 6)
+
+        series = PollStats.get_location_response_rate_series(self.nigeria, 12)
+        self.assertEqual(series[0]["data"][month_key], round(6 * 100 / 9, 2))
+
+        segments_series = PollStats.get_segments_series_stats(self.nigeria)
+        self.assertEqual(len(segments_series["location"]), 1)
+        self.assertEqual(segments_series["location"][0]["attrs"], dict(name="Lagos", osm_id="R-LAGOS"))
+        self.assertEqual(PollStats.get_counts_data(segments_series["location"][0]["responded"], 12)[month_key], 6)
+        self.assertEqual(PollStats.get_counts_data(segments_series["all"][0]["polled"], 12)[month_key], 10)
+
+        # global orgs have series for their countries
+        self.nigeria.set_config("common.is_global", True)
+        PollStatsCounter.refresh_counts(self.nigeria.id, [self.now.date()])
+
+        series = PollStats.get_location_opinion_responses(self.nigeria, 12)
+        self.assertEqual([(elt["name"], elt["osm_id"]) for elt in series], [("Nigeria", "R-NIGERIA")])
+        self.assertEqual(series[0]["data"][month_key], 2)
+
+        series = PollStats.get_location_response_rate_series(self.nigeria, 12)
+        self.assertEqual(series[0]["data"][month_key], 40.0)
+
+        segments_series = PollStats.get_segments_series_stats(self.nigeria)
+        self.assertEqual(segments_series["location"][0]["attrs"], dict(name="Nigeria", osm_id="R-NIGERIA"))
+        self.assertEqual(PollStats.get_counts_data(segments_series["location"][0]["responded"], 12)[month_key], 2)
+
+    def test_populate_poll_stats_counters(self):
+        migration = import_module("ureport.stats.migrations.0012_populate_poll_stats_counters")
+
+        PollStatsCounter.refresh_counts(self.nigeria.id, [self.now.date()])
+        refreshed = self.get_counters()
+
+        PollStatsCounter.objects.all().delete()
+        migration.populate_poll_stats_counters(apps, None)
+
+        # the backfill builds the same counters as the refresh
+        self.assertEqual(self.get_counters(), refreshed)
+        self.assertEqual(PollStatsCounter.objects.count(), 3)
+
+        self.nigeria.set_config("common.is_global", True)
+        PollStatsCounter.refresh_counts(self.nigeria.id, [self.now.date()])
+        refreshed = self.get_counters()
+
+        PollStatsCounter.objects.all().delete()
+        migration.populate_poll_stats_counters(apps, None)
+
+        self.assertEqual(self.get_counters(), refreshed)
+
+    def test_refresh_org_engagement_data(self):
+        day = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        male = GenderSegment.objects.get(gender="M")
+        female = GenderSegment.objects.get(gender="F")
+        age_20 = AgeSegment.objects.get(min_age=20)
+        age_25 = AgeSegment.objects.get(min_age=25)
+
+        for category, age, gender, location, date, count in [
+            (self.yes_category, age_20, male, self.lagos_boundary, day - timedelta(days=40), 5),
+            (None, age_25, female, self.oyo_boundary, day - timedelta(days=40), 3),
+            (self.yes_category, None, male, None, day - timedelta(days=200), 2),
+            (self.yes_category, age_25, None, self.ikeja_boundary, day - timedelta(days=200), 4),
+        ]:
+            PollStats.objects.create(
+                org=self.nigeria,
+                question=self.poll_question,
+                category=category,
+                age_segment=age,
+                gender_segment=gender,
+                location=location,
+                date=date,
+                count=count,
+            )
+
+        PollStatsCounter.refresh_counts(
+            self.nigeria.id,
+            [self.now.date(), (day - timedelta(days=40)).date(), (day - timedelta(days=200)).date()],
+        )
+
+        this_month = self.now.date().replace(day=1)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
+        older_month = (this_month - timedelta(days=150)).replace(day=1)
+
+        for contact, born, gender, state, date in [
+            ("contact-1", self.now.year - 22, "M", "R-LAGOS", this_month),
+            ("contact-1", self.now.year - 22, "M", "R-LAGOS", last_month),
+            ("contact-2", self.now.year - 17, "F", "R-OYO", last_month),
+            ("contact-3", None, None, None, older_month),
+        ]:
+            ContactActivity.objects.create(
+                org=self.nigeria, contact=contact, born=born, gender=gender, state=state, date=date
+            )
+
+        def get_key(metric, segment_slug, time_filter):
+            return f"org:{self.nigeria.id}:metric:{metric}:segment:{segment_slug}:filter:{time_filter}"
+
+        keys = [
+            (metric, segment_slug, time_filter)
+            for time_filter in PollStats.DATA_TIME_FILTERS.keys()
+            for segment_slug in PollStats.DATA_SEGMENTS.keys()
+            for metric in PollStats.DATA_METRICS.keys()
+        ]
+
+        for metric, segment_slug, time_filter in keys:
+            cache.delete(get_key(metric, segment_slug, time_filter))
+
+        PollStats.refresh_org_engagement_data(self.nigeria)
+
+        refreshed = dict()
+        for metric, segment_slug, time_filter in keys:
+            cached_value = cache.get(get_key(metric, segment_slug, time_filter))
+            refreshed[(metric, segment_slug, time_filter)] = cached_value["results"] if cached_value else []
+
+        self.assertEqual(sum(refreshed[("opinion-responses", "location", 12)][0]["data"].values()), 15)
+        self.assertEqual(sum(refreshed[("opinion-responses", "gender", 12)][0]["data"].values()), 7)
+        self.assertEqual(sum(refreshed[("active-users", "all", 12)][0]["data"].values()), 4)
+        self.assertEqual(sum(refreshed[("active-users", "location", 12)][0]["data"].values()), 2)
+
+        # the data refreshed for the whole org is the data each metric refresh calculates on its own
+        for metric, segment_slug, time_filter in keys:
+            self.assertEqual(
+                refreshed[(metric, segment_slug, time_filter)],
+                PollStats.refresh_engagement_data(self.nigeria, metric, segment_slug, time_filter),
+                (metric, segment_slug, time_filter),
+            )
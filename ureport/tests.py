@@ -121,9 +121,10 @@ class TestBackend(RapidProBackend):
 
 
 class MockResponse(object):
-    def __init__(self, status_code, content=""):
+    def __init__(self, status_code, content="", headers=None):
         self.content = content
         self.status_code = status_code
+        self.headers = headers or dict()
 
     def raise_for_status(self):
         if self.status_code != 200:
@@ -132,6 +133,14 @@ class MockResponse(object):
     def json(self, **kwargs):
         return json.loads(self.content)
 
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self.content), chunk_size):
+            end = start + chunk_size
+            yield self.content[start:end]
+
+    def close(self):
+        pass
+
     def __next__(self):
         return self
 
@@ -156,7 +165,11 @@ class UreportTest(SmartminTest, DashTest):
         floip_backend = self.nigeria.backends.filter(slug="floip").first()
         if not floip_backend:
             floip_backend, created = self.nigeria.backends.get_or_create(
-                api_token=random_string(32), slug="floip", created_by=self.admin, modified_by=self.admin
+                api_token=random_string(32),
+                slug="floip",
+                backend_type="ureport.backend.floip.FLOIPBackend",
+                created_by=self.admin,
+                modified_by=self.admin,
             )
 
         self.floip_backend = floip_backend
@@ -272,6 +285,8 @@ class UreportTest(SmartminTest, DashTest):
                 flow_result_category=flow_result_category,
                 is_active=True,
             )
+
+        question.update_categories_data()
         return obj
 
 
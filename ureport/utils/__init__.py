@@ -1,20 +1,29 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import gzip
+import hashlib
 import iso8601
 import json
 import six
 import time
 import logging
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import timedelta, datetime
 from itertools import islice, chain
 from collections import defaultdict
+from functools import reduce
 
 from dash.orgs.models import Org
+from dash.stories.models import Story
 from dash.utils import datetime_to_ms
 from django.conf import settings
 from django.core.cache import cache
+from django.db import connection
 from django.db.models import Sum
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils import timezone, translation
 import pytz
 from ureport.assets.models import Image, LOGO
@@ -23,12 +32,21 @@ from sentry_sdk import capture_exception
 from ureport.locations.models import Boundary
 from ureport.polls.models import Poll, PollResult
 from ureport.stats.models import PollStats, GenderSegment, AgeSegment
+from ureport.utils.local_cache import local_cache as process_cache
 
 GLOBAL_COUNT_CACHE_KEY = "global_count"
 
 ORG_CONTACT_COUNT_KEY = "org:%d:contacts-counts"
 ORG_CONTACT_COUNT_TIMEOUT = 3600
 
+ORG_CONTACT_LOCATIONS_STATS_KEY = "org:%d:contacts-locations-stats"
+
+ORG_PAGE_CONTEXT_CACHE_KEY = "org:%d:page_context"
+ORG_PAGE_CONTEXT_CACHE_TIME = 60 * 60 * 24
+
+OLD_SITES_FETCH_QUEUED_KEY = "fetch_old_sites_count_queued"
+OLD_SITE_FAILURES_KEY = "org:%s:reporters:old-site:failures"
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,6 +55,58 @@ def offline_context():
         yield dict(STATIC_URL=settings.STATIC_URL, base_template="frame.html", org=org, debug=False, testing=False)
 
 
+def render_json(data):
+    """
+    Serializes data once for the JSON endpoints, with its gzip variant and the ETag of the content
+    """
+    content = json.dumps(data).encode("utf-8")
+    return dict(content=content, gzip=gzip.compress(content), etag='"%s"' % hashlib.md5(content).hexdigest())
+
+
+def accepts_gzip(request):
+    """
+    Whether the Accept-Encoding of the request accepts gzip, an encoding with a quality value of 0 is not acceptable
+    """
+    for encoding in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, *params = [elt.strip() for elt in encoding.split(";")]
+        if coding.lower() != "gzip":
+            continue
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+
+    return False
+
+
+def rendered_json_response(request, rendered):
+    """
+    Responds with stored rendered JSON, gzipped when the client accepts it and not modified when the client already
+    has the same content. The gzipped content is a different representation so it has its own ETag
+    """
+    gzipped = accepts_gzip(request)
+    etag = '%s-gzip"' % rendered["etag"][:-1] if gzipped else rendered["etag"]
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH", "")
+    if etag in [elt.strip() for elt in if_none_match.split(",")] or if_none_match.strip() == "*":
+        response = HttpResponseNotModified()
+    elif gzipped:
+        response = HttpResponse(rendered["gzip"])
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(rendered["content"])
+
+    response["ETag"] = etag
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
 def datetime_to_json_date(dt):
     """
     Formats a datetime as a string for inclusion in JSON
@@ -130,6 +200,78 @@ def get_logo(org):
     return logo_field
 
 
+def get_org_page_context(org):
+    """
+    Returns the org context shared by all the public pages, the featured stories, the display flags, the colors, the
+    other languages sites and the top level boundaries, cached until any of them is changed. The cached context is
+    cleared by the signals in ureport.public.signals, changes made with queryset.update() need clear_org_page_context
+    """
+    key = ORG_PAGE_CONTEXT_CACHE_KEY % org.id
+    page_context = process_cache.get(key, None)
+
+    if page_context is None:
+        page_context = build_org_page_context(org)
+        process_cache.set(key, page_context, ORG_PAGE_CONTEXT_CACHE_TIME)
+
+    return page_context
+
+
+def build_org_page_context(org):
+    page_context = dict()
+
+    # the stories are cached as the fields the pages show, named like the story attributes the templates read
+    main_stories = Story.objects.filter(org=org, featured=True, is_active=True).order_by("-created_on")
+    page_context["main_stories"] = []
+    for story in main_stories.select_related("category"):
+        image = story.get_image()
+        page_context["main_stories"].append(
+            dict(pk=story.pk, title=story.title, summary=story.summary, get_image=image.name if image else None)
+        )
+
+    backend_options = org.backends.filter(is_active=True).values_list("slug", flat=True)
+
+    page_context["district_zoom"] = reduce(
+        operator.or_, [bool(org.get_config("%s.district_label" % option)) for option in backend_options], False
+    )
+    page_context["ward_zoom"] = reduce(
+        operator.or_, [bool(org.get_config("%s.ward_label" % option)) for option in backend_options], False
+    )
+    page_context["show_maps"] = reduce(
+        operator.or_, [bool(org.get_config("%s.state_label" % option)) for option in backend_options], False
+    )
+    page_context["show_age_stats"] = reduce(
+        operator.or_, [bool(org.get_config("%s.born_label" % option)) for option in backend_options], False
+    )
+    page_context["show_gender_stats"] = reduce(
+        operator.or_, [bool(org.get_config("%s.gender_label" % option)) for option in backend_options], False
+    )
+    page_context["show_occupation_stats"] = reduce(
+        operator.or_, [bool(org.get_config("%s.occupation_label" % option)) for option in backend_options], False
+    )
+    page_context["colors_map"] = [str(color.strip()) for color in org.get_config("colors_map", "").split(",")]
+
+    other_languages_sites = {}
+    try:
+        other_languages_sites = json.loads(org.get_config("other_languages_sites"))
+    except Exception:
+        pass
+
+    page_context["other_languages_sites"] = sorted(
+        [dict(name=key, link=val) for key, val in other_languages_sites.items()], key=lambda q: q["name"]
+    )
+
+    page_context["states"] = sorted(
+        [dict(id=k, name=v) for k, v in Boundary.get_org_top_level_boundaries_name(org).items()],
+        key=lambda c: c["name"],
+    )
+
+    return page_context
+
+
+def clear_org_page_context(org_id):
+    process_cache.delete(ORG_PAGE_CONTEXT_CACHE_KEY % org_id)
+
+
 def fetch_flows(org, backend=None):
     from ureport.polls.models import CACHE_ORG_FLOWS_KEY, UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME
 
@@ -151,7 +293,7 @@ def fetch_flows(org, backend=None):
             org_flows["results"] = all_flows
 
             cache_key = CACHE_ORG_FLOWS_KEY % (org.pk, backend_obj.slug)
-            cache.set(cache_key, org_flows, UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME)
+            process_cache.set(cache_key, org_flows, UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME)
 
         except Exception as e:
             capture_exception(e)
@@ -165,10 +307,63 @@ def fetch_flows(org, backend=None):
         return org_flows.get("results", dict())
 
 
+def fetch_orgs_flows(orgs):
+    """
+    Fetches the flows of the active backends of the orgs concurrently, with a limited number of fetches in flight
+    for the same API host
+    """
+    start = time.time()
+
+    host_semaphores = defaultdict(lambda: threading.BoundedSemaphore(settings.FLOWS_FETCH_HOST_WORKERS))
+
+    def fetch_backend_flows(org, backend_obj, semaphore):
+        with semaphore:
+            try:
+                return fetch_flows(org, backend_obj)
+            finally:
+                # each worker thread has its own database connection
+                connection.close()
+
+    with ThreadPoolExecutor(max_workers=settings.FLOWS_FETCH_WORKERS) as executor:
+        futures = []
+        for org in orgs:
+            for backend_obj in org.backends.filter(is_active=True):
+                # a backend failing to load does not stop the fetches of the other backends
+                try:
+                    host = org.get_backend(backend_slug=backend_obj.slug).get_host()
+                except Exception as e:
+                    capture_exception(e)
+                    logger.error("Failed to load backend %s for %s" % (backend_obj.slug, org.name), exc_info=True)
+                    continue
+
+                futures.append(executor.submit(fetch_backend_flows, org, backend_obj, host_semaphores[host]))
+
+        for future in futures:
+            future.result()
+
+    logger.info("Fetch flows of %d backends took %ss" % (len(futures), time.time() - start))
+
+
+_http_sessions = threading.local()
+
+
+def get_http_session():
+    """
+    Gets the requests session of the current thread, keeping the connections to the API hosts alive between requests
+    """
+    import requests
+
+    session = getattr(_http_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        _http_sessions.session = session
+    return session
+
+
 def get_flows(org, backend):
     from ureport.polls.models import CACHE_ORG_FLOWS_KEY
 
-    cache_value = cache.get(CACHE_ORG_FLOWS_KEY % (org.pk, backend.slug), None)
+    cache_value = process_cache.get(CACHE_ORG_FLOWS_KEY % (org.pk, backend.slug), None)
     if cache_value:
         return cache_value["results"]
 
@@ -205,15 +400,15 @@ def update_poll_flow_data(org):
 
 
 def fetch_shared_sites_count():
-    import requests
-
     this_time = datetime.now()
     try:
-        response = requests.get("https://ureport.in/shared_sites_count/")
+        response = get_http_session().get(
+            "https://ureport.in/shared_sites_count/", timeout=settings.OLD_SITES_FETCH_TIMEOUT
+        )
         response.raise_for_status()
 
         value = {"time": datetime_to_ms(this_time), "results": response.json()}
-        cache.set("shared_sites", value, None)
+        process_cache.set("shared_sites", value, None)
         return value["results"]
     except Exception:
         import traceback
@@ -221,12 +416,23 @@ def fetch_shared_sites_count():
         traceback.print_exc()
 
 
+def fetch_old_sites_count_task():
+    """
+    Queues the fetch of the old sites and shared sites counts, at most once a minute whatever the number of requests
+    missing these counts
+    """
+    from ureport.polls.tasks import fetch_old_sites_count
+
+    if cache.add(OLD_SITES_FETCH_QUEUED_KEY, True, 60):
+        fetch_old_sites_count.delay()
+
+
 def get_shared_sites_count():
-    cache_value = cache.get("shared_sites", None)
+    cache_value = process_cache.get("shared_sites", None)
     if cache_value:
         return cache_value["results"]
     if getattr(settings, "IS_PROD", False):
-        return fetch_shared_sites_count()
+        fetch_old_sites_count_task()
     return {}
 
 
@@ -251,33 +457,58 @@ def get_linked_orgs(authenticated=False):
     return linked_sites_sorted
 
 
-def fetch_old_sites_count():
-    import requests
+def fetch_old_site_count(site, this_time):
+    """
+    Fetches and caches the count of one old site, the sites failing repeatedly are skipped until their circuit
+    breaker times out
+    """
     import re
     from ureport.polls.models import UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME
 
+    site_name = site.get("name").lower()
+    failures_key = OLD_SITE_FAILURES_KEY % site_name
+
+    failures = cache.get(failures_key, 0) or 0
+    if failures >= settings.OLD_SITES_CIRCUIT_BREAKER_FAILURES:
+        logger.info("Skipping fetch of the count of %s after repeated failures" % site_name)
+        return None
+
+    try:
+        response = get_http_session().get(site.get("count_link"), timeout=settings.OLD_SITES_FETCH_TIMEOUT)
+        response.raise_for_status()
+
+        count = int(re.search(r"\d+", response.content.decode("utf-8")).group())
+    except Exception:
+        import traceback
+
+        traceback.print_exc()
+
+        cache.set(failures_key, failures + 1, settings.OLD_SITES_CIRCUIT_BREAKER_TIMEOUT)
+        return None
+
+    key = "org:%s:reporters:%s" % (site_name, "old-site")
+    value = {"time": datetime_to_ms(this_time), "results": dict(size=count)}
+    cache.set(key, value, UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME)
+    if failures:
+        cache.delete(failures_key)
+    return value
+
+
+def fetch_old_sites_count():
     start = time.time()
     this_time = datetime.now()
-    linked_sites = list(getattr(settings, "COUNTRY_FLAGS_SITES", []))
+    linked_sites = [site for site in getattr(settings, "COUNTRY_FLAGS_SITES", []) if site.get("count_link", "")]
 
     old_site_values = []
 
-    for site in linked_sites:
-        count_link = site.get("count_link", "")
-        if count_link:
-            try:
-                response = requests.get(count_link)
-                response.raise_for_status()
+    # each site count is cached as soon as it is fetched, a slow site only holds its own worker
+    with ThreadPoolExecutor(max_workers=settings.OLD_SITES_FETCH_WORKERS) as executor:
+        futures = [executor.submit(fetch_old_site_count, site, this_time) for site in linked_sites]
 
-                count = int(re.search(r"\d+", response.content.decode("utf-8")).group())
-                key = "org:%s:reporters:%s" % (site.get("name").lower(), "old-site")
-                value = {"time": datetime_to_ms(this_time), "results": dict(size=count)}
+        for future in as_completed(futures):
+            value = future.result()
+            if value:
                 old_site_values.append(value)
-                cache.set(key, value, UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME)
-            except Exception:
-                import traceback
-
-                traceback.print_exc()
 
     # delete the global count cache to force a recalculate at the end
     cache.delete(GLOBAL_COUNT_CACHE_KEY)
@@ -304,9 +535,9 @@ def get_global_count():
                 if value:
                     cached_values.append(value)
 
-        # no old sites cache values, double check with a fetch
+        # no old sites cache values, they are fetched in the background
         if not cached_values:
-            cached_values = fetch_old_sites_count()
+            fetch_old_sites_count_task()
 
         count = sum([elt["results"].get("size", 0) for elt in cached_values if elt.get("results", None)])
 
@@ -324,7 +555,7 @@ def get_global_count():
 def get_org_contacts_counts(org):
 
     key = ORG_CONTACT_COUNT_KEY % org.pk
-    org_contacts_counts = cache.get(key, None)
+    org_contacts_counts = process_cache.get(key, None)
     if org_contacts_counts:
         return org_contacts_counts
 
@@ -336,7 +567,8 @@ def update_cache_org_contact_counts(org):
 
     key = ORG_CONTACT_COUNT_KEY % org.pk
     org_contacts_counts = ReportersCounter.get_counts(org)
-    cache.set(key, org_contacts_counts, ORG_CONTACT_COUNT_TIMEOUT)
+    process_cache.set(key, org_contacts_counts, ORG_CONTACT_COUNT_TIMEOUT)
+    update_cache_org_ureporters_locations_stats(org, org_contacts_counts)
     return org_contacts_counts
 
 
@@ -743,6 +975,54 @@ def get_ureporters_locations_stats(org, segment):
     ]
 
 
+def get_ureporters_locations_stats_segment_key(segment):
+    field_type = (segment.get("location", None) or "").lower()
+    if field_type == "state":
+        return field_type
+    return "%s:%s" % (field_type, segment.get("parent", None))
+
+
+def update_cache_org_ureporters_locations_stats(org, org_contacts_counts):
+    """
+    Renders the reporters locations stats of every map segment of the org from its contacts counts, so the
+    reporters results endpoint serves the stored JSON
+    """
+    boundary_top_level = Boundary.COUNTRY_LEVEL if org.get_config("common.is_global") else Boundary.STATE_LEVEL
+    boundaries = (
+        Boundary.objects.filter(org=org, level__in=[boundary_top_level, Boundary.DISTRICT_LEVEL, Boundary.WARD_LEVEL])
+        .exclude(is_active=False, level__in=[boundary_top_level, Boundary.DISTRICT_LEVEL])
+        .values("osm_id", "name", "level", "parent__osm_id")
+        .order_by("osm_id")
+    )
+
+    segments_stats = defaultdict(list)
+    for elt in boundaries:
+        if elt["level"] == boundary_top_level:
+            field_type = "state"
+            segment_key = get_ureporters_locations_stats_segment_key(dict(location=field_type))
+        else:
+            field_type = "district" if elt["level"] == Boundary.DISTRICT_LEVEL else "ward"
+            segment_key = get_ureporters_locations_stats_segment_key(
+                dict(location=field_type, parent=elt["parent__osm_id"])
+            )
+
+        location_count = org_contacts_counts.get("%s:%s" % (field_type, elt["osm_id"]), 0)
+        segments_stats[segment_key].append(dict(boundary=elt["osm_id"], label=elt["name"], set=location_count))
+
+    rendered_stats = {segment_key: render_json(stats) for segment_key, stats in segments_stats.items()}
+    process_cache.set(ORG_CONTACT_LOCATIONS_STATS_KEY % org.pk, rendered_stats, ORG_CONTACT_COUNT_TIMEOUT)
+    return rendered_stats
+
+
+def get_rendered_ureporters_locations_stats(org, segment):
+    rendered_stats = process_cache.get(ORG_CONTACT_LOCATIONS_STATS_KEY % org.pk, None) or dict()
+    rendered = rendered_stats.get(get_ureporters_locations_stats_segment_key(segment), None)
+    if rendered:
+        return rendered
+
+    return render_json(get_ureporters_locations_stats(org, segment))
+
+
 def get_ureporters_locations_response_rates(org, segment):
     parent = segment.get("parent", None)
     field_type = segment.get("location", None)
@@ -984,6 +1264,7 @@ def populate_contact_activity(org):
 Org.get_occupation_stats = get_occupation_stats
 Org.get_reporters_count = get_reporters_count
 Org.get_ureporters_locations_stats = get_ureporters_locations_stats
+Org.get_rendered_ureporters_locations_stats = get_rendered_ureporters_locations_stats
 Org.get_registration_stats = get_registration_stats
 Org.get_age_stats = get_age_stats
 Org.get_gender_stats = get_gender_stats
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django_redis import get_redis_connection
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import force_text
+
+LOCAL_CACHE_INVALIDATION_CHANNEL = "local-cache-invalidation"
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache(object):
+    """
+    A small per process LRU cache with a TTL in front of the django cache, for the read mostly keys of the public
+    pages. The writers of these keys publish them on a redis channel so every process drops its local copy.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def is_enabled(self):
+        return self.timeout > 0 and self.max_size > 0
+
+    def ensure_listener(self):
+        # the listener thread and the entries do not survive a fork, each worker process starts its own
+        if self.pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+
+            self.entries.clear()
+            self.pid = os.getpid()
+
+            listener = threading.Thread(target=self.listen, name="local-cache-invalidation")
+            listener.daemon = True
+            listener.start()
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(LOCAL_CACHE_INVALIDATION_CHANNEL)
+
+                # invalidations may have been missed while we were not subscribed
+                self.clear()
+
+                for message in pubsub.listen():
+                    self.discard(force_text(message["data"]))
+            except Exception:
+                logger.error("Local cache invalidation listener failed", exc_info=True)
+                self.clear()
+                time.sleep(1)
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_on, value = entry
+            if expires_on < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return entry
+
+    def store(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get(self, key, default=None):
+        if not self.is_enabled():
+            return cache.get(key, default)
+
+        self.ensure_listener()
+
+        entry = self.lookup(key)
+        if entry is not None:
+            return entry[1]
+
+        value = cache.get(key, None)
+        if value is None:
+            return default
+
+        self.store(key, value)
+        return value
+
+    def get_many(self, keys):
+        if not self.is_enabled():
+            return cache.get_many(keys)
+
+        self.ensure_listener()
+
+        values = dict()
+        missing_keys = []
+        for key in keys:
+            entry = self.lookup(key)
+            if entry is not None:
+                values[key] = entry[1]
+            else:
+                missing_keys.append(key)
+
+        if missing_keys:
+            cached_values = cache.get_many(missing_keys)
+            for key, value in cached_values.items():
+                self.store(key, value)
+            values.update(cached_values)
+
+        return values
+
+    def set(self, key, value, timeout=None):
+        cache.set(key, value, timeout)
+        self.invalidate(key)
+
+    def delete(self, key):
+        cache.delete(key)
+        self.invalidate(key)
+
+    def invalidate(self, key):
+        """
+        Drops the local copies of the key in this process and, through the invalidation channel, in all the others
+        """
+        if not self.is_enabled():
+            return
+
+        self.discard(key)
+        try:
+            get_redis_connection().publish(LOCAL_CACHE_INVALIDATION_CHANNEL, key)
+        except Exception:
+            logger.error("Failed to publish local cache invalidation of %s" % key, exc_info=True)
+
+
+local_cache = LocalCache(
+    max_size=getattr(settings, "LOCAL_CACHE_MAX_SIZE", 1000), timeout=getattr(settings, "LOCAL_CACHE_TIMEOUT", 30)
+)
@@ -2,12 +2,14 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import json
+import time
 from datetime import datetime
 
 import mock
 import pytz
 import redis
 from dash.categories.models import Category
+from dash.stories.models import Story, StoryImage
 from dash.test import MockClientQuery, MockResponse
 from mock import patch
 from temba_client.v2 import Flow
@@ -21,10 +23,16 @@ from ureport.polls.models import CACHE_ORG_FLOWS_KEY, UREPORT_ASYNC_FETCHED_DATA
 from ureport.tests import UreportTest
 from ureport.utils import (
     GLOBAL_COUNT_CACHE_KEY,
+    OLD_SITES_FETCH_QUEUED_KEY,
+    OLD_SITE_FAILURES_KEY,
     ORG_CONTACT_COUNT_KEY,
+    ORG_CONTACT_LOCATIONS_STATS_KEY,
+    ORG_PAGE_CONTEXT_CACHE_KEY,
     datetime_to_json_date,
     fetch_flows,
+    fetch_old_site_count,
     fetch_old_sites_count,
+    fetch_orgs_flows,
     get_age_stats,
     get_flows,
     get_gender_stats,
@@ -32,11 +40,15 @@ from ureport.utils import (
     get_linked_orgs,
     get_occupation_stats,
     get_org_contacts_counts,
+    get_org_page_context,
     get_regions_stats,
     get_registration_stats,
+    get_rendered_ureporters_locations_stats,
     get_reporters_count,
     get_ureporters_locations_stats,
     json_date_to_datetime,
+    render_json,
+    update_cache_org_contact_counts,
     update_poll_flow_data,
 )
 
@@ -145,6 +157,28 @@ class UtilsTest(UreportTest):
                 UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME,
             )
 
+    def test_fetch_orgs_flows(self):
+        with patch("ureport.utils.fetch_flows") as mock_fetch_flows:
+            mock_fetch_flows.return_value = "FETCHED"
+
+            fetch_orgs_flows([self.org, self.nigeria])
+
+            self.assertEqual(mock_fetch_flows.call_count, 3)
+            mock_fetch_flows.assert_any_call(self.org, self.org.backends.get(slug="rapidpro"))
+            mock_fetch_flows.assert_any_call(self.nigeria, self.rapidpro_backend)
+            mock_fetch_flows.assert_any_call(self.nigeria, self.floip_backend)
+
+            # a backend that cannot be loaded does not stop the fetches of the other backends
+            mock_fetch_flows.reset_mock()
+            self.floip_backend.backend_type = "ureport.backend.missing.MissingBackend"
+            self.floip_backend.save()
+
+            fetch_orgs_flows([self.org, self.nigeria])
+
+            self.assertEqual(mock_fetch_flows.call_count, 2)
+            mock_fetch_flows.assert_any_call(self.org, self.org.backends.get(slug="rapidpro"))
+            mock_fetch_flows.assert_any_call(self.nigeria, self.rapidpro_backend)
+
     def test_update_poll_flow_data(self):
         poll = Poll.objects.filter(pk=self.poll.pk).first()
         self.assertFalse(poll.flow_archived)
@@ -223,31 +257,52 @@ class UtilsTest(UreportTest):
         with patch("ureport.utils.datetime_to_ms") as mock_datetime_ms:
             mock_datetime_ms.return_value = 500
 
-            with patch("requests.get") as mock_get:
+            with patch("requests.Session.get") as mock_get:
                 mock_get.return_value = MockResponse(200, b"300")
 
-                with patch("django.core.cache.cache.set") as cache_set_mock:
-                    cache_set_mock.return_value = "Set"
+                # the sites are fetched in worker threads which have their own connections behind the cache proxy
+                with patch("ureport.utils.cache") as mock_cache:
+                    mock_cache.get.return_value = None
 
-                    with patch("django.core.cache.cache.delete") as cache_delete_mock:
-                        cache_delete_mock.return_value = "Deleted"
+                    old_site_values = fetch_old_sites_count()
+                    self.assertEqual(
+                        old_site_values,
+                        [{"time": 500, "results": dict(size=300)}]
+                        * len([elt for elt in settings_sites if elt["count_link"]]),
+                    )
 
-                        old_site_values = fetch_old_sites_count()
-                        self.assertEqual(
-                            old_site_values,
-                            [{"time": 500, "results": dict(size=300)}]
-                            * len([elt for elt in settings_sites if elt["count_link"]]),
-                        )
+                    mock_get.assert_any_call("https://www.ureport.in/count/", timeout=settings.OLD_SITES_FETCH_TIMEOUT)
+
+                    mock_cache.set.assert_any_call(
+                        "org:global:reporters:old-site",
+                        {"time": 500, "results": dict(size=300)},
+                        UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME,
+                    )
 
-                        mock_get.assert_called_with("https://www.ureport.in/count/")
+                    mock_cache.delete.assert_called_once_with(GLOBAL_COUNT_CACHE_KEY)
 
-                        cache_set_mock.assert_called_with(
-                            "org:global:reporters:old-site",
-                            {"time": 500, "results": dict(size=300)},
-                            UREPORT_ASYNC_FETCHED_DATA_CACHE_TIME,
-                        )
+    def test_fetch_old_site_count(self):
+        from django.core.cache import cache
+
+        site = dict(name="Failing", count_link="http://failing.ureport.in/count/")
+        cache.delete(OLD_SITE_FAILURES_KEY % "failing")
 
-                        cache_delete_mock.assert_called_once_with(GLOBAL_COUNT_CACHE_KEY)
+        with patch("requests.Session.get") as mock_get:
+            mock_get.return_value = MockResponse(500, b"")
+
+            for i in range(settings.OLD_SITES_CIRCUIT_BREAKER_FAILURES):
+                self.assertIsNone(fetch_old_site_count(site, datetime.now()))
+
+            self.assertEqual(mock_get.call_count, settings.OLD_SITES_CIRCUIT_BREAKER_FAILURES)
+
+            # the circuit is open, the site is not requested anymore
+            mock_get.return_value = MockResponse(200, b"300")
+            self.assertIsNone(fetch_old_site_count(site, datetime.now()))
+            self.assertEqual(mock_get.call_count, settings.OLD_SITES_CIRCUIT_BREAKER_FAILURES)
+
+            cache.set(OLD_SITE_FAILURES_KEY % "failing", 1, None)
+            self.assertEqual(fetch_old_site_count(site, datetime.now())["results"], dict(size=300))
+            self.assertIsNone(cache.get(OLD_SITE_FAILURES_KEY % "failing"))
 
     @patch("django.core.cache.cache.get")
     def test_get_gender_stats(self, mock_cache_get):
@@ -425,6 +480,78 @@ class UtilsTest(UreportTest):
             [dict(boundary="R-DISTRICT", label="District", set=3)],
         )
 
+    def test_get_rendered_ureporters_locations_stats(self):
+        from django.core.cache import cache
+
+        cache.delete(ORG_CONTACT_COUNT_KEY % self.org.pk)
+        cache.delete(ORG_CONTACT_LOCATIONS_STATS_KEY % self.org.pk)
+
+        self.assertEqual(
+            json.loads(get_rendered_ureporters_locations_stats(self.org, dict(location="state"))["content"]), []
+        )
+
+        country = Boundary.objects.create(
+            org=self.org, osm_id="R-COUNTRY", name="Country", level=0, parent=None, geometry='{"foo":"bar-country"}'
+        )
+        state = Boundary.objects.create(
+            org=self.org, osm_id="R-STATE", name="State", level=1, parent=country, geometry='{"foo":"bar-state"}'
+        )
+        Boundary.objects.create(
+            org=self.org, osm_id="R-CITY", name="City", level=1, parent=country, geometry='{"foo":"bar-city"}'
+        )
+        district = Boundary.objects.create(
+            org=self.org, osm_id="R-DISTRICT", name="District", level=2, parent=state, geometry='{"foo":"bar"}'
+        )
+        Boundary.objects.create(
+            org=self.org, osm_id="R-WARD", name="Ward", level=3, parent=district, geometry='{"foo":"bar-ward"}'
+        )
+        inactive_district = Boundary.objects.create(
+            org=self.org, osm_id="R-DISTRICT2", name="District", level=2, parent=state, geometry='{"foo":"bar"}'
+        )
+        inactive_district.is_active = False
+        inactive_district.save()
+
+        ReportersCounter.objects.create(org=self.org, type="state:R-STATE", count=5)
+        ReportersCounter.objects.create(org=self.org, type="district:R-DISTRICT", count=3)
+        ReportersCounter.objects.create(org=self.org, type="ward:R-WARD", count=2)
+
+        update_cache_org_contact_counts(self.org)
+
+        segments = [
+            dict(location="state"),
+            dict(location="district", parent="R-STATE"),
+            dict(location="ward", parent="R-DISTRICT"),
+        ]
+        for segment in segments:
+            # the stored stats are the same as the ones built for the segment
+            self.assertEqual(
+                get_rendered_ureporters_locations_stats(self.org, segment),
+                render_json(get_ureporters_locations_stats(self.org, segment)),
+            )
+
+        # the stored rendered stats are served without building them
+        with patch("ureport.utils.get_ureporters_locations_stats") as mock_get_ureporters_locations_stats:
+            with self.assertNumQueries(0):
+                rendered = get_rendered_ureporters_locations_stats(
+                    self.org, dict(location="district", parent="R-STATE")
+                )
+
+            self.assertEqual(json.loads(rendered["content"]), [dict(boundary="R-DISTRICT", label="District", set=3)])
+            self.assertFalse(mock_get_ureporters_locations_stats.called)
+
+        # segments without stored stats are built
+        self.assertEqual(
+            json.loads(get_rendered_ureporters_locations_stats(self.org, dict(location="map"))["content"]), []
+        )
+        self.assertEqual(
+            json.loads(
+                get_rendered_ureporters_locations_stats(self.org, dict(location="district", parent="BLABLA"))[
+                    "content"
+                ]
+            ),
+            [],
+        )
+
     @patch("django.core.cache.cache.get")
     def test_get_regions_stats(self, mock_cache_get):
         mock_cache_get.return_value = None
@@ -486,7 +613,7 @@ class UtilsTest(UreportTest):
     def test_get_org_contacts_counts(self):
 
         with patch("ureport.contacts.models.ReportersCounter.get_counts") as mock_get_counts:
-            mock_get_counts.return_value = "Counts"
+            mock_get_counts.return_value = {"total-reporters": 3}
             with patch("django.core.cache.cache.get") as mock_cache_get:
                 mock_cache_get.return_value = "Cached"
 
@@ -496,9 +623,145 @@ class UtilsTest(UreportTest):
 
                 mock_cache_get.return_value = None
 
-                self.assertEqual(get_org_contacts_counts(self.org), "Counts")
+                self.assertEqual(get_org_contacts_counts(self.org), {"total-reporters": 3})
                 mock_get_counts.assert_called_once_with(self.org)
 
+    def test_get_org_page_context(self):
+        from django.core.cache import cache
+
+        self.org.set_config("rapidpro.state_label", "")
+
+        page_context = get_org_page_context(self.org)
+        self.assertEqual(page_context["main_stories"], [])
+        self.assertFalse(page_context["show_maps"])
+        self.assertEqual(page_context["states"], [])
+        self.assertEqual(cache.get(ORG_PAGE_CONTEXT_CACHE_KEY % self.org.pk), page_context)
+
+        # served from the cache while nothing changes
+        Boundary.objects.create(org=self.org, osm_id="R-STATE", name="State", level=1, geometry='{"foo":"bar"}')
+        self.assertEqual(get_org_page_context(self.org), page_context)
+
+        # saving a story clears the cached context
+        story = Story.objects.create(
+            title="story 1",
+            featured=True,
+            content="body contents 1",
+            org=self.org,
+            created_by=self.admin,
+            modified_by=self.admin,
+        )
+        self.assertIsNone(cache.get(ORG_PAGE_CONTEXT_CACHE_KEY % self.org.pk))
+
+        page_context = get_org_page_context(self.org)
+        self.assertEqual(
+            page_context["main_stories"],
+            [dict(pk=story.pk, title="story 1", summary=story.summary, get_image=None)],
+        )
+        self.assertEqual(page_context["states"], [dict(id="R-STATE", name="State")])
+
+        # so does adding an image to a story
+        StoryImage.objects.create(
+            name="image 1", story=story, image="stories/image.jpg", created_by=self.admin, modified_by=self.admin
+        )
+        self.assertEqual(get_org_page_context(self.org)["main_stories"][0]["get_image"], "stories/image.jpg")
+
+        story.featured = False
+        story.save()
+        self.assertEqual(get_org_page_context(self.org)["main_stories"], [])
+
+        # so does changing the org config
+        self.org.set_config("rapidpro.state_label", "Province")
+        self.assertTrue(get_org_page_context(self.org)["show_maps"])
+
+        self.org.backends.filter(slug="rapidpro").update(is_active=False)
+        self.assertTrue(get_org_page_context(self.org)["show_maps"])
+
+        self.org.backends.get(slug="rapidpro").save()
+        self.assertFalse(get_org_page_context(self.org)["show_maps"])
+
+    @patch("ureport.utils.local_cache.LocalCache.ensure_listener")
+    @patch("ureport.utils.local_cache.time.monotonic")
+    def test_local_cache(self, mock_monotonic, mock_ensure_listener):
+        from django.core.cache import cache
+
+        from ureport.utils.local_cache import LocalCache
+
+        mock_monotonic.return_value = 100
+
+        cache.set("local-cache-a", "A", None)
+        cache.set("local-cache-b", "B", None)
+
+        disabled_cache = LocalCache(max_size=2, timeout=0)
+        self.assertEqual(disabled_cache.get("local-cache-a"), "A")
+        self.assertFalse(disabled_cache.entries)
+
+        local_cache = LocalCache(max_size=2, timeout=30)
+        self.assertEqual(local_cache.get("local-cache-a"), "A")
+        self.assertEqual(local_cache.get("local-cache-missing", "default"), "default")
+        self.assertEqual(list(local_cache.entries.keys()), ["local-cache-a"])
+
+        # reads are served from the process until the key is invalidated
+        cache.set("local-cache-a", "AA", None)
+        self.assertEqual(local_cache.get("local-cache-a"), "A")
+        local_cache.invalidate("local-cache-a")
+        self.assertEqual(local_cache.get("local-cache-a"), "AA")
+
+        local_cache.set("local-cache-b", "BB", None)
+        self.assertEqual(
+            local_cache.get_many(["local-cache-a", "local-cache-b"]), {"local-cache-a": "AA", "local-cache-b": "BB"}
+        )
+
+        # least recently used entries are evicted
+        cache.set("local-cache-c", "C", None)
+        self.assertEqual(local_cache.get("local-cache-c"), "C")
+        self.assertEqual(list(local_cache.entries.keys()), ["local-cache-b", "local-cache-c"])
+
+        # expired entries are read again from the cache
+        cache.set("local-cache-c", "CC", None)
+        mock_monotonic.return_value = 131
+        self.assertEqual(local_cache.get("local-cache-c"), "CC")
+
+        self.assertTrue(mock_ensure_listener.called)
+
+    def test_local_cache_invalidation(self):
+        from django.core.cache import cache
+        from django_redis import get_redis_connection
+
+        from ureport.utils.local_cache import LOCAL_CACHE_INVALIDATION_CHANNEL, LocalCache
+
+        def wait_for(condition):
+            # the listeners run in their own threads
+            for i in range(50):
+                if condition():
+                    return True
+                time.sleep(0.1)
+            return False
+
+        cache.set("local-cache-shared", "A", None)
+
+        reader_cache = LocalCache(max_size=10, timeout=30)
+        writer_cache = LocalCache(max_size=10, timeout=30)
+
+        r = get_redis_connection()
+        subscribed = r.pubsub_numsub(LOCAL_CACHE_INVALIDATION_CHANNEL)[0][1]
+
+        reader_cache.ensure_listener()
+        writer_cache.ensure_listener()
+        self.assertTrue(wait_for(lambda: r.pubsub_numsub(LOCAL_CACHE_INVALIDATION_CHANNEL)[0][1] >= subscribed + 2))
+
+        # let the listeners drop what they may have missed before subscribing
+        time.sleep(0.2)
+
+        self.assertEqual(reader_cache.get("local-cache-shared"), "A")
+        self.assertIsNotNone(reader_cache.lookup("local-cache-shared"))
+
+        # a write in another process drops the local copy of the readers
+        writer_cache.set("local-cache-shared", "B", None)
+        self.assertTrue(wait_for(lambda: reader_cache.lookup("local-cache-shared") is None))
+        self.assertEqual(reader_cache.get("local-cache-shared"), "B")
+
+        cache.delete("local-cache-shared")
+
     def test_get_flows(self):
         with patch("ureport.utils.fetch_flows") as mock_fetch_flows:
             mock_fetch_flows.return_value = "Fetched"
@@ -536,20 +799,31 @@ class UtilsTest(UreportTest):
             }
         ):
 
-            with patch("ureport.utils.fetch_old_sites_count") as mock_old_sites_count:
-                mock_old_sites_count.return_value = []
+            with patch("ureport.polls.tasks.fetch_old_sites_count.delay") as mock_old_sites_count:
+                from django.core.cache import cache
 
-                self.assertEqual(get_global_count(), 0)
+                sites = [elt for elt in settings.COUNTRY_FLAGS_SITES if elt["count_link"]]
 
-                mock_old_sites_count.return_value = [
-                    {"time": 500, "results": dict(size=300)},
-                    {"time": 500, "results": dict(size=50)},
-                ]
-                from django.core.cache import cache
+                cache.delete(OLD_SITES_FETCH_QUEUED_KEY)
+                cache.delete(GLOBAL_COUNT_CACHE_KEY)
+                for site in sites:
+                    cache.delete("org:%s:reporters:old-site" % site["name"].lower())
+
+                # no cached counts, they are fetched in the background
+                self.assertEqual(get_global_count(), 0)
+                self.assertEqual(get_global_count(), 0)
+                mock_old_sites_count.assert_called_once_with()
 
                 cache.delete(GLOBAL_COUNT_CACHE_KEY)
+                cache.set(
+                    "org:%s:reporters:old-site" % sites[0]["name"].lower(), {"time": 500, "results": dict(size=300)}
+                )
+                cache.set(
+                    "org:%s:reporters:old-site" % sites[1]["name"].lower(), {"time": 500, "results": dict(size=50)}
+                )
                 cache.set("org:ignored:reporters:old-site", {"time": 500, "results": dict(size=100)}, None)
                 self.assertEqual(get_global_count(), 350)
+                mock_old_sites_count.assert_called_once_with()
 
             with patch("django.core.cache.cache.get") as cache_get_mock:
                 cache_get_mock.return_value = 20